@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgendamientoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agendamiento'
+
+    def ready(self):
+        # Registra los receptores que mantienen sincronizada la disponibilidad
+        from . import signals  # noqa: F401
@@ -0,0 +1,93 @@
+"""
+Registro de asistencia en lote para la agenda diaria de un profesional.
+
+Todas las citas marcadas en el formulario de la agenda se actualizan con un
+único UPDATE condicional: cada cita solo cambia si pertenece al profesional,
+sigue 'Programada', ya finalizó y conserva la versión que se mostró en la
+agenda (ver concurrencia_citas). Una segunda consulta lee las filas
+solicitadas para informar el resultado de cada cita.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Cita, ValoresAgendaCita
+from .signals import cita_modificada
+
+
+ESTADOS_ASISTENCIA = ('Realizada', 'No_Asistio')
+
+RESULTADO_REGISTRADA = 'registrada'
+RESULTADO_NO_ENCONTRADA = 'no_encontrada'
+RESULTADO_NO_PROGRAMADA = 'no_programada'
+RESULTADO_NO_FINALIZADA = 'no_finalizada'
+RESULTADO_MODIFICADA = 'modificada'
+
+# Resultado del registro para una cita solicitada
+ResultadoAsistencia = namedtuple('ResultadoAsistencia', ['cita_id', 'estado', 'resultado'])
+
+
+def registrar_asistencia_lote(profesional, marcas):
+    """
+    Registra la asistencia de varias citas del profesional con un solo UPDATE.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud que registra la asistencia.
+        marcas: Dict {cita_id: (estado, version)} con estado en ESTADOS_ASISTENCIA
+            y la versión de la cita que se mostró en la agenda.
+
+    Returns:
+        Lista de ResultadoAsistencia ordenada por id de cita.
+    """
+    if not marcas:
+        return []
+    ahora = timezone.now()
+    condicion_versiones = Q()
+    for cita_id, (_, version) in marcas.items():
+        condicion_versiones |= Q(id=cita_id, version=version)
+
+    with transaction.atomic():
+        Cita.objects.filter(
+            condicion_versiones,
+            profesional=profesional,
+            estado_cita='Programada',
+            fecha_hora_fin_cita__lt=ahora
+        ).update(
+            estado_cita=Case(
+                *(When(id=cita_id, then=Value(estado)) for cita_id, (estado, _) in marcas.items()),
+                output_field=CharField()
+            ),
+            version=F('version') + 1,
+            modificada_en=ahora
+        )
+        filas = {
+            fila[0]: fila[1:]
+            for fila in Cita.objects.filter(id__in=marcas.keys()).values_list(
+                'id', 'profesional_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita', 'estado_cita', 'version', 'especialidad_id'
+            )
+        }
+
+        resultados = []
+        for cita_id, (estado, version) in sorted(marcas.items()):
+            fila = filas.get(cita_id)
+            if fila is None or fila[0] != profesional.id:
+                resultado = RESULTADO_NO_ENCONTRADA
+            elif fila[4] == version + 1 and fila[3] == estado:
+                # QuerySet.update no emite post_save: se notifica el cambio de estado
+                profesional_id, inicio, fin, _, _, especialidad_id = fila
+                cita_modificada.send(
+                    sender=Cita,
+                    previo=ValoresAgendaCita(profesional_id, inicio, fin, 'Programada', especialidad_id),
+                    actual=ValoresAgendaCita(profesional_id, inicio, fin, estado, especialidad_id)
+                )
+                resultado = RESULTADO_REGISTRADA
+            elif fila[3] != 'Programada':
+                resultado = RESULTADO_NO_PROGRAMADA
+            elif fila[2] >= ahora:
+                resultado = RESULTADO_NO_FINALIZADA
+            else:
+                resultado = RESULTADO_MODIFICADA
+            resultados.append(ResultadoAsistencia(cita_id, estado, resultado))
+    return resultados
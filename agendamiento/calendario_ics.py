@@ -0,0 +1,161 @@
+"""
+Calendarios iCalendar (ICS) con las citas de un profesional o de un paciente.
+
+Las aplicaciones de calendario consultan el feed cada pocos minutos. Cada
+feed tiene un token de cambios que se calcula con una sola consulta de
+agregación (última modificación, número de citas y suma de versiones de las
+citas del propietario): si coincide con el ETag del cliente se responde 304
+sin generar el calendario. Un cliente que envía ?desde=<token> recibe solo
+las citas modificadas desde ese token, salvo que alguna cita haya salido del
+feed desde entonces: entonces recibe el calendario completo.
+
+Los feeds no usan sesión: la URL lleva una clave aleatoria por usuario
+(SuscripcionCalendario) que el usuario puede regenerar para revocar la URL
+anterior; el feed deja de responder si la cuenta se desactiva. El calendario
+completo solo contiene citas 'Programada', y en el delta toda cita que dejó
+de estarlo (cancelada, realizada o no asistida) se envía con
+STATUS:CANCELLED para que el cliente la quite.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Cita, SuscripcionCalendario, generar_clave_calendario
+
+
+# Días hacia atrás que incluye el calendario completo
+DIAS_HISTORIAL_CALENDARIO = 30
+
+# Margen con el que se repiten cambios en un delta, por transacciones que confirman fuera de orden
+MARGEN_SINCRONIZACION = timedelta(minutes=2)
+
+PRODID_CALENDARIO = '-//IPS Medical Integral//Agendamiento de Citas//ES'
+
+
+def clave_calendario(usuario):
+    """Retorna la clave del feed de un usuario, generándola la primera vez."""
+    suscripcion, _ = SuscripcionCalendario.objects.get_or_create(usuario=usuario)
+    return suscripcion.clave
+
+
+def regenerar_clave_calendario(usuario):
+    """Reemplaza la clave del feed de un usuario; la URL anterior deja de funcionar."""
+    suscripcion, creada = SuscripcionCalendario.objects.get_or_create(usuario=usuario)
+    if not creada:
+        suscripcion.clave = generar_clave_calendario()
+        suscripcion.save(update_fields=['clave', 'creada_en'])
+    return suscripcion.clave
+
+
+def propietario_calendario(modelo, clave):
+    """
+    Retorna el id del perfil (ProfesionalSalud o Paciente) dueño de la clave, o None.
+
+    Solo responde a cuentas activas, de modo que desactivar la cuenta corta el feed.
+    """
+    return modelo.objects.filter(
+        user_account__suscripcion_calendario__clave=clave,
+        user_account__is_active=True
+    ).values_list('id', flat=True).first()
+
+
+def citas_calendario(**filtro):
+    """Citas del propietario (todas las de estado) dentro de la ventana del calendario."""
+    return Cita.objects.filter(
+        fecha_hora_fin_cita__gte=timezone.now() - timedelta(days=DIAS_HISTORIAL_CALENDARIO),
+        **filtro
+    )
+
+
+def token_calendario(citas):
+    """
+    Calcula con una consulta el token de cambios de un conjunto de citas.
+
+    Cambia con cualquier escritura sobre las citas (cada una incrementa su
+    versión) y al entrar o salir citas de la ventana.
+    """
+    resumen = citas.aggregate(ultima=Max('modificada_en'), total=Count('id'), versiones=Sum('version'))
+    marca = int(resumen['ultima'].timestamp() * 1_000_000) if resumen['ultima'] else 0
+    return f"{marca}-{resumen['total']}-{resumen['versiones'] or 0}"
+
+
+def leer_token(token):
+    """Retorna (última modificación, total de citas, suma de versiones) de un token, o None si no es válido."""
+    try:
+        marca, total, versiones = (int(parte) for parte in token.split('-'))
+        return datetime.fromtimestamp(marca / 1_000_000, tz=dt_timezone.utc), total, versiones
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def salieron_citas(desde, token):
+    """
+    Indica si entre dos tokens pudo salir alguna cita del feed.
+
+    Una cita que pasa a otro propietario o sale de la ventana del calendario
+    ya no aparece en el delta, así que el cliente no se enteraría de que debe
+    quitarla; en ese caso bajan el total o la suma de versiones del token.
+    """
+    _, total_desde, versiones_desde = desde
+    _, total, versiones = token
+    return total < total_desde or versiones < versiones_desde
+
+
+def _fecha_ics(valor):
+    return valor.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _texto_ics(valor):
+    return (
+        str(valor).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _plegar_linea(linea):
+    """Divide una línea de contenido en tramos de 75 octetos como exige RFC 5545."""
+    tramos = []
+    actual = ''
+    for caracter in linea:
+        if len((actual + caracter).encode('utf-8')) > (75 if not tramos else 74):
+            tramos.append(actual)
+            actual = ''
+        actual += caracter
+    tramos.append(actual)
+    return '\r\n '.join(tramos)
+
+
+def generar_ics(nombre_calendario, citas, resumen_cita):
+    """
+    Genera el contenido ICS de un conjunto de citas.
+
+    Args:
+        nombre_calendario: Nombre que muestran las aplicaciones de calendario.
+        citas: Iterable de Cita con los datos usados por resumen_cita precargados.
+        resumen_cita: Función que retorna el título del evento para una cita.
+    """
+    ahora = _fecha_ics(timezone.now())
+    lineas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID_CALENDARIO}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_texto_ics(nombre_calendario)}',
+    ]
+    for cita in citas:
+        lineas += [
+            'BEGIN:VEVENT',
+            f'UID:cita-{cita.id}@agendamiento',
+            f'DTSTAMP:{ahora}',
+            f'DTSTART:{_fecha_ics(cita.fecha_hora_inicio_cita)}',
+            f'DTEND:{_fecha_ics(cita.fecha_hora_fin_cita)}',
+            f'SEQUENCE:{cita.version}',
+            f"STATUS:{'CONFIRMED' if cita.estado_cita == 'Programada' else 'CANCELLED'}",
+            f'SUMMARY:{_texto_ics(resumen_cita(cita))}',
+        ]
+        if cita.modificada_en:
+            lineas.append(f'LAST-MODIFIED:{_fecha_ics(cita.modificada_en)}')
+        lineas.append('END:VEVENT')
+    lineas.append('END:VCALENDAR')
+    return '\r\n'.join(_plegar_linea(linea) for linea in lineas) + '\r\n'
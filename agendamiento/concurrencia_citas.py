@@ -0,0 +1,64 @@
+"""
+Control de concurrencia optimista para las escrituras sobre citas.
+
+Cada cita guarda un número de versión que aumenta en cada escritura. Los
+cambios de las vistas se aplican con un UPDATE condicionado al id y a la
+versión que el usuario tenía al decidir el cambio, escribiendo solo las
+columnas modificadas: si otra petición cambió la cita entretanto, el UPDATE
+no afecta ninguna fila y el cambio se rechaza sin bloquear la fila ni
+sobrescribir el trabajo ajeno.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cita
+from .signals import cita_modificada
+
+
+# Campo oculto con la versión de la cita mostrada en las pantallas de confirmación
+CAMPO_VERSION_CITA = 'version_cita'
+
+
+def version_esperada(request, cita):
+    """
+    Retorna la versión de la cita que el usuario vio al confirmar la acción.
+
+    Usa el campo oculto del POST si viene y es válido; si no, la versión
+    recién cargada.
+    """
+    try:
+        return int(request.POST[CAMPO_VERSION_CITA])
+    except (KeyError, ValueError):
+        return cita.version
+
+
+def actualizar_cita(cita, version, **cambios):
+    """
+    Aplica `cambios` a la cita solo si su versión en la base de datos sigue siendo `version`.
+
+    Ejecuta UPDATE ... SET <cambios>, version = version + 1, modificada_en = ahora
+    WHERE id = ? AND version = ?. Como QuerySet.update no emite post_save, emite
+    cita_modificada para mantener slots, ocupación y caché sincronizados. La
+    restricción de no solapamiento puede lanzar IntegrityError.
+
+    Args:
+        cita: Instancia de Cita; se actualiza en memoria si el cambio se aplica.
+        version: Versión sobre la que se decidió el cambio.
+        **cambios: Campos a escribir y sus nuevos valores.
+
+    Returns:
+        True si se aplicó el cambio; False si otra petición modificó la cita.
+    """
+    cambios.setdefault('modificada_en', timezone.now())
+    actualizadas = Cita.objects.filter(pk=cita.pk, version=version).update(version=F('version') + 1, **cambios)
+    if not actualizadas:
+        return False
+
+    previo = cita.valores_agenda()
+    for campo, valor in cambios.items():
+        setattr(cita, campo, valor)
+    cita.version = version + 1
+    cita._valores_agenda_originales = cita.valores_agenda()
+    if previo != cita._valores_agenda_originales:
+        cita_modificada.send(sender=Cita, previo=previo, actual=cita._valores_agenda_originales)
+    return True
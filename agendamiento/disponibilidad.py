@@ -0,0 +1,581 @@
+"""
+Motor de disponibilidad de citas.
+
+Calcula los horarios libres de un profesional combinando sus bloques de
+PlantillaHorarioMedico con las citas 'Programada' del día: los rangos
+ocupados se vuelcan una vez a un MapaOcupacion (bitmap por minuto) y cada
+slot de la plantilla se decide con una operación AND sobre bits, en lugar de
+compararlo contra todas las citas ocupadas. Los días dentro del horizonte
+materializado se leen de SlotDisponible; el resultado por día se guarda en
+la caché de disponibilidad y las retenciones vigentes se descartan al leer.
+"""
+import hashlib
+import heapq
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from itertools import islice
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Cita, PlantillaHorarioMedico, ProfesionalSalud, RetencionSlot, SlotDisponible
+from .ocupacion import MapaOcupacion
+
+
+# Slot libre asociado a un profesional (búsquedas por especialidad)
+SlotProfesional = namedtuple('SlotProfesional', ['profesional', 'fecha', 'hora_inicio', 'hora_fin'])
+
+# Días que recorre como máximo la búsqueda perezosa de próximos slots
+MAX_DIAS_BUSQUEDA = 90
+
+
+def fusionar_rangos(rangos):
+    """
+    Ordena y fusiona rangos (inicio, fin) que se solapan o se tocan.
+
+    El resultado es una lista de rangos disjuntos con inicios y fines
+    crecientes, lo que permite recorrerla con un único puntero.
+    """
+    fusionados = []
+    for inicio, fin in sorted(rangos):
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1] = (fusionados[-1][0], fin)
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+def rangos_ocupados_locales(intervalos, tz=None):
+    """
+    Convierte intervalos aware (inicio, fin) en rangos naive de hora local.
+
+    Trabajar con datetimes naive locales evita reconstruir objetos aware
+    en cada iteración del recorrido de slots.
+    """
+    tz = tz or timezone.get_current_timezone()
+    return fusionar_rangos(
+        (
+            timezone.localtime(inicio, tz).replace(tzinfo=None),
+            timezone.localtime(fin, tz).replace(tzinfo=None),
+        )
+        for inicio, fin in intervalos
+    )
+
+
+def ahora_local(tz=None):
+    """Retorna el instante actual como datetime naive en hora local."""
+    return timezone.localtime(timezone.now(), tz or timezone.get_current_timezone()).replace(tzinfo=None)
+
+
+def recorrer_slots_dia(fecha, bloques, rangos_ocupados, duracion_minutos):
+    """
+    Recorre todos los slots que genera la plantilla de un día.
+
+    Los rangos ocupados se vuelcan una sola vez a un MapaOcupacion, de modo
+    que decidir si cada slot está libre es una operación AND sobre bits.
+
+    Args:
+        fecha: Día a calcular.
+        bloques: Iterable de tuplas (hora_inicio_bloque, hora_fin_bloque).
+        rangos_ocupados: Rangos (inicio, fin) naive locales.
+        duracion_minutos: Duración de cada slot.
+
+    Yields:
+        Tuplas (inicio, fin, libre) con inicio y fin como datetime naive local.
+    """
+    if duracion_minutos <= 0:
+        return
+
+    duracion = timedelta(minutes=duracion_minutos)
+    mapa = MapaOcupacion.desde_rangos(fecha, rangos_ocupados)
+
+    for hora_inicio_bloque, hora_fin_bloque in sorted(bloques):
+        inicio_slot = datetime.combine(fecha, hora_inicio_bloque)
+        fin_bloque = datetime.combine(fecha, hora_fin_bloque)
+
+        while True:
+            fin_slot = inicio_slot + duracion
+            if fin_slot > fin_bloque:
+                break
+            yield inicio_slot, fin_slot, not mapa.rango_ocupado(inicio_slot, fin_slot)
+            inicio_slot = fin_slot
+
+
+def generar_slots_dia(fecha, bloques, rangos_ocupados, duracion_minutos, desde=None):
+    """
+    Genera los slots libres de un día en un único recorrido lineal.
+
+    Args:
+        fecha: Día a calcular.
+        bloques: Iterable de tuplas (hora_inicio_bloque, hora_fin_bloque).
+        rangos_ocupados: Rangos (inicio, fin) naive locales, ordenados y fusionados.
+        duracion_minutos: Duración de cada slot.
+        desde: Datetime naive local; se descartan los slots que inicien antes (regla de no pasado).
+
+    Returns:
+        Lista de tuplas (hora_inicio, hora_fin) de tipo datetime.time.
+    """
+    return [
+        (inicio.time(), fin.time())
+        for inicio, fin, libre in recorrer_slots_dia(fecha, bloques, rangos_ocupados, duracion_minutos)
+        if libre and (desde is None or inicio >= desde)
+    ]
+
+
+def horizonte_materializado():
+    """
+    Retorna el rango de fechas (primera, última) que debe cubrir la tabla SlotDisponible.
+
+    El horizonte avanza cuando el worker ejecuta materializar_slots_disponibles
+    (una vez al día); hasta entonces los días finales aún no materializados
+    simplemente faltan en la tabla y se calculan en vivo. Retorna None si la
+    materialización está desactivada (horizonte de 0 días).
+    """
+    dias = getattr(settings, 'DISPONIBILIDAD_HORIZONTE_DIAS', 30)
+    if dias <= 0:
+        return None
+    hoy = timezone.localdate()
+    return hoy, hoy + timedelta(days=dias - 1)
+
+
+def leer_slots_materializados(profesional_id, fecha_inicio, fecha_fin):
+    """
+    Lee los slots precalculados de un profesional con un único recorrido del índice.
+
+    Returns:
+        Diccionario {fecha: [(hora_inicio, hora_fin, ocupado), ...]} solo con los
+        días presentes en la tabla; los días ausentes deben calcularse en vivo.
+    """
+    horizonte = horizonte_materializado()
+    if horizonte is None:
+        return {}
+    fecha_inicio = max(fecha_inicio, horizonte[0])
+    fecha_fin = min(fecha_fin, horizonte[1])
+    if fecha_inicio > fecha_fin:
+        return {}
+
+    slots_por_fecha = {}
+    for fecha, hora_inicio, hora_fin, ocupado in SlotDisponible.objects.filter(
+        profesional_id=profesional_id,
+        fecha__gte=fecha_inicio,
+        fecha__lte=fecha_fin
+    ).order_by('fecha', 'hora_inicio').values_list('fecha', 'hora_inicio', 'hora_fin', 'ocupado'):
+        slots_por_fecha.setdefault(fecha, []).append((hora_inicio, hora_fin, ocupado))
+    return slots_por_fecha
+
+
+def limites_dia(fecha, tz=None):
+    """Retorna el inicio y fin aware de un día en la zona horaria local."""
+    tz = tz or timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(fecha, time.min), tz),
+        timezone.make_aware(datetime.combine(fecha, time.max), tz),
+    )
+
+
+def _bloques_por_profesional(profesional_ids, dias_semana):
+    """Agrupa en una consulta los bloques de plantilla por (profesional_id, dia_semana)."""
+    bloques = {}
+    for profesional_id, dia_semana, hora_inicio, hora_fin in PlantillaHorarioMedico.objects.filter(
+        profesional_id__in=profesional_ids,
+        dia_semana__in=dias_semana
+    ).values_list('profesional_id', 'dia_semana', 'hora_inicio_bloque', 'hora_fin_bloque'):
+        bloques.setdefault((profesional_id, dia_semana), []).append((hora_inicio, hora_fin))
+    return bloques
+
+
+def _intervalos_por_profesional(profesional_ids, fecha_inicio, fecha_fin, tz, excluir_cita_id=None):
+    """Agrupa en una consulta las citas 'Programada' por (profesional_id, fecha local de inicio)."""
+    inicio_rango, _ = limites_dia(fecha_inicio, tz)
+    _, fin_rango = limites_dia(fecha_fin, tz)
+
+    citas_ocupadas = Cita.objects.filter(
+        profesional_id__in=profesional_ids,
+        fecha_hora_inicio_cita__gte=inicio_rango,
+        fecha_hora_inicio_cita__lte=fin_rango,
+        estado_cita='Programada'
+    )
+    if excluir_cita_id is not None:
+        citas_ocupadas = citas_ocupadas.exclude(id=excluir_cita_id)
+
+    intervalos = {}
+    for profesional_id, inicio, fin in citas_ocupadas.values_list(
+        'profesional_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita'
+    ):
+        fecha_local = timezone.localtime(inicio, tz).date()
+        intervalos.setdefault((profesional_id, fecha_local), []).append((inicio, fin))
+    return intervalos
+
+
+def _slots_libres_rango(profesional, fechas, excluir_cita_id=None):
+    """
+    Calcula los slots libres de varios días sin descartar los que ya pasaron.
+
+    Los días cubiertos por la tabla SlotDisponible se leen con una única
+    consulta indexada. Los restantes se calculan en vivo con como máximo dos
+    consultas para toda la ventana: bloques de plantilla y citas 'Programada'.
+
+    Returns:
+        Diccionario {fecha: [(hora_inicio, hora_fin), ...]} con una entrada por
+        cada día que tiene plantilla configurada.
+    """
+    current_tz = timezone.get_current_timezone()
+
+    # La tabla materializada cuenta todas las citas; al excluir una se calcula en vivo
+    materializados = {}
+    if excluir_cita_id is None:
+        materializados = leer_slots_materializados(profesional.id, fechas[0], fechas[-1])
+
+    fechas_pendientes = [fecha for fecha in fechas if fecha not in materializados]
+    calculados = {}
+    bloques_por_dia = {}
+    if fechas_pendientes:
+        bloques_por_dia = _bloques_por_profesional(
+            [profesional.id], {fecha.weekday() for fecha in fechas_pendientes}
+        )
+    if bloques_por_dia:
+        intervalos_por_dia = _intervalos_por_profesional(
+            [profesional.id], fechas_pendientes[0], fechas_pendientes[-1], current_tz,
+            excluir_cita_id=excluir_cita_id
+        )
+        duracion_consulta = profesional.especialidad.duracion_consulta_minutos
+        for fecha in fechas_pendientes:
+            bloques = bloques_por_dia.get((profesional.id, fecha.weekday()))
+            if not bloques:
+                continue
+            rangos_ocupados = rangos_ocupados_locales(intervalos_por_dia.get((profesional.id, fecha), []), current_tz)
+            calculados[fecha] = generar_slots_dia(fecha, bloques, rangos_ocupados, duracion_consulta)
+
+    slots_por_fecha = {}
+    for fecha in fechas:
+        if fecha in materializados:
+            slots_por_fecha[fecha] = [
+                (hora_inicio, hora_fin)
+                for hora_inicio, hora_fin, ocupado in materializados[fecha]
+                if not ocupado
+            ]
+        elif fecha in calculados:
+            slots_por_fecha[fecha] = calculados[fecha]
+    return slots_por_fecha
+
+
+# ============================================================================
+# CACHÉ DE DISPONIBILIDAD POR (PROFESIONAL, FECHA)
+# ============================================================================
+
+def _cache_disponibilidad():
+    """Retorna el backend de caché configurado para la disponibilidad."""
+    return caches[getattr(settings, 'DISPONIBILIDAD_CACHE_ALIAS', 'default')]
+
+
+def _clave_version_profesional(profesional_id):
+    return f'disponibilidad:version:{profesional_id}'
+
+
+def _clave_dia(profesional_id, fecha):
+    return f'disponibilidad:{profesional_id}:{fecha.isoformat()}'
+
+
+def _version_profesional(cache, profesional_id):
+    """
+    Retorna la versión vigente de las entradas de un profesional.
+
+    La versión inicial se toma del reloj para que, si la clave de versión es
+    desalojada, las entradas antiguas no vuelvan a quedar vigentes.
+    """
+    clave = _clave_version_profesional(profesional_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _slots_libres_cacheados(profesional, fechas):
+    """
+    Retorna los slots libres de los días pedidos, calculando solo los ausentes en caché.
+
+    Cada entrada guarda (tiene_horario, slots) sin filtrar los slots pasados,
+    de modo que sigue siendo válida durante todo el día.
+    """
+    cache = _cache_disponibilidad()
+    version = _version_profesional(cache, profesional.id)
+    claves = {fecha: _clave_dia(profesional.id, fecha) for fecha in fechas}
+    cacheados = cache.get_many(claves.values(), version=version)
+
+    fechas_faltantes = [fecha for fecha in fechas if claves[fecha] not in cacheados]
+    if fechas_faltantes:
+        calculados = _slots_libres_rango(profesional, fechas_faltantes)
+        nuevos = {
+            claves[fecha]: (fecha in calculados, calculados.get(fecha, []))
+            for fecha in fechas_faltantes
+        }
+        cache.set_many(nuevos, version=version)
+        cacheados.update(nuevos)
+
+    slots_por_fecha = {}
+    for fecha in fechas:
+        tiene_horario, slots = cacheados[claves[fecha]]
+        if tiene_horario:
+            slots_por_fecha[fecha] = slots
+    return slots_por_fecha
+
+
+def etag_disponibilidad(profesional, fechas, ahora=None):
+    """
+    Calcula el ETag de la disponibilidad de un profesional para varias fechas a partir de la base de datos.
+
+    Resume con tres consultas pequeñas e indexadas lo que determina la
+    respuesta: las citas de la ventana (número, suma de versiones y última
+    modificación, que cambian con cualquier alta, cambio o cancelación), las
+    retenciones vigentes y los bloques de plantilla de los días pedidos, junto
+    con la duración de la consulta y el minuto actual si la ventana incluye
+    hoy, porque los slots pasados dejan de mostrarse. Como no depende de la
+    caché, todos los workers calculan el mismo ETag para los mismos datos.
+    """
+    tz = timezone.get_current_timezone()
+    inicio_rango, _ = limites_dia(fechas[0], tz)
+    _, fin_rango = limites_dia(fechas[-1], tz)
+    citas = Cita.objects.filter(
+        profesional_id=profesional.id,
+        fecha_hora_inicio_cita__gte=inicio_rango,
+        fecha_hora_inicio_cita__lte=fin_rango
+    ).aggregate(total=Count('id'), versiones=Sum('version'), ultima=Max('modificada_en'))
+    retenciones = RetencionSlot.objects.filter(
+        profesional_id=profesional.id,
+        fecha_hora_inicio__gte=inicio_rango,
+        fecha_hora_inicio__lte=fin_rango,
+        expira_en__gt=timezone.now()
+    ).aggregate(total=Count('id'), ultima=Max('id'))
+    bloques = sorted(
+        PlantillaHorarioMedico.objects.filter(
+            profesional_id=profesional.id,
+            dia_semana__in={fecha.weekday() for fecha in fechas}
+        ).values_list('dia_semana', 'hora_inicio_bloque', 'hora_fin_bloque')
+    )
+
+    ahora = ahora or ahora_local()
+    referencia_tiempo = ahora.strftime('%Y-%m-%dT%H:%M') if ahora.date() in fechas else ahora.date().isoformat()
+    contenido = repr((
+        profesional.id, profesional.especialidad.duracion_consulta_minutos, fechas[0], fechas[-1],
+        referencia_tiempo, citas, retenciones, bloques
+    ))
+    return f'"{hashlib.sha1(contenido.encode()).hexdigest()}"'
+
+
+def invalidar_disponibilidad_dia(profesional_id, fecha):
+    """Elimina de la caché la disponibilidad de un profesional en una fecha."""
+    cache = _cache_disponibilidad()
+    version = cache.get(_clave_version_profesional(profesional_id))
+    if version is not None:
+        cache.delete(_clave_dia(profesional_id, fecha), version=version)
+
+
+def invalidar_disponibilidad_profesional(profesional_id):
+    """Invalida todas las fechas cacheadas de un profesional cambiando su versión."""
+    cache = _cache_disponibilidad()
+    try:
+        cache.incr(_clave_version_profesional(profesional_id))
+    except ValueError:
+        # Sin versión registrada no hay entradas vigentes que invalidar
+        pass
+
+
+# ============================================================================
+# RETENCIONES TEMPORALES DE SLOTS
+# ============================================================================
+
+def _rangos_retenidos(profesional_ids, fecha_inicio, fecha_fin, tz):
+    """
+    Agrupa las retenciones vigentes por (profesional_id, fecha local) como rangos naive locales.
+
+    Se consulta siempre la tabla RetencionSlot, con una consulta por índice
+    sobre los profesionales y días pedidos: las retenciones no se guardan en
+    las entradas cacheadas de disponibilidad, así que se ven desde cualquier
+    proceso en cuanto se crean y al vencer liberan el horario al instante.
+    """
+    inicio_rango, _ = limites_dia(fecha_inicio, tz)
+    _, fin_rango = limites_dia(fecha_fin, tz)
+    rangos = {}
+    for profesional_id, inicio, fin in RetencionSlot.objects.filter(
+        profesional_id__in=profesional_ids,
+        fecha_hora_inicio__gte=inicio_rango,
+        fecha_hora_inicio__lte=fin_rango,
+        expira_en__gt=timezone.now()
+    ).order_by().values_list('profesional_id', 'fecha_hora_inicio', 'fecha_hora_fin'):
+        inicio_local = timezone.localtime(inicio, tz).replace(tzinfo=None)
+        fin_local = timezone.localtime(fin, tz).replace(tzinfo=None)
+        rangos.setdefault((profesional_id, inicio_local.date()), []).append((inicio_local, fin_local))
+    return rangos
+
+
+def _descartar_retenidos(fecha, slots, rangos_retenidos):
+    """Filtra los slots (hora_inicio, hora_fin) de un día que se cruzan con algún rango retenido."""
+    if not rangos_retenidos:
+        return slots
+    return [
+        (hora_inicio, hora_fin) for hora_inicio, hora_fin in slots
+        if not any(
+            inicio < datetime.combine(fecha, hora_fin) and fin > datetime.combine(fecha, hora_inicio)
+            for inicio, fin in rangos_retenidos
+        )
+    ]
+
+
+def obtener_slots_rango(profesional, fecha_inicio, dias, excluir_cita_id=None):
+    """
+    Calcula los slots disponibles de un profesional para varios días consecutivos.
+
+    Los días se sirven desde la caché de disponibilidad cuando es posible y
+    los ausentes se calculan con _slots_libres_rango. Al excluir una cita
+    (modificación) se calcula siempre sin caché. Los slots retenidos por otro
+    asesor y los que inician antes del momento actual se descartan después
+    de leer la caché.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud.
+        fecha_inicio: Primer día de la ventana.
+        dias: Número de días a calcular (incluye fecha_inicio).
+        excluir_cita_id: Cita que no debe contarse como ocupada (modificación).
+
+    Returns:
+        Diccionario ordenado {fecha: [(hora_inicio, hora_fin), ...]} con una
+        entrada por cada día que tiene plantilla configurada.
+    """
+    fechas = [fecha_inicio + timedelta(days=desplazamiento) for desplazamiento in range(dias)]
+    if excluir_cita_id is None:
+        slots_libres = _slots_libres_cacheados(profesional, fechas)
+    else:
+        slots_libres = _slots_libres_rango(profesional, fechas, excluir_cita_id=excluir_cita_id)
+
+    retenidos = _rangos_retenidos([profesional.id], fechas[0], fechas[-1], timezone.get_current_timezone())
+    desde = ahora_local()
+    return {
+        fecha: [
+            (hora_inicio, hora_fin)
+            for hora_inicio, hora_fin in _descartar_retenidos(fecha, slots, retenidos.get((profesional.id, fecha)))
+            if datetime.combine(fecha, hora_inicio) >= desde
+        ]
+        for fecha, slots in slots_libres.items()
+    }
+
+
+def obtener_slots_disponibles(profesional, fecha, excluir_cita_id=None):
+    """
+    Calcula los slots disponibles de un profesional para una fecha.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud.
+        fecha: Fecha a consultar.
+        excluir_cita_id: Cita que no debe contarse como ocupada (modificación).
+
+    Returns:
+        Tupla (slots, tiene_horario) donde slots es una lista de
+        (hora_inicio, hora_fin) y tiene_horario indica si existe plantilla.
+    """
+    slots_por_fecha = obtener_slots_rango(profesional, fecha, 1, excluir_cita_id=excluir_cita_id)
+    return slots_por_fecha.get(fecha, []), fecha in slots_por_fecha
+
+
+def iterar_slots_profesional(profesional, desde=None, max_dias=MAX_DIAS_BUSQUEDA):
+    """
+    Genera de forma perezosa los slots libres de un profesional a partir de un instante.
+
+    Consulta una vez los días de la semana con plantilla y luego avanza día a
+    día, calculando (o leyendo de caché) solo los días con horario que el
+    consumidor llega a pedir. Las consultas quedan acotadas por los días
+    visitados, no por el horizonte completo.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud.
+        desde: Datetime naive local desde el que se buscan slots (por defecto, ahora).
+        max_dias: Número máximo de días a recorrer.
+
+    Yields:
+        SlotProfesional en orden de fecha y hora de inicio.
+    """
+    desde = desde or ahora_local()
+    dias_con_horario = set(
+        PlantillaHorarioMedico.objects.filter(profesional_id=profesional.id).values_list('dia_semana', flat=True)
+    )
+    if not dias_con_horario:
+        return
+
+    for desplazamiento in range(max_dias):
+        fecha = desde.date() + timedelta(days=desplazamiento)
+        if fecha.weekday() not in dias_con_horario:
+            continue
+        slots = _slots_libres_cacheados(profesional, [fecha]).get(fecha, [])
+        retenidos = _rangos_retenidos([profesional.id], fecha, fecha, timezone.get_current_timezone())
+        for hora_inicio, hora_fin in _descartar_retenidos(fecha, slots, retenidos.get((profesional.id, fecha))):
+            if datetime.combine(fecha, hora_inicio) >= desde:
+                yield SlotProfesional(profesional, fecha, hora_inicio, hora_fin)
+
+
+def proximos_slots_profesional(profesional, cantidad, desde=None, max_dias=MAX_DIAS_BUSQUEDA):
+    """Retorna los próximos `cantidad` slots libres de un profesional (ver iterar_slots_profesional)."""
+    return list(islice(iterar_slots_profesional(profesional, desde=desde, max_dias=max_dias), cantidad))
+
+
+def buscar_primeros_slots_especialidad(especialidad, fecha_inicio, dias, limite):
+    """
+    Busca los primeros slots libres de una especialidad entre todos sus profesionales.
+
+    Carga en tres consultas los profesionales activos, sus plantillas y sus
+    citas 'Programada' de la ventana. Cada profesional aporta un flujo de
+    slots ordenado que se calcula día a día bajo demanda; los flujos se
+    combinan con un heap y el recorrido se detiene al reunir `limite` slots,
+    sin calcular la disponibilidad completa de cada profesional.
+
+    Args:
+        especialidad: Instancia de Especialidad.
+        fecha_inicio: Primer día del horizonte de búsqueda.
+        dias: Número de días del horizonte.
+        limite: Cantidad máxima de slots a retornar.
+
+    Returns:
+        Lista de SlotProfesional ordenada por fecha y hora de inicio.
+    """
+    profesionales = list(
+        ProfesionalSalud.objects.filter(
+            especialidad=especialidad,
+            user_account__is_active=True
+        ).select_related('user_account', 'especialidad')
+    )
+    if not profesionales or limite <= 0:
+        return []
+
+    fechas = [fecha_inicio + timedelta(days=desplazamiento) for desplazamiento in range(dias)]
+    profesional_ids = [profesional.id for profesional in profesionales]
+    bloques_por_dia = _bloques_por_profesional(profesional_ids, {fecha.weekday() for fecha in fechas})
+    if not bloques_por_dia:
+        return []
+
+    current_tz = timezone.get_current_timezone()
+    intervalos_por_dia = _intervalos_por_profesional(profesional_ids, fechas[0], fechas[-1], current_tz)
+    retenidos_por_dia = _rangos_retenidos(profesional_ids, fechas[0], fechas[-1], current_tz)
+    desde = ahora_local(current_tz)
+    duracion_consulta = especialidad.duracion_consulta_minutos
+
+    def flujo_profesional(orden, profesional):
+        """Genera los slots de un profesional en orden, calculando cada día solo cuando se necesita."""
+        for fecha in fechas:
+            bloques = bloques_por_dia.get((profesional.id, fecha.weekday()))
+            if not bloques:
+                continue
+            rangos_ocupados = rangos_ocupados_locales(intervalos_por_dia.get((profesional.id, fecha), []), current_tz)
+            if (profesional.id, fecha) in retenidos_por_dia:
+                rangos_ocupados = fusionar_rangos(rangos_ocupados + retenidos_por_dia[(profesional.id, fecha)])
+            for hora_inicio, hora_fin in generar_slots_dia(fecha, bloques, rangos_ocupados, duracion_consulta, desde=desde):
+                # El orden del profesional desempata slots simultáneos sin comparar instancias
+                yield datetime.combine(fecha, hora_inicio), orden, hora_fin
+
+    flujos = [flujo_profesional(orden, profesional) for orden, profesional in enumerate(profesionales)]
+    return [
+        SlotProfesional(profesionales[orden], inicio.date(), inicio.time(), hora_fin)
+        for inicio, orden, hora_fin in islice(heapq.merge(*flujos), limite)
+    ]
@@ -13,7 +13,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import re
 
-from .models import Paciente, ProfesionalSalud, Cita
+from .models import Paciente, ProfesionalSalud, Cita, Especialidad
 
 # ============================================================================
 # FORMULARIOS DE USUARIO Y AUTENTICACIÓN
@@ -297,8 +297,15 @@ class ConsultaDisponibilidadForm(forms.Form):
     Formulario para consultar disponibilidad de profesionales.
     
     Permite seleccionar un profesional activo y una fecha para verificar horarios disponibles.
+    Opcionalmente consulta un rango de días a partir de la fecha seleccionada.
     """
 
+    RANGO_DIAS_CHOICES = [
+        ('1', 'Solo la fecha seleccionada'),
+        ('7', 'Próximos 7 días'),
+        ('30', 'Próximos 30 días'),
+    ]
+
     profesional = forms.ModelChoiceField(
         queryset=ProfesionalSalud.objects.filter(user_account__is_active=True).order_by('user_account__last_name', 'user_account__first_name'),
         label="Profesional de la Salud",
@@ -311,6 +318,13 @@ class ConsultaDisponibilidadForm(forms.Form):
         label="Fecha para la Consulta",
         required=True
     )
+    rango_dias = forms.ChoiceField(
+        choices=RANGO_DIAS_CHOICES,
+        initial='1',
+        label="Rango de Consulta",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=False
+    )
 
     def __init__(self, *args, **kwargs):
         super(ConsultaDisponibilidadForm, self).__init__(*args, **kwargs)
@@ -326,6 +340,287 @@ class ConsultaDisponibilidadForm(forms.Form):
         
         return fecha_seleccionada
 
+    def clean_rango_dias(self):
+        """Convierte el rango a número de días (1 si no se especifica)."""
+        return int(self.cleaned_data.get('rango_dias') or 1)
+
+
+class PrimerSlotDisponibleForm(forms.Form):
+    """
+    Formulario para buscar los primeros horarios disponibles de una especialidad.
+    
+    Busca entre todos los profesionales activos de la especialidad dentro de un horizonte de días.
+    """
+
+    HORIZONTE_CHOICES = [
+        ('7', 'Próximos 7 días'),
+        ('15', 'Próximos 15 días'),
+        ('30', 'Próximos 30 días'),
+    ]
+
+    especialidad = forms.ModelChoiceField(
+        queryset=Especialidad.objects.filter(activa=True).order_by('nombre_especialidad'),
+        label="Especialidad",
+        empty_label="Seleccione una especialidad...",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    fecha_desde = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Buscar Desde (por defecto, hoy)",
+        required=False
+    )
+    horizonte_dias = forms.ChoiceField(
+        choices=HORIZONTE_CHOICES,
+        initial='7',
+        label="Horizonte de Búsqueda",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    cantidad = forms.IntegerField(
+        min_value=1,
+        max_value=20,
+        initial=5,
+        label="Cantidad de Horarios a Mostrar",
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        required=True
+    )
+
+    def clean_fecha_desde(self):
+        """Valida que la fecha no sea pasada; si no se indica, usa la fecha actual."""
+        fecha_desde = self.cleaned_data.get('fecha_desde')
+        hoy = timezone.localdate()
+        
+        if not fecha_desde:
+            return hoy
+        if fecha_desde < hoy:
+            raise forms.ValidationError("No se puede seleccionar una fecha pasada. Por favor, elija una fecha actual o futura.")
+        
+        return fecha_desde
+
+    def clean_horizonte_dias(self):
+        """Convierte el horizonte a número de días."""
+        return int(self.cleaned_data['horizonte_dias'])
+
+
+class ReporteOcupacionForm(forms.Form):
+    """
+    Formulario para el reporte de ocupación por especialidad.
+    
+    Permite elegir la fecha inicial (pasada o futura) y la cantidad de días a comparar.
+    """
+
+    DIAS_CHOICES = [
+        ('7', '7 días'),
+        ('14', '14 días'),
+        ('30', '30 días'),
+    ]
+
+    fecha_desde = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Desde (por defecto, hoy)",
+        required=False
+    )
+    dias = forms.ChoiceField(
+        choices=DIAS_CHOICES,
+        initial='7',
+        label="Días a Mostrar",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=False
+    )
+
+    def clean_fecha_desde(self):
+        """Si no se indica fecha, usa la fecha actual."""
+        return self.cleaned_data.get('fecha_desde') or timezone.localdate()
+
+    def clean_dias(self):
+        """Convierte la cantidad de días a número (7 si no se especifica)."""
+        return int(self.cleaned_data.get('dias') or 7)
+
+
+class SerieCitasForm(forms.Form):
+    """
+    Formulario para agendar una serie de citas recurrentes (p. ej. sesiones de terapia).
+    
+    Todas las sesiones se agendan con el mismo profesional, a la misma hora,
+    separadas por la frecuencia elegida.
+    """
+
+    FRECUENCIA_CHOICES = [
+        ('7', 'Semanal'),
+        ('14', 'Cada dos semanas'),
+    ]
+
+    numero_documento = forms.CharField(
+        label="Número de Documento del Paciente",
+        max_length=20,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ingrese el documento del paciente'}),
+        required=True
+    )
+    profesional = forms.ModelChoiceField(
+        queryset=ProfesionalSalud.objects.filter(user_account__is_active=True).select_related('user_account', 'especialidad').order_by('user_account__last_name', 'user_account__first_name'),
+        label="Profesional de la Salud",
+        empty_label="Seleccione un profesional...",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    fecha_inicio = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Fecha de la Primera Sesión",
+        required=True
+    )
+    hora_inicio = forms.TimeField(
+        widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+        label="Hora de las Sesiones",
+        required=True
+    )
+    frecuencia_dias = forms.ChoiceField(
+        choices=FRECUENCIA_CHOICES,
+        initial='7',
+        label="Frecuencia",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    sesiones = forms.IntegerField(
+        min_value=2,
+        max_value=20,
+        initial=10,
+        label="Número de Sesiones",
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        required=True
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(SerieCitasForm, self).__init__(*args, **kwargs)
+        self.fields['profesional'].label_from_instance = lambda obj: f"{obj.user_account.get_full_name()} ({obj.especialidad.nombre_especialidad})"
+
+    def clean_numero_documento(self):
+        """Busca el paciente activo con el documento indicado y lo deja en cleaned_data['paciente']."""
+        numero_documento = self.cleaned_data.get('numero_documento')
+        paciente = Paciente.objects.select_related('user_account').filter(
+            numero_documento=numero_documento,
+            user_account__is_active=True
+        ).first()
+        if paciente is None:
+            raise forms.ValidationError(f"No se encontró un paciente activo con el número de documento '{numero_documento}'.")
+        self.cleaned_data['paciente'] = paciente
+        return numero_documento
+
+    def clean_fecha_inicio(self):
+        """Valida que la primera sesión no sea en una fecha pasada."""
+        fecha_inicio = self.cleaned_data.get('fecha_inicio')
+        if fecha_inicio and fecha_inicio < timezone.localdate():
+            raise forms.ValidationError("No se puede seleccionar una fecha pasada. Por favor, elija una fecha actual o futura.")
+        return fecha_inicio
+
+    def clean_frecuencia_dias(self):
+        """Convierte la frecuencia a número de días."""
+        return int(self.cleaned_data['frecuencia_dias'])
+
+
+class ReprogramarDiaProfesionalForm(forms.Form):
+    """
+    Formulario para reprogramar todas las citas de un profesional en un día.
+    
+    Se usa cuando el profesional no podrá atender (p. ej. incapacidad).
+    """
+
+    profesional = forms.ModelChoiceField(
+        queryset=ProfesionalSalud.objects.select_related('user_account', 'especialidad').order_by('user_account__last_name', 'user_account__first_name'),
+        label="Profesional que no atenderá",
+        empty_label="Seleccione un profesional...",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    fecha = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Fecha Afectada",
+        required=True
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(ReprogramarDiaProfesionalForm, self).__init__(*args, **kwargs)
+        self.fields['profesional'].label_from_instance = lambda obj: f"{obj.user_account.get_full_name()} ({obj.especialidad.nombre_especialidad})"
+
+    def clean_fecha(self):
+        """Valida que la fecha afectada no sea pasada."""
+        fecha = self.cleaned_data.get('fecha')
+        if fecha and fecha < timezone.localdate():
+            raise forms.ValidationError("No se puede seleccionar una fecha pasada. Por favor, elija una fecha actual o futura.")
+        return fecha
+
+
+class ListaEsperaForm(forms.Form):
+    """
+    Formulario para inscribir a un paciente en la lista de espera de una especialidad.
+    
+    El paciente recibe el primer cupo que se libere en la especialidad dentro
+    de su ventana de fechas (y con su profesional preferido, si lo indica).
+    """
+
+    numero_documento = forms.CharField(
+        label="Número de Documento del Paciente",
+        max_length=20,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ingrese el documento del paciente'}),
+        required=True
+    )
+    especialidad = forms.ModelChoiceField(
+        queryset=Especialidad.objects.all().order_by('nombre_especialidad'),
+        label="Especialidad",
+        empty_label="Seleccione una especialidad...",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=True
+    )
+    profesional_preferido = forms.ModelChoiceField(
+        queryset=ProfesionalSalud.objects.filter(user_account__is_active=True).select_related('user_account', 'especialidad').order_by('user_account__last_name', 'user_account__first_name'),
+        label="Profesional Preferido (opcional)",
+        empty_label="Cualquier profesional de la especialidad",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=False
+    )
+    fecha_desde = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Disponible Desde",
+        required=True
+    )
+    fecha_hasta = forms.DateField(
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Disponible Hasta",
+        required=True
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(ListaEsperaForm, self).__init__(*args, **kwargs)
+        self.fields['profesional_preferido'].label_from_instance = lambda obj: f"{obj.user_account.get_full_name()} ({obj.especialidad.nombre_especialidad})"
+
+    def clean_numero_documento(self):
+        """Busca el paciente activo con el documento indicado y lo deja en cleaned_data['paciente']."""
+        numero_documento = self.cleaned_data.get('numero_documento')
+        paciente = Paciente.objects.select_related('user_account').filter(
+            numero_documento=numero_documento,
+            user_account__is_active=True
+        ).first()
+        if paciente is None:
+            raise forms.ValidationError(f"No se encontró un paciente activo con el número de documento '{numero_documento}'.")
+        self.cleaned_data['paciente'] = paciente
+        return numero_documento
+
+    def clean(self):
+        """Valida la ventana de fechas y que el profesional preferido sea de la especialidad."""
+        cleaned_data = super().clean()
+        especialidad = cleaned_data.get('especialidad')
+        profesional_preferido = cleaned_data.get('profesional_preferido')
+        fecha_desde = cleaned_data.get('fecha_desde')
+        fecha_hasta = cleaned_data.get('fecha_hasta')
+
+        if fecha_hasta and fecha_hasta < timezone.localdate():
+            self.add_error('fecha_hasta', "La fecha final no puede ser pasada.")
+        if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
+            self.add_error('fecha_hasta', "La fecha final no puede ser anterior a la fecha inicial.")
+        if especialidad and profesional_preferido and profesional_preferido.especialidad_id != especialidad.id:
+            self.add_error('profesional_preferido', "El profesional preferido no pertenece a la especialidad seleccionada.")
+        return cleaned_data
+
 
 class BuscarPacientePorDocumentoForm(forms.Form):
     """Formulario para búsqueda de pacientes por número de documento."""
@@ -0,0 +1,97 @@
+"""
+Claves de idempotencia para las solicitudes POST que agendan o modifican citas.
+
+El formulario incluye una clave única generada al mostrarlo. La primera
+solicitud con esa clave la reserva, ejecuta la vista y guarda el resultado
+(URL de redirección y mensajes). Un doble clic o un reintento con la misma
+clave repite ese resultado sin volver a validar, escribir la cita ni enviar
+correos.
+"""
+from datetime import timedelta
+from functools import wraps
+from uuid import uuid4
+
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import SolicitudIdempotente
+
+
+# Nombre del campo oculto que transporta la clave en los formularios
+CAMPO_CLAVE_IDEMPOTENCIA = 'clave_idempotencia'
+
+
+def nueva_clave_idempotencia():
+    """Genera una clave para incluir en un formulario."""
+    return uuid4().hex
+
+
+def _repetir_resultado(request, clave, operacion):
+    """Responde a una solicitud repetida con el resultado guardado de la original."""
+    solicitud = SolicitudIdempotente.objects.filter(usuario=request.user, clave=clave, operacion=operacion).first()
+    if solicitud is None or not solicitud.completada:
+        messages.warning(request, "Esta solicitud ya se está procesando. Verifique el resultado antes de intentarlo de nuevo.")
+        return redirect(request.get_full_path())
+    for nivel, texto in solicitud.mensajes:
+        messages.add_message(request, nivel, texto)
+    return redirect(solicitud.url_redireccion)
+
+
+def idempotente(operacion):
+    """
+    Decorador que hace idempotente una vista POST que termina en redirección.
+
+    Sin clave en el POST (o en GET) la vista se ejecuta normalmente. Si la
+    vista responde sin redirigir (por ejemplo, un formulario con errores) la
+    clave se libera y puede reutilizarse.
+
+    Args:
+        operacion: Nombre de la operación, para no mezclar claves entre vistas.
+    """
+    def decorador(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            clave = request.POST.get(CAMPO_CLAVE_IDEMPOTENCIA, '')[:64] if request.method == 'POST' else ''
+            if not clave:
+                return view_func(request, *args, **kwargs)
+
+            try:
+                with transaction.atomic():
+                    solicitud = SolicitudIdempotente.objects.create(
+                        usuario=request.user, clave=clave, operacion=operacion
+                    )
+            except IntegrityError:
+                return _repetir_resultado(request, clave, operacion)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                solicitud.delete()
+                raise
+
+            if response.status_code not in (301, 302):
+                solicitud.delete()
+                return response
+
+            # Leer los mensajes los consume; se vuelven a agregar para esta respuesta
+            mensajes = [(mensaje.level, str(mensaje.message)) for mensaje in messages.get_messages(request)]
+            for nivel, texto in mensajes:
+                messages.add_message(request, nivel, texto)
+
+            solicitud.completada = True
+            solicitud.url_redireccion = response['Location']
+            solicitud.mensajes = mensajes
+            solicitud.save(update_fields=['completada', 'url_redireccion', 'mensajes'])
+            return response
+        return _wrapped_view
+    return decorador
+
+
+def purgar_solicitudes_idempotentes(horas=24):
+    """Elimina en lote los resultados guardados con más de `horas` de antigüedad. Retorna cuántos eliminó."""
+    eliminadas, _ = SolicitudIdempotente.objects.filter(
+        creada_en__lt=timezone.now() - timedelta(hours=horas)
+    ).delete()
+    return eliminadas
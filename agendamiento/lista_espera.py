@@ -0,0 +1,96 @@
+"""
+Lista de espera por especialidad y reasignación de cupos liberados.
+
+Al cancelarse una cita, el horario liberado se asigna directamente al
+paciente que lleva más tiempo esperando en la especialidad, siempre que su
+ventana de fechas y su profesional preferido lo admitan y que la nueva cita
+cumpla las reglas de agendamiento: margen de traslado con sus otras citas y
+una sola cita 'Programada' por especialidad.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cita, EntradaListaEspera, es_error_solapamiento_cita
+from .validacion_citas import BUFFER_TRASLADO
+
+
+# Candidatos de la lista que se evalúan como máximo por cupo liberado
+MAX_CANDIDATOS_LISTA_ESPERA = 20
+
+
+def candidatos_para_cupo(profesional, inicio, fin, excluir_paciente_id=None, limite=MAX_CANDIDATOS_LISTA_ESPERA):
+    """
+    Retorna, en orden de llegada, las entradas en espera que pueden ocupar un horario.
+
+    Usa dos consultas: las entradas 'Esperando' de la especialidad cuya
+    ventana incluye la fecha (índice por especialidad, estado y fecha de
+    creación) y las citas 'Programada' de esos pacientes que impedirían
+    agendarles el horario.
+    """
+    fecha = timezone.localtime(inicio).date()
+    entradas = EntradaListaEspera.objects.filter(
+        Q(profesional_preferido__isnull=True) | Q(profesional_preferido=profesional),
+        especialidad_id=profesional.especialidad_id,
+        estado='Esperando',
+        fecha_desde__lte=fecha,
+        fecha_hasta__gte=fecha
+    ).select_related('paciente__user_account').order_by('creada_en')
+    if excluir_paciente_id is not None:
+        entradas = entradas.exclude(paciente_id=excluir_paciente_id)
+    entradas = list(entradas[:limite])
+    if not entradas:
+        return []
+
+    pacientes_bloqueados = set(
+        Cita.objects.filter(
+            Q(fecha_hora_inicio_cita__lt=fin + BUFFER_TRASLADO, fecha_hora_fin_cita__gt=inicio - BUFFER_TRASLADO)
+            | Q(profesional__especialidad_id=profesional.especialidad_id),
+            paciente_id__in={entrada.paciente_id for entrada in entradas},
+            estado_cita='Programada'
+        ).values_list('paciente_id', flat=True)
+    )
+    return [entrada for entrada in entradas if entrada.paciente_id not in pacientes_bloqueados]
+
+
+def asignar_cupo_liberado(cita_cancelada):
+    """
+    Asigna el horario de una cita cancelada al primer paciente elegible de la lista de espera.
+
+    Args:
+        cita_cancelada: Cita que acaba de pasar a 'Cancelada'.
+
+    Returns:
+        La EntradaListaEspera asignada (con cita_asignada) o None si el
+        horario ya pasó, nadie en la lista puede tomarlo o fue ocupado por
+        otra cita entretanto.
+    """
+    inicio = cita_cancelada.fecha_hora_inicio_cita
+    fin = cita_cancelada.fecha_hora_fin_cita
+    if inicio <= timezone.now():
+        return None
+
+    profesional = cita_cancelada.profesional
+    for entrada in candidatos_para_cupo(profesional, inicio, fin, excluir_paciente_id=cita_cancelada.paciente_id):
+        try:
+            with transaction.atomic():
+                # La actualización condicional evita asignar dos veces la misma entrada
+                if not EntradaListaEspera.objects.filter(pk=entrada.pk, estado='Esperando').update(estado='Asignada'):
+                    continue
+                cita = Cita.objects.create(
+                    paciente=entrada.paciente,
+                    profesional=profesional,
+                    fecha_hora_inicio_cita=inicio,
+                    fecha_hora_fin_cita=fin,
+                    estado_cita='Programada'
+                )
+                EntradaListaEspera.objects.filter(pk=entrada.pk).update(cita_asignada=cita)
+        except IntegrityError as error:
+            if not es_error_solapamiento_cita(error):
+                raise
+            # Otra petición tomó el horario: no hay cupo que asignar
+            return None
+        entrada.estado = 'Asignada'
+        entrada.cita_asignada = cita
+        return entrada
+    return None
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from agendamiento.retenciones import barrer_retenciones_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina en lote las retenciones temporales de horarios que ya vencieron '
+        '(programar cada pocos minutos)'
+    )
+
+    def handle(self, *args, **options):
+        eliminadas = barrer_retenciones_vencidas()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Se eliminaron {eliminadas} retenciones de horarios vencidas')
+        )
@@ -0,0 +1,310 @@
+import json
+import random
+import statistics
+import time as reloj
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from agendamiento.disponibilidad import obtener_slots_disponibles
+from agendamiento.models import (
+    AsesorServicio, Cita, Especialidad, Paciente, PlantillaHorarioMedico, ProfesionalSalud
+)
+from agendamiento.reporte_ocupacion import recalcular_ocupacion
+from agendamiento.slots_materializados import materializar_horizonte
+
+
+# Bloques de plantilla de lunes a viernes usados para los profesionales sintéticos
+BLOQUES_SINTETICOS = [(time(8, 0), time(12, 0)), (time(14, 0), time(18, 0))]
+PREFIJO_SINTETICO = 'bench_'
+
+
+class Reversion(Exception):
+    """Se lanza al final del benchmark para revertir los datos sintéticos."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera una clínica sintética (profesionales, plantillas y citas) y mide latencia '
+        '(p50/p95/p99) y número de consultas de disponibilidad, agendamiento y listados. '
+        'Por defecto todos los datos se revierten al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--especialidades', type=int, default=5, help='Especialidades a generar (por defecto: 5)')
+        parser.add_argument('--profesionales', type=int, default=40, help='Profesionales a generar (por defecto: 40)')
+        parser.add_argument('--pacientes', type=int, default=2000, help='Pacientes a generar (por defecto: 2000)')
+        parser.add_argument('--citas', type=int, default=20000, help='Citas a generar (por defecto: 20000)')
+        parser.add_argument('--iteraciones', type=int, default=50, help='Peticiones medidas por escenario (por defecto: 50)')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria para datos reproducibles (por defecto: 42)')
+        parser.add_argument('--salida-json', help='Ruta de un archivo donde guardar los resultados en JSON')
+        parser.add_argument(
+            '--conservar-datos',
+            action='store_true',
+            help='Conservar los datos sintéticos en la base de datos en lugar de revertirlos',
+        )
+        parser.add_argument(
+            '--permitir-produccion',
+            action='store_true',
+            help='Permitir la ejecución con configuración de producción',
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'IS_PRODUCTION', False) and not options['permitir_produccion']:
+            raise CommandError('El benchmark genera miles de registros; use --permitir-produccion para ejecutarlo en producción.')
+
+        self.aleatorio = random.Random(options['semilla'])
+        resultados = []
+        with override_settings(
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            try:
+                with transaction.atomic():
+                    datos = self.generar_datos(options)
+                    resultados = self.ejecutar_escenarios(datos, options['iteraciones'])
+                    if not options['conservar_datos']:
+                        raise Reversion()
+            except Reversion:
+                self.stdout.write('Datos sintéticos revertidos.')
+            finally:
+                caches[settings.DISPONIBILIDAD_CACHE_ALIAS].clear()
+
+        self.imprimir_resultados(resultados)
+        if options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump({'base_de_datos': connection.vendor, 'parametros': {
+                    clave: options[clave] for clave in ('especialidades', 'profesionales', 'pacientes', 'citas', 'iteraciones', 'semilla')
+                }, 'escenarios': resultados}, archivo, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✓ Resultados guardados en {options['salida_json']}"))
+
+    # ------------------------------------------------------------------
+    # Generación de datos sintéticos
+    # ------------------------------------------------------------------
+
+    def _crear_usuarios(self, etiqueta, cantidad, password_hash):
+        User.objects.bulk_create([
+            User(
+                username=f'{PREFIJO_SINTETICO}{etiqueta}_{indice}',
+                first_name=f'{etiqueta.capitalize()}{indice}',
+                last_name='Sintético',
+                email=f'{PREFIJO_SINTETICO}{etiqueta}_{indice}@example.com',
+                password=password_hash,
+            )
+            for indice in range(cantidad)
+        ])
+        # bulk_create no retorna ids en todos los motores; se releen por nombre de usuario
+        return list(User.objects.filter(username__startswith=f'{PREFIJO_SINTETICO}{etiqueta}_').order_by('id'))
+
+    def generar_datos(self, options):
+        inicio = reloj.perf_counter()
+        password_hash = make_password('benchmark')
+        aleatorio = self.aleatorio
+
+        especialidades = [
+            Especialidad.objects.create(
+                nombre_especialidad=f'{PREFIJO_SINTETICO}Especialidad {indice}',
+                duracion_consulta_minutos=aleatorio.choice([20, 30, 40])
+            )
+            for indice in range(options['especialidades'])
+        ]
+
+        usuarios_profesionales = self._crear_usuarios('profesional', options['profesionales'], password_hash)
+        ProfesionalSalud.objects.bulk_create([
+            ProfesionalSalud(user_account=usuario, especialidad=especialidades[indice % len(especialidades)])
+            for indice, usuario in enumerate(usuarios_profesionales)
+        ])
+        profesionales = list(
+            ProfesionalSalud.objects.filter(user_account__in=usuarios_profesionales).select_related('especialidad', 'user_account')
+        )
+        PlantillaHorarioMedico.objects.bulk_create([
+            PlantillaHorarioMedico(profesional=profesional, dia_semana=dia, hora_inicio_bloque=inicio_bloque, hora_fin_bloque=fin_bloque)
+            for profesional in profesionales
+            for dia in range(5)
+            for inicio_bloque, fin_bloque in BLOQUES_SINTETICOS
+        ])
+
+        usuarios_pacientes = self._crear_usuarios('paciente', options['pacientes'], password_hash)
+        Paciente.objects.bulk_create([
+            Paciente(user_account=usuario, numero_documento=f'9{indice:09d}', fecha_nacimiento='1990-01-01')
+            for indice, usuario in enumerate(usuarios_pacientes)
+        ])
+        pacientes = list(Paciente.objects.filter(user_account__in=usuarios_pacientes).order_by('id'))
+
+        asesor_usuario = self._crear_usuarios('asesor', 1, password_hash)[0]
+        asesor = AsesorServicio.objects.create(user_account=asesor_usuario)
+
+        # Citas sin solapamiento: cada profesional recibe slots distintos de días hábiles en [-60, +30] días
+        current_tz = timezone.get_current_timezone()
+        hoy = timezone.localdate()
+        dias_habiles = [hoy + timedelta(days=desplazamiento) for desplazamiento in range(-60, 31) if (hoy + timedelta(days=desplazamiento)).weekday() < 5]
+        slots_por_profesional = {}
+        for profesional in profesionales:
+            duracion = timedelta(minutes=profesional.especialidad.duracion_consulta_minutos)
+            slots = []
+            for fecha in dias_habiles:
+                for inicio_bloque, fin_bloque in BLOQUES_SINTETICOS:
+                    inicio_slot = datetime.combine(fecha, inicio_bloque)
+                    while inicio_slot + duracion <= datetime.combine(fecha, fin_bloque):
+                        slots.append(inicio_slot)
+                        inicio_slot += duracion
+            aleatorio.shuffle(slots)
+            slots_por_profesional[profesional.id] = slots
+
+        citas = []
+        for indice in range(options['citas']):
+            profesional = profesionales[indice % len(profesionales)]
+            slots = slots_por_profesional[profesional.id]
+            if not slots:
+                continue
+            inicio_local = slots.pop()
+            inicio_cita = timezone.make_aware(inicio_local, current_tz)
+            if inicio_local.date() < hoy:
+                estado = aleatorio.choices(['Realizada', 'No_Asistio', 'Cancelada'], weights=[80, 10, 10])[0]
+            else:
+                estado = aleatorio.choices(['Programada', 'Cancelada'], weights=[90, 10])[0]
+            citas.append(Cita(
+                paciente=pacientes[aleatorio.randrange(len(pacientes))],
+                profesional=profesional,
+                especialidad_id=profesional.especialidad_id,
+                asesor_que_agenda=asesor,
+                fecha_hora_inicio_cita=inicio_cita,
+                fecha_hora_fin_cita=inicio_cita + timedelta(minutes=profesional.especialidad.duracion_consulta_minutos),
+                estado_cita=estado,
+            ))
+        Cita.objects.bulk_create(citas, batch_size=1000)
+
+        # bulk_create no emite señales: se reconstruyen las tablas derivadas como en un despliegue real
+        materializar_horizonte()
+        recalcular_ocupacion()
+        caches[settings.DISPONIBILIDAD_CACHE_ALIAS].clear()
+
+        self.stdout.write(
+            f'Datos sintéticos: {len(profesionales)} profesionales, {len(pacientes)} pacientes, '
+            f'{len(citas)} citas ({reloj.perf_counter() - inicio:.1f} s)'
+        )
+        pacientes_sin_citas = pacientes[:]
+        aleatorio.shuffle(pacientes_sin_citas)
+        return {
+            'asesor': asesor_usuario,
+            'profesionales': profesionales,
+            'pacientes': pacientes_sin_citas,
+            'dias_futuros': [fecha for fecha in dias_habiles if fecha > hoy],
+        }
+
+    # ------------------------------------------------------------------
+    # Escenarios medidos
+    # ------------------------------------------------------------------
+
+    def _cliente_asesor(self, usuario):
+        cliente = Client()
+        cliente.force_login(usuario)
+        # SessionIntegrityMiddleware exige la marca que registra el login normal
+        sesion = cliente.session
+        sesion['login_timestamp'] = timezone.now().isoformat()
+        sesion.save()
+        return cliente
+
+    def _medir(self, nombre, peticiones):
+        """Ejecuta cada petición (callable) midiendo latencia y consultas SQL."""
+        latencias = []
+        consultas = []
+        estados = {}
+        for peticion in peticiones:
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = reloj.perf_counter()
+                respuesta = peticion()
+                latencias.append((reloj.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas.captured_queries))
+            estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+
+        if not latencias:
+            return {'escenario': nombre, 'peticiones': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+                    'max_ms': None, 'consultas_promedio': None, 'consultas_max': None, 'estados_http': {}}
+        percentiles = statistics.quantiles(latencias, n=100, method='inclusive') if len(latencias) > 1 else latencias * 99
+        return {
+            'escenario': nombre,
+            'peticiones': len(latencias),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'max_ms': round(max(latencias), 2),
+            'consultas_promedio': round(statistics.mean(consultas), 1),
+            'consultas_max': max(consultas),
+            'estados_http': {str(estado): cantidad for estado, cantidad in sorted(estados.items())},
+        }
+
+    def ejecutar_escenarios(self, datos, iteraciones):
+        aleatorio = self.aleatorio
+        cliente = self._cliente_asesor(datos['asesor'])
+        profesionales = datos['profesionales']
+        dias_futuros = datos['dias_futuros']
+
+        def consulta_aleatoria(rango_dias):
+            profesional = aleatorio.choice(profesionales)
+            parametros = {
+                'profesional': profesional.id,
+                'fecha': aleatorio.choice(dias_futuros).strftime('%Y-%m-%d'),
+                'rango_dias': rango_dias,
+            }
+            return lambda: cliente.get(reverse('agendamiento:consultar_disponibilidad'), parametros)
+
+        def api_aleatoria():
+            profesional = aleatorio.choice(profesionales)
+            parametros = {'profesional': profesional.id, 'fecha': aleatorio.choice(dias_futuros).strftime('%Y-%m-%d')}
+            return lambda: cliente.get(reverse('agendamiento:api_disponibilidad'), parametros)
+
+        def reservas():
+            # Los slots libres se eligen fuera de la medición; cada reserva usa un paciente distinto
+            pacientes = iter(datos['pacientes'])
+            for _ in range(iteraciones):
+                profesional = aleatorio.choice(profesionales)
+                fecha = aleatorio.choice(dias_futuros)
+                slots, _tiene_horario = obtener_slots_disponibles(profesional, fecha)
+                if not slots:
+                    continue
+                hora_inicio, _hora_fin = aleatorio.choice(slots)
+                url = reverse('agendamiento:seleccionar_paciente_para_cita', kwargs={
+                    'profesional_id': profesional.id,
+                    'fecha_seleccionada_str': fecha.strftime('%Y-%m-%d'),
+                    'hora_inicio_slot_str': hora_inicio.strftime('%H:%M'),
+                })
+                paciente = next(pacientes)
+                yield lambda url=url, paciente=paciente: cliente.post(url, {'paciente_id_confirmado': paciente.id})
+
+        def listado_citas():
+            profesional = aleatorio.choice(profesionales)
+            return lambda: cliente.get(reverse('agendamiento:visualizar_citas_gestionadas'), {'profesional': profesional.id})
+
+        def listado_pacientes():
+            pagina = aleatorio.randint(1, 20)
+            return lambda: cliente.get(reverse('agendamiento:listar_pacientes'), {'page': pagina})
+
+        return [
+            self._medir('consultar_disponibilidad (1 día)', [consulta_aleatoria(1) for _ in range(iteraciones)]),
+            self._medir('consultar_disponibilidad (7 días)', [consulta_aleatoria(7) for _ in range(iteraciones)]),
+            self._medir('api_disponibilidad', [api_aleatoria() for _ in range(iteraciones)]),
+            self._medir('seleccionar_paciente_para_cita (POST)', reservas()),
+            self._medir('visualizar_citas_gestionadas', [listado_citas() for _ in range(iteraciones)]),
+            self._medir('listar_pacientes', [listado_pacientes() for _ in range(iteraciones)]),
+        ]
+
+    def imprimir_resultados(self, resultados):
+        self.stdout.write(f'\n--- Resultados del Benchmark ({connection.vendor}) ---')
+        self.stdout.write(f"{'Escenario':<40} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'SQL prom':>9} {'SQL max':>8}")
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado['escenario']:<40} {resultado['peticiones']:>5} {resultado['p50_ms']:>9} "
+                f"{resultado['p95_ms']:>9} {resultado['p99_ms']:>9} {resultado['max_ms']:>9} "
+                f"{resultado['consultas_promedio']:>9} {resultado['consultas_max']:>8}"
+            )
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark completado'))
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from time import monotonic, sleep
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+# Comandos que ejecuta el worker y cada cuánto
+TAREAS_PROGRAMADAS = [
+    ('enviar_notificaciones_pendientes', timedelta(minutes=1)),
+    # Avanza el horizonte de SlotDisponible; la primera pasada al arrancar lo pone al día
+    ('materializar_slots_disponibles', timedelta(days=1)),
+    # Cada hora, para incluir las citas de mañana agendadas durante el día; las ya recordadas se omiten
+    ('enviar_recordatorios_citas', timedelta(hours=1)),
+]
+
+# Espera entre dos revisiones de las tareas
+INTERVALO_REVISION_SEGUNDOS = 15
+
+
+class Command(BaseCommand):
+    help = (
+        'Proceso worker que ejecuta periódicamente las tareas de fondo (entrega de la bandeja de '
+        'salida de correos, materialización diaria de slots y recordatorios de citas). En producción corre como proceso '
+        '"worker" del Procfile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Ejecuta cada tarea una sola vez y termina (útil para cron o pruebas)',
+        )
+
+    def handle(self, *args, **options):
+        ultima_ejecucion = {}
+        while True:
+            for comando, periodo in TAREAS_PROGRAMADAS:
+                ahora = monotonic()
+                if comando in ultima_ejecucion and ahora - ultima_ejecucion[comando] < periodo.total_seconds():
+                    continue
+                ultima_ejecucion[comando] = ahora
+                # Un worker de larga duración no debe reutilizar conexiones caídas o vencidas
+                close_old_connections()
+                try:
+                    call_command(comando, stdout=self.stdout, stderr=self.stderr)
+                except Exception as e:
+                    # Un fallo de una tarea no detiene al worker; se reintenta en su siguiente periodo
+                    self.stderr.write(self.style.ERROR(f'✗ {comando} falló: {e}'))
+
+            if options['una_vez']:
+                break
+            sleep(INTERVALO_REVISION_SEGUNDOS)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from agendamiento.notificaciones import (
+    LIMITE_ENTREGA_NOTIFICACIONES, TAMANO_LOTE_NOTIFICACIONES, circuito_abierto,
+    entregar_notificaciones_pendientes, metricas_notificaciones
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Entrega por lotes, con una conexión al servidor de correo por lote, los correos de '
+        'notificación encolados al agendar, modificar o cancelar citas, reintentando los fallidos '
+        'con retroceso exponencial (programar cada minuto; cada lote se reclama antes de enviarlo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=TAMANO_LOTE_NOTIFICACIONES,
+            help=f'Correos por conexión al servidor de correo (por defecto: {TAMANO_LOTE_NOTIFICACIONES})',
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=LIMITE_ENTREGA_NOTIFICACIONES,
+            help=f'Máximo de correos a entregar en esta ejecución (por defecto: {LIMITE_ENTREGA_NOTIFICACIONES})',
+        )
+
+    def handle(self, *args, **options):
+        enviadas, fallidas = entregar_notificaciones_pendientes(
+            limite=options['limite'], tamano_lote=options['tamano_lote']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Se enviaron {enviadas} correo(s) de notificación; {fallidas} fallaron')
+        )
+        if circuito_abierto():
+            self.stdout.write(
+                self.style.WARNING('⚠ Entregas suspendidas temporalmente por fallos seguidos del servidor de correo')
+            )
+
+        metricas = metricas_notificaciones()
+        self.stdout.write(
+            f"Totales: {metricas['enviadas']} enviadas, {metricas['fallidas']} fallidas, "
+            f"{metricas['pendientes']} pendientes ({metricas['en_reintento']} en espera de reintento); "
+            f"latencia promedio {metricas['latencia_promedio_ms']} ms, máxima {metricas['latencia_maxima_ms']} ms"
+        )
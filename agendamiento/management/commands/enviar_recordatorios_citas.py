@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamiento.recordatorios import TAMANO_BLOQUE_RECORDATORIOS, encolar_recordatorios
+
+
+class Command(BaseCommand):
+    help = (
+        "Encola los recordatorios de las citas 'Programada' de mañana; los entrega "
+        'enviar_notificaciones_pendientes (ejecutar a diario; las citas ya recordadas se omiten al repetirlo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Fecha de las citas a recordar en formato AAAA-MM-DD (por defecto: mañana)',
+        )
+        parser.add_argument(
+            '--tamano-bloque',
+            type=int,
+            default=TAMANO_BLOQUE_RECORDATORIOS,
+            help=f'Citas que se leen y encolan por bloque (por defecto: {TAMANO_BLOQUE_RECORDATORIOS})',
+        )
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Formato de fecha inválido. Use AAAA-MM-DD.')
+
+        procesadas, encolados = encolar_recordatorios(fecha, tamano_bloque=options['tamano_bloque'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Se procesaron {procesadas} cita(s) y se encolaron {encolados} recordatorio(s)')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from agendamiento.slots_materializados import materializar_horizonte
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye la tabla de slots precalculados para el horizonte configurado en '
+        'DISPONIBILIDAD_HORIZONTE_DIAS y elimina los días vencidos (ejecutar a diario)'
+    )
+
+    def handle(self, *args, **options):
+        total_profesionales, total_slots = materializar_horizonte()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Se materializaron {total_slots} slots para {total_profesionales} profesional(es)'
+            )
+        )
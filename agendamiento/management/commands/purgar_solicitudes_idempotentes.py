@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from agendamiento.idempotencia import purgar_solicitudes_idempotentes
+
+
+class Command(BaseCommand):
+    help = 'Elimina en lote los resultados de solicitudes idempotentes antiguos (agendamiento y modificación de citas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=24,
+            help='Antigüedad mínima en horas de los registros a eliminar (por defecto: 24)',
+        )
+
+    def handle(self, *args, **options):
+        eliminadas = purgar_solicitudes_idempotentes(horas=options['horas'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Se eliminaron {eliminadas} solicitudes idempotentes con más de {options["horas"]} hora(s)')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from agendamiento.reporte_ocupacion import recalcular_ocupacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye desde la tabla de citas el agregado diario de ocupación por especialidad '
+        '(útil tras cargas masivas o cambios de especialidad de profesionales)'
+    )
+
+    def handle(self, *args, **options):
+        total_filas = recalcular_ocupacion()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Se recalcularon {total_filas} registros de ocupación diaria por especialidad'
+            )
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotDisponible',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('hora_inicio', models.TimeField(verbose_name='Hora de Inicio')),
+                ('hora_fin', models.TimeField(verbose_name='Hora de Fin')),
+                ('ocupado', models.BooleanField(default=False, verbose_name='¿Está ocupado?')),
+                ('profesional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots_disponibles', to='agendamiento.profesionalsalud', verbose_name='Profesional de la Salud')),
+            ],
+            options={
+                'verbose_name': 'Slot Disponible',
+                'verbose_name_plural': 'Slots Disponibles',
+                'ordering': ['profesional', 'fecha', 'hora_inicio'],
+                'unique_together': {('profesional', 'fecha', 'hora_inicio')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_ocupacion_diaria(apps, schema_editor):
+    """Calcula el agregado inicial a partir de las citas existentes."""
+    Cita = apps.get_model('agendamiento', 'Cita')
+    OcupacionDiariaEspecialidad = apps.get_model('agendamiento', 'OcupacionDiariaEspecialidad')
+
+    totales = {}
+    citas = Cita.objects.filter(estado_cita__in=['Programada', 'Realizada', 'No_Asistio']).values_list(
+        'profesional__especialidad_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita'
+    )
+    for especialidad_id, inicio, fin in citas.iterator():
+        clave = (especialidad_id, timezone.localtime(inicio).date())
+        minutos, cantidad = totales.get(clave, (0, 0))
+        totales[clave] = (minutos + max(int((fin - inicio).total_seconds() // 60), 0), cantidad + 1)
+
+    OcupacionDiariaEspecialidad.objects.bulk_create([
+        OcupacionDiariaEspecialidad(
+            especialidad_id=especialidad_id, fecha=fecha, minutos_reservados=minutos, citas_reservadas=cantidad
+        )
+        for (especialidad_id, fecha), (minutos, cantidad) in totales.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0002_slotdisponible'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionDiariaEspecialidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('minutos_reservados', models.IntegerField(default=0, verbose_name='Minutos Reservados')),
+                ('citas_reservadas', models.IntegerField(default=0, verbose_name='Citas Reservadas')),
+                ('especialidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion_diaria', to='agendamiento.especialidad', verbose_name='Especialidad')),
+            ],
+            options={
+                'verbose_name': 'Ocupación Diaria por Especialidad',
+                'verbose_name_plural': 'Ocupación Diaria por Especialidad',
+                'ordering': ['fecha', 'especialidad'],
+                'unique_together': {('especialidad', 'fecha')},
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion_diaria, migrations.RunPython.noop),
+    ]
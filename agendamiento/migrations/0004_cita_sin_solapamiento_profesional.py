@@ -0,0 +1,122 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+# Debe coincidir con agendamiento.models.RESTRICCION_SOLAPAMIENTO_CITA
+RESTRICCION_SOLAPAMIENTO_CITA = 'cita_sin_solapamiento_profesional'
+
+
+SQL_POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    f"""
+    ALTER TABLE agendamiento_cita ADD CONSTRAINT {RESTRICCION_SOLAPAMIENTO_CITA}
+    EXCLUDE USING gist (
+        profesional_id WITH =,
+        tstzrange(fecha_hora_inicio_cita, fecha_hora_fin_cita, '[)') WITH &&
+    ) WHERE (estado_cita = 'Programada')
+    """,
+]
+
+REVERSA_POSTGRESQL = [
+    f'ALTER TABLE agendamiento_cita DROP CONSTRAINT IF EXISTS {RESTRICCION_SOLAPAMIENTO_CITA}',
+]
+
+# SQLite serializa las escrituras: el trigger valida dentro del mismo bloqueo que la inserción
+CONDICION_SOLAPAMIENTO_SQLITE = """
+    SELECT RAISE(ABORT, '{nombre}')
+    WHERE EXISTS (
+        SELECT 1 FROM agendamiento_cita
+        WHERE profesional_id = NEW.profesional_id
+          AND estado_cita = 'Programada'
+          AND fecha_hora_inicio_cita < NEW.fecha_hora_fin_cita
+          AND fecha_hora_fin_cita > NEW.fecha_hora_inicio_cita
+          {filtro_id}
+    );
+"""
+
+SQL_SQLITE = [
+    f"""
+    CREATE TRIGGER {RESTRICCION_SOLAPAMIENTO_CITA}_insert
+    BEFORE INSERT ON agendamiento_cita
+    WHEN NEW.estado_cita = 'Programada'
+    BEGIN
+    {CONDICION_SOLAPAMIENTO_SQLITE.format(nombre=RESTRICCION_SOLAPAMIENTO_CITA, filtro_id='')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER {RESTRICCION_SOLAPAMIENTO_CITA}_update
+    BEFORE UPDATE OF profesional_id, fecha_hora_inicio_cita, fecha_hora_fin_cita, estado_cita ON agendamiento_cita
+    WHEN NEW.estado_cita = 'Programada'
+    BEGIN
+    {CONDICION_SOLAPAMIENTO_SQLITE.format(nombre=RESTRICCION_SOLAPAMIENTO_CITA, filtro_id='AND id <> NEW.id')}
+    END
+    """,
+]
+
+REVERSA_SQLITE = [
+    f'DROP TRIGGER IF EXISTS {RESTRICCION_SOLAPAMIENTO_CITA}_insert',
+    f'DROP TRIGGER IF EXISTS {RESTRICCION_SOLAPAMIENTO_CITA}_update',
+]
+
+
+def _ejecutar(schema_editor, sentencias_por_motor):
+    for sentencia in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+# Ids de citas conflictivas que se listan como máximo en el mensaje de error
+MAX_CITAS_LISTADAS = 50
+
+
+def verificar_citas_solapadas(apps, schema_editor):
+    """
+    Aborta la migración si ya existen citas 'Programada' del mismo profesional que se cruzan.
+
+    La restricción no puede crearse sobre datos que la violan; en lugar del
+    error genérico del motor se listan las citas en conflicto para que se
+    cancelen o reprogramen antes de volver a ejecutar migrate.
+    """
+    Cita = apps.get_model('agendamiento', 'Cita')
+    citas = Cita.objects.using(schema_editor.connection.alias)
+    cruce = citas.filter(
+        profesional_id=OuterRef('profesional_id'),
+        estado_cita='Programada',
+        fecha_hora_inicio_cita__lt=OuterRef('fecha_hora_fin_cita'),
+        fecha_hora_fin_cita__gt=OuterRef('fecha_hora_inicio_cita'),
+    ).exclude(pk=OuterRef('pk'))
+    conflictivas = list(
+        citas.filter(estado_cita='Programada')
+        .filter(Exists(cruce))
+        .order_by('profesional_id', 'fecha_hora_inicio_cita', 'id')
+        .values_list('id', flat=True)
+    )
+    if conflictivas:
+        listadas = ', '.join(str(cita_id) for cita_id in conflictivas[:MAX_CITAS_LISTADAS])
+        if len(conflictivas) > MAX_CITAS_LISTADAS:
+            listadas += ', ...'
+        raise RuntimeError(
+            f"No se puede crear la restricción {RESTRICCION_SOLAPAMIENTO_CITA}: hay {len(conflictivas)} "
+            f"citas 'Programada' que se cruzan con otra del mismo profesional (ids: {listadas}). "
+            "Cancele o reprograme las citas duplicadas y vuelva a ejecutar migrate."
+        )
+
+
+def crear_restriccion(apps, schema_editor):
+    """Crea la restricción de no solapamiento según el motor de base de datos."""
+    verificar_citas_solapadas(apps, schema_editor)
+    _ejecutar(schema_editor, {'postgresql': SQL_POSTGRESQL, 'sqlite': SQL_SQLITE})
+
+
+def eliminar_restriccion(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': REVERSA_POSTGRESQL, 'sqlite': REVERSA_SQLITE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0003_ocupaciondiariaespecialidad'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restriccion, eliminar_restriccion),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0004_cita_sin_solapamiento_profesional'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetencionSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora_inicio', models.DateTimeField(verbose_name='Fecha y Hora de Inicio')),
+                ('fecha_hora_fin', models.DateTimeField(verbose_name='Fecha y Hora de Fin')),
+                ('expira_en', models.DateTimeField(db_index=True, verbose_name='Expira en')),
+                ('profesional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retenciones_slot', to='agendamiento.profesionalsalud', verbose_name='Profesional de la Salud')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retenciones_slot', to=settings.AUTH_USER_MODEL, verbose_name='Usuario que retiene')),
+            ],
+            options={
+                'verbose_name': 'Retención de Slot',
+                'verbose_name_plural': 'Retenciones de Slots',
+                'ordering': ['expira_en'],
+                'indexes': [models.Index(fields=['profesional', 'fecha_hora_inicio'], name='agendamient_profesi_456265_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0005_retencionslot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, verbose_name='Clave de Idempotencia')),
+                ('operacion', models.CharField(max_length=50, verbose_name='Operación')),
+                ('completada', models.BooleanField(default=False, verbose_name='¿Está completada?')),
+                ('url_redireccion', models.CharField(blank=True, max_length=500, verbose_name='URL de Redirección')),
+                ('mensajes', models.JSONField(blank=True, default=list, verbose_name='Mensajes')),
+                ('creada_en', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creada en')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solicitudes_idempotentes', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Solicitud Idempotente',
+                'verbose_name_plural': 'Solicitudes Idempotentes',
+                'ordering': ['-creada_en'],
+                'unique_together': {('usuario', 'clave')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0006_solicitudidempotente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntradaListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_desde', models.DateField(verbose_name='Disponible Desde')),
+                ('fecha_hasta', models.DateField(verbose_name='Disponible Hasta')),
+                ('estado', models.CharField(choices=[('Esperando', 'Esperando'), ('Asignada', 'Asignada'), ('Retirada', 'Retirada')], default='Esperando', max_length=20, verbose_name='Estado')),
+                ('creada_en', models.DateTimeField(auto_now_add=True, verbose_name='Creada en')),
+                ('asesor_que_registra', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entradas_lista_espera', to='agendamiento.asesorservicio', verbose_name='Asesor que Registra')),
+                ('cita_asignada', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entradas_lista_espera', to='agendamiento.cita', verbose_name='Cita Asignada')),
+                ('especialidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='agendamiento.especialidad', verbose_name='Especialidad')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entradas_lista_espera', to='agendamiento.paciente', verbose_name='Paciente')),
+                ('profesional_preferido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entradas_lista_espera', to='agendamiento.profesionalsalud', verbose_name='Profesional Preferido')),
+            ],
+            options={
+                'verbose_name': 'Entrada de Lista de Espera',
+                'verbose_name_plural': 'Lista de Espera',
+                'ordering': ['creada_en'],
+                'indexes': [models.Index(fields=['especialidad', 'estado', 'creada_en'], name='agendamient_especia_0439c2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:11
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+restriccion_solapamiento = import_module('agendamiento.migrations.0004_cita_sin_solapamiento_profesional')
+
+
+def recrear_triggers_sqlite(apps, schema_editor):
+    """
+    SQLite agrega la columna reconstruyendo la tabla, lo que elimina los
+    triggers de no solapamiento; se vuelven a crear tras el cambio.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in restriccion_solapamiento.REVERSA_SQLITE + restriccion_solapamiento.SQL_SQLITE:
+        schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0007_entradalistaespera'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_sqlite),
+        migrations.AddField(
+            model_name='cita',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Versión'),
+        ),
+        migrations.RunPython(recrear_triggers_sqlite, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0008_cita_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionCorreo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254, verbose_name='Destinatario')),
+                ('asunto', models.CharField(max_length=255, verbose_name='Asunto')),
+                ('cuerpo', models.TextField(verbose_name='Cuerpo')),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Enviada', 'Enviada'), ('Fallida', 'Fallida')], default='Pendiente', max_length=20, verbose_name='Estado')),
+                ('error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('creada_en', models.DateTimeField(auto_now_add=True, verbose_name='Creada en')),
+                ('enviada_en', models.DateTimeField(blank=True, null=True, verbose_name='Enviada en')),
+                ('cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificaciones', to='agendamiento.cita', verbose_name='Cita')),
+            ],
+            options={
+                'verbose_name': 'Notificación por Correo',
+                'verbose_name_plural': 'Notificaciones por Correo',
+                'ordering': ['creada_en'],
+                'indexes': [models.Index(fields=['estado', 'creada_en'], name='agendamient_estado_9ff9bf_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0009_notificacioncorreo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='recordatorio_enviado_en',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Recordatorio Encolado en'),
+        ),
+    ]
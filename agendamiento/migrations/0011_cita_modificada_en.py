@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:17
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+cita_version = import_module('agendamiento.migrations.0008_cita_version')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0010_cita_recordatorio_enviado_en'),
+    ]
+
+    # SQLite reconstruye la tabla para agregar la columna: se recrean los triggers de no solapamiento
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, cita_version.recrear_triggers_sqlite),
+        migrations.AddField(
+            model_name='cita',
+            name='modificada_en',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='Última Modificación'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['profesional', 'modificada_en'], name='agendamient_profesi_c47cde_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'modificada_en'], name='agendamient_pacient_742474_idx'),
+        ),
+        migrations.RunPython(cita_version.recrear_triggers_sqlite, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0011_cita_modificada_en'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacioncorreo',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Intentos de Envío'),
+        ),
+        migrations.AddField(
+            model_name='notificacioncorreo',
+            name='latencia_ms',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Latencia del Último Intento (ms)'),
+        ),
+        migrations.AddField(
+            model_name='notificacioncorreo',
+            name='proximo_intento_en',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Próximo Intento en'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacioncorreo',
+            index=models.Index(fields=['estado', 'proximo_intento_en'], name='agendamient_estado_06b68b_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0012_notificacioncorreo_reintentos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora_inicio_cita', 'id'], name='agendamient_fecha_h_b078d2_idx'),
+        ),
+    ]
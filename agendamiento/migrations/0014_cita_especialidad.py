@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:33
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+cita_version = import_module('agendamiento.migrations.0008_cita_version')
+
+
+def asignar_especialidad_citas(apps, schema_editor):
+    """Las citas existentes quedan con la especialidad actual de su profesional."""
+    Cita = apps.get_model('agendamiento', 'Cita')
+    ProfesionalSalud = apps.get_model('agendamiento', 'ProfesionalSalud')
+    Cita.objects.filter(especialidad__isnull=True).update(
+        especialidad_id=Subquery(
+            ProfesionalSalud.objects.filter(pk=OuterRef('profesional_id')).values('especialidad_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0013_cita_indice_paginacion'),
+    ]
+
+    # Agregar la columna nullable no reconstruye la tabla, pero quitarla al revertir sí:
+    # se recrean los triggers de no solapamiento en ese sentido
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, cita_version.recrear_triggers_sqlite),
+        migrations.AddField(
+            model_name='cita',
+            name='especialidad',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='citas', to='agendamiento.especialidad', verbose_name='Especialidad Agendada'),
+        ),
+        migrations.RunPython(asignar_especialidad_citas, migrations.RunPython.noop),
+    ]
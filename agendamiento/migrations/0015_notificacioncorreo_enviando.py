@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0014_cita_especialidad'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacioncorreo',
+            name='estado',
+            field=models.CharField(choices=[('Pendiente', 'Pendiente'), ('Enviando', 'Enviando'), ('Enviada', 'Enviada'), ('Fallida', 'Fallida')], default='Pendiente', max_length=20, verbose_name='Estado'),
+        ),
+    ]
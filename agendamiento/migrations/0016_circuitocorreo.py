@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0015_notificacioncorreo_enviando'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CircuitoCorreo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fallos_consecutivos', models.PositiveIntegerField(default=0, verbose_name='Fallos Consecutivos del Servidor')),
+                ('abierto_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Abierto hasta')),
+            ],
+            options={
+                'verbose_name': 'Cortacircuitos de Correo',
+                'verbose_name_plural': 'Cortacircuitos de Correo',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:42
+
+import agendamiento.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamiento', '0016_circuitocorreo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuscripcionCalendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(default=agendamiento.models.generar_clave_calendario, editable=False, max_length=64, unique=True, verbose_name='Clave del Feed')),
+                ('creada_en', models.DateTimeField(auto_now=True, verbose_name='Generada en')),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='suscripcion_calendario', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Suscripción de Calendario',
+                'verbose_name_plural': 'Suscripciones de Calendario',
+            },
+        ),
+    ]
@@ -2,8 +2,16 @@
 Modelos del Sistema de Agendamiento de Citas.
 
 Define las entidades principales: Especialidad, Paciente, ProfesionalSalud,
-PlantillaHorarioMedico, AsesorServicio y Cita.
+PlantillaHorarioMedico, AsesorServicio y Cita; las tablas materializadas
+SlotDisponible y OcupacionDiariaEspecialidad; y las tablas de apoyo al
+agendamiento: RetencionSlot (retenciones temporales de horarios),
+SolicitudIdempotente (resultados de POST repetibles) y EntradaListaEspera
+(lista de espera por especialidad); SuscripcionCalendario (claves de los
+feeds ICS); y la bandeja de salida de correos (NotificacionCorreo) con su
+cortacircuitos (CircuitoCorreo).
 """
+import secrets
+from collections import namedtuple
 from datetime import date
 
 from django.contrib.auth.models import User
@@ -12,6 +20,21 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 
+# Valores de una cita que afectan la disponibilidad de la agenda (y la especialidad con la que se agendó)
+ValoresAgendaCita = namedtuple(
+    'ValoresAgendaCita', ['profesional_id', 'inicio', 'fin', 'estado', 'especialidad_id'], defaults=(None,)
+)
+
+# Restricción de base de datos que impide citas 'Programada' solapadas de un mismo profesional
+# (exclusión GiST en PostgreSQL, triggers en SQLite; ver migración 0004)
+RESTRICCION_SOLAPAMIENTO_CITA = 'cita_sin_solapamiento_profesional'
+
+
+def es_error_solapamiento_cita(error):
+    """Indica si un IntegrityError proviene de la restricción de no solapamiento de citas."""
+    return RESTRICCION_SOLAPAMIENTO_CITA in str(error)
+
+
 # ============================================================================
 # CATÁLOGOS Y ESPECIALIDADES
 # ============================================================================
@@ -257,7 +280,11 @@ class Cita(models.Model):
     Cita médica entre paciente y profesional de salud.
     
     Gestiona el agendamiento de citas con estados (Programada, Cancelada, Realizada, No Asistió).
-    Valida que la fecha/hora de fin sea posterior a la de inicio.
+    Valida que la fecha/hora de fin sea posterior a la de inicio. La
+    especialidad se fija al agendar con la del profesional, para que el
+    reporte de ocupación no cambie si el profesional cambia de especialidad. El campo
+    version se incrementa en cada escritura para el control de concurrencia
+    optimista y modificada_en alimenta la sincronización de los calendarios.
     """
 
     ESTADOS_CITA = [
@@ -279,6 +306,14 @@ class Cita(models.Model):
         related_name='citas_atendidas',
         verbose_name="Profesional de la Salud"
     )
+    especialidad = models.ForeignKey(
+        Especialidad,
+        on_delete=models.PROTECT,
+        null=True,
+        editable=False,
+        related_name='citas',
+        verbose_name="Especialidad Agendada"
+    )
     asesor_que_agenda = models.ForeignKey(
         AsesorServicio,
         on_delete=models.SET_NULL,
@@ -299,10 +334,57 @@ class Cita(models.Model):
         default='Programada',
         verbose_name="Estado de la Cita"
     )
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Versión"
+    )
+    recordatorio_enviado_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Recordatorio Encolado en"
+    )
+    modificada_en = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        verbose_name="Última Modificación"
+    )
 
     def __str__(self):
         return f"Cita para {self.paciente} con {self.profesional} - {self.fecha_hora_inicio_cita.strftime('%d/%m/%Y %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        """
+        Fija la especialidad al agendar e incrementa la versión al guardar una
+        cita existente (ver concurrencia_citas).
+        """
+        if self.especialidad_id is None and self.profesional_id is not None:
+            self.especialidad_id = self.profesional.especialidad_id
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Conserva los valores de agenda cargados para detectar cambios al guardar."""
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_agenda_originales = instancia.valores_agenda()
+        return instancia
+
+    def valores_agenda(self):
+        """
+        Retorna los valores que afectan la disponibilidad (profesional, horario y estado) y la especialidad.
+
+        Si algún campo fue diferido en la consulta retorna None en lugar de recargarlo.
+        """
+        campos = ('profesional_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita', 'estado_cita', 'especialidad_id')
+        if any(campo not in self.__dict__ for campo in campos):
+            return None
+        return ValoresAgendaCita(*(self.__dict__[campo] for campo in campos))
+
     def clean(self):
         """Valida que la fecha/hora de fin sea posterior a la de inicio."""
         super().clean()
@@ -315,4 +397,416 @@ class Cita(models.Model):
     class Meta:
         verbose_name = "Cita Médica"
         verbose_name_plural = "Citas Médicas"
-        ordering = ['fecha_hora_inicio_cita', 'profesional']
\ No newline at end of file
+        ordering = ['fecha_hora_inicio_cita', 'profesional']
+        indexes = [
+            models.Index(fields=['profesional', 'modificada_en']),
+            models.Index(fields=['paciente', 'modificada_en']),
+            models.Index(fields=['fecha_hora_inicio_cita', 'id']),
+        ]
+
+
+# ============================================================================
+# DISPONIBILIDAD MATERIALIZADA
+# ============================================================================
+
+class SlotDisponible(models.Model):
+    """
+    Slot de agenda precalculado de un profesional de salud.
+    
+    Contiene todos los slots que genera la plantilla para un día del horizonte
+    móvil (settings.DISPONIBILIDAD_HORIZONTE_DIAS), marcados como ocupados o
+    libres. Se actualiza de forma incremental cuando cambian citas o plantillas.
+    """
+
+    profesional = models.ForeignKey(
+        ProfesionalSalud,
+        on_delete=models.CASCADE,
+        related_name='slots_disponibles',
+        verbose_name="Profesional de la Salud"
+    )
+    fecha = models.DateField(
+        verbose_name="Fecha"
+    )
+    hora_inicio = models.TimeField(
+        verbose_name="Hora de Inicio"
+    )
+    hora_fin = models.TimeField(
+        verbose_name="Hora de Fin"
+    )
+    ocupado = models.BooleanField(
+        default=False,
+        verbose_name="¿Está ocupado?"
+    )
+
+    def __str__(self):
+        estado = "Ocupado" if self.ocupado else "Libre"
+        return f"{self.profesional} - {self.fecha.strftime('%d/%m/%Y')} {self.hora_inicio.strftime('%H:%M')} ({estado})"
+
+    class Meta:
+        verbose_name = "Slot Disponible"
+        verbose_name_plural = "Slots Disponibles"
+        unique_together = [['profesional', 'fecha', 'hora_inicio']]
+        ordering = ['profesional', 'fecha', 'hora_inicio']
+
+
+class OcupacionDiariaEspecialidad(models.Model):
+    """
+    Agregado diario de minutos reservados por especialidad.
+    
+    Se actualiza de forma incremental cada vez que una cita cambia de estado,
+    horario o profesional; alimenta el reporte de ocupación por especialidad.
+    """
+
+    especialidad = models.ForeignKey(
+        Especialidad,
+        on_delete=models.CASCADE,
+        related_name='ocupacion_diaria',
+        verbose_name="Especialidad"
+    )
+    fecha = models.DateField(
+        verbose_name="Fecha"
+    )
+    minutos_reservados = models.IntegerField(
+        default=0,
+        verbose_name="Minutos Reservados"
+    )
+    citas_reservadas = models.IntegerField(
+        default=0,
+        verbose_name="Citas Reservadas"
+    )
+
+    def __str__(self):
+        return f"{self.especialidad} - {self.fecha.strftime('%d/%m/%Y')} ({self.minutos_reservados} min)"
+
+    class Meta:
+        verbose_name = "Ocupación Diaria por Especialidad"
+        verbose_name_plural = "Ocupación Diaria por Especialidad"
+        unique_together = [['especialidad', 'fecha']]
+        ordering = ['fecha', 'especialidad']
+
+
+class RetencionSlot(models.Model):
+    """
+    Retención temporal de un horario mientras un asesor busca al paciente.
+    
+    El motor de disponibilidad trata las retenciones vigentes como tiempo
+    ocupado; al vencer (expira_en) el horario vuelve a quedar libre sin
+    intervención y las filas vencidas se eliminan en lote.
+    """
+
+    profesional = models.ForeignKey(
+        ProfesionalSalud,
+        on_delete=models.CASCADE,
+        related_name='retenciones_slot',
+        verbose_name="Profesional de la Salud"
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='retenciones_slot',
+        verbose_name="Usuario que retiene"
+    )
+    fecha_hora_inicio = models.DateTimeField(
+        verbose_name="Fecha y Hora de Inicio"
+    )
+    fecha_hora_fin = models.DateTimeField(
+        verbose_name="Fecha y Hora de Fin"
+    )
+    expira_en = models.DateTimeField(
+        db_index=True,
+        verbose_name="Expira en"
+    )
+
+    def __str__(self):
+        return f"{self.profesional} - {self.fecha_hora_inicio.strftime('%d/%m/%Y %H:%M')} (retenido por {self.usuario})"
+
+    class Meta:
+        verbose_name = "Retención de Slot"
+        verbose_name_plural = "Retenciones de Slots"
+        indexes = [models.Index(fields=['profesional', 'fecha_hora_inicio'])]
+        ordering = ['expira_en']
+
+
+def generar_clave_calendario():
+    """Clave aleatoria de 256 bits para la URL del feed de calendario."""
+    return secrets.token_urlsafe(32)
+
+
+class SuscripcionCalendario(models.Model):
+    """
+    Clave secreta con la que un usuario se suscribe a su feed ICS de citas.
+
+    El feed no usa sesión: la clave de la URL es la única credencial. Se
+    guarda por usuario para poder regenerarla (revocando la URL anterior) y
+    el feed deja de responder si la cuenta se desactiva.
+    """
+
+    usuario = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suscripcion_calendario',
+        verbose_name="Usuario"
+    )
+    clave = models.CharField(
+        max_length=64,
+        unique=True,
+        default=generar_clave_calendario,
+        editable=False,
+        verbose_name="Clave del Feed"
+    )
+    creada_en = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Generada en"
+    )
+
+    def __str__(self):
+        return f"Calendario de {self.usuario}"
+
+    class Meta:
+        verbose_name = "Suscripción de Calendario"
+        verbose_name_plural = "Suscripciones de Calendario"
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Resultado de una solicitud POST identificada por una clave de idempotencia.
+    
+    La clave se genera al mostrar el formulario; si la misma solicitud llega
+    de nuevo (doble clic, reintento de un proxy) se repite el resultado
+    guardado sin volver a ejecutar la vista.
+    """
+
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='solicitudes_idempotentes',
+        verbose_name="Usuario"
+    )
+    clave = models.CharField(
+        max_length=64,
+        verbose_name="Clave de Idempotencia"
+    )
+    operacion = models.CharField(
+        max_length=50,
+        verbose_name="Operación"
+    )
+    completada = models.BooleanField(
+        default=False,
+        verbose_name="¿Está completada?"
+    )
+    url_redireccion = models.CharField(
+        max_length=500,
+        blank=True,
+        verbose_name="URL de Redirección"
+    )
+    mensajes = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Mensajes"
+    )
+    creada_en = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Creada en"
+    )
+
+    def __str__(self):
+        estado = "Completada" if self.completada else "En proceso"
+        return f"{self.operacion} - {self.clave} ({estado})"
+
+    class Meta:
+        verbose_name = "Solicitud Idempotente"
+        verbose_name_plural = "Solicitudes Idempotentes"
+        unique_together = [['usuario', 'clave']]
+        ordering = ['-creada_en']
+
+
+class EntradaListaEspera(models.Model):
+    """
+    Paciente en lista de espera para una especialidad.
+    
+    Cuando se cancela una cita, el cupo liberado se asigna al paciente que
+    lleva más tiempo esperando en la especialidad y cuya ventana de fechas
+    (y profesional preferido, si lo indicó) admite el horario.
+    """
+
+    ESTADOS_ENTRADA = [
+        ('Esperando', 'Esperando'),
+        ('Asignada', 'Asignada'),
+        ('Retirada', 'Retirada'),
+    ]
+
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='entradas_lista_espera',
+        verbose_name="Paciente"
+    )
+    especialidad = models.ForeignKey(
+        Especialidad,
+        on_delete=models.CASCADE,
+        related_name='lista_espera',
+        verbose_name="Especialidad"
+    )
+    profesional_preferido = models.ForeignKey(
+        ProfesionalSalud,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='entradas_lista_espera',
+        verbose_name="Profesional Preferido"
+    )
+    fecha_desde = models.DateField(
+        verbose_name="Disponible Desde"
+    )
+    fecha_hasta = models.DateField(
+        verbose_name="Disponible Hasta"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS_ENTRADA,
+        default='Esperando',
+        verbose_name="Estado"
+    )
+    cita_asignada = models.ForeignKey(
+        Cita,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='entradas_lista_espera',
+        verbose_name="Cita Asignada"
+    )
+    asesor_que_registra = models.ForeignKey(
+        AsesorServicio,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='entradas_lista_espera',
+        verbose_name="Asesor que Registra"
+    )
+    creada_en = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Creada en"
+    )
+
+    def __str__(self):
+        return f"{self.paciente} - {self.especialidad} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Entrada de Lista de Espera"
+        verbose_name_plural = "Lista de Espera"
+        indexes = [models.Index(fields=['especialidad', 'estado', 'creada_en'])]
+        ordering = ['creada_en']
+
+
+# ============================================================================
+# NOTIFICACIONES
+# ============================================================================
+
+class NotificacionCorreo(models.Model):
+    """
+    Correo de notificación a un paciente en la bandeja de salida.
+    
+    Se crea en la misma transacción que el cambio de la cita que lo origina
+    y lo entrega después el comando enviar_notificaciones_pendientes, que lo
+    marca 'Enviando' mientras lo tiene reclamado. Si un envío falla por el
+    servidor de correo vuelve a 'Pendiente' y se reintenta en
+    proximo_intento_en, hasta agotar los intentos.
+    """
+
+    ESTADOS_NOTIFICACION = [
+        ('Pendiente', 'Pendiente'),
+        ('Enviando', 'Enviando'),
+        ('Enviada', 'Enviada'),
+        ('Fallida', 'Fallida'),
+    ]
+
+    cita = models.ForeignKey(
+        Cita,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notificaciones',
+        verbose_name="Cita"
+    )
+    destinatario = models.EmailField(
+        verbose_name="Destinatario"
+    )
+    asunto = models.CharField(
+        max_length=255,
+        verbose_name="Asunto"
+    )
+    cuerpo = models.TextField(
+        verbose_name="Cuerpo"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS_NOTIFICACION,
+        default='Pendiente',
+        verbose_name="Estado"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Último Error"
+    )
+    creada_en = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Creada en"
+    )
+    enviada_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Enviada en"
+    )
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Intentos de Envío"
+    )
+    proximo_intento_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Próximo Intento en"
+    )
+    latencia_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Latencia del Último Intento (ms)"
+    )
+
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Notificación por Correo"
+        verbose_name_plural = "Notificaciones por Correo"
+        indexes = [
+            models.Index(fields=['estado', 'creada_en']),
+            models.Index(fields=['estado', 'proximo_intento_en']),
+        ]
+        ordering = ['creada_en']
+
+
+class CircuitoCorreo(models.Model):
+    """
+    Estado del cortacircuitos de entrega de correos (una sola fila).
+
+    Vive en la base de datos para que lo compartan todas las ejecuciones del
+    comando enviar_notificaciones_pendientes y los procesos que lo lanzan.
+    """
+
+    fallos_consecutivos = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Fallos Consecutivos del Servidor"
+    )
+    abierto_hasta = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Abierto hasta"
+    )
+
+    def __str__(self):
+        return f"Cortacircuitos de correo ({self.fallos_consecutivos} fallos)"
+
+    class Meta:
+        verbose_name = "Cortacircuitos de Correo"
+        verbose_name_plural = "Cortacircuitos de Correo"
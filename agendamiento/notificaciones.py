@@ -0,0 +1,251 @@
+"""
+Bandeja de salida de los correos de notificación a pacientes.
+
+Las vistas no se conectan al servidor de correo durante la petición: encolan
+el mensaje como NotificacionCorreo dentro de la misma transacción que crea,
+modifica o cancela la cita, de modo que existe un correo si y solo si el
+cambio se confirmó. El comando enviar_notificaciones_pendientes los entrega
+después, en orden de creación y por lotes que comparten una conexión al
+servidor de correo. Cada lote se reclama marcándolo 'Enviando' antes de
+abrir la conexión, de modo que varias ejecuciones simultáneas del comando no
+envían dos veces el mismo correo.
+
+Un fallo del servidor de correo no pierde el mensaje: queda 'Pendiente' con
+su próximo intento aplazado con retroceso exponencial, hasta agotar
+MAX_INTENTOS_NOTIFICACION. Un destinatario rechazado falla de inmediato,
+porque reintentar no cambiaría la respuesta. Tras UMBRAL_FALLOS_CIRCUITO
+fallos seguidos del servidor se abre un cortacircuitos que suspende las
+entregas durante PAUSA_CIRCUITO; su estado vive en la fila de CircuitoCorreo,
+así que persiste entre ejecuciones del comando.
+"""
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from time import monotonic
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import CircuitoCorreo, NotificacionCorreo
+
+
+# Máximo de correos que entrega una ejecución del comando
+LIMITE_ENTREGA_NOTIFICACIONES = 500
+
+# Correos que se envían por cada conexión al servidor de correo
+TAMANO_LOTE_NOTIFICACIONES = 50
+
+# Intentos de envío antes de marcar un correo como 'Fallida'
+MAX_INTENTOS_NOTIFICACION = 5
+
+# Espera tras el primer fallo; se duplica en cada intento hasta el máximo
+RETRASO_BASE_REINTENTO = timedelta(minutes=1)
+RETRASO_MAXIMO_REINTENTO = timedelta(hours=2)
+
+# Tiempo tras el cual un correo 'Enviando' de una ejecución interrumpida se vuelve a entregar
+PLAZO_RECLAMO_NOTIFICACION = timedelta(minutes=15)
+
+# Fallos seguidos del servidor de correo que abren el cortacircuitos y tiempo que permanece abierto
+UMBRAL_FALLOS_CIRCUITO = 3
+PAUSA_CIRCUITO = timedelta(minutes=5)
+
+# Clave primaria de la única fila de CircuitoCorreo
+ID_CIRCUITO_CORREO = 1
+
+# Errores propios del destinatario: no se reintentan ni cuentan como fallos del servidor
+ERRORES_DESTINATARIO = (SMTPRecipientsRefused,)
+
+
+def encolar_correo(destinatario, asunto, cuerpo, cita=None):
+    """
+    Agrega un correo a la bandeja de salida.
+
+    Debe llamarse dentro de la transacción del cambio que notifica: si esa
+    transacción se revierte, el correo tampoco queda encolado.
+    """
+    return NotificacionCorreo.objects.create(cita=cita, destinatario=destinatario, asunto=asunto, cuerpo=cuerpo)
+
+
+def encolar_correos(notificaciones):
+    """Agrega a la bandeja de salida, con un solo INSERT, una lista de NotificacionCorreo sin guardar."""
+    return NotificacionCorreo.objects.bulk_create(notificaciones)
+
+
+def retraso_reintento(intentos):
+    """Espera antes del siguiente intento tras `intentos` envíos fallidos (1, 2, 4, 8... minutos)."""
+    return min(RETRASO_BASE_REINTENTO * 2 ** (intentos - 1), RETRASO_MAXIMO_REINTENTO)
+
+
+def circuito_abierto():
+    """True mientras las entregas están suspendidas por fallos seguidos del servidor de correo."""
+    return CircuitoCorreo.objects.filter(pk=ID_CIRCUITO_CORREO, abierto_hasta__gt=timezone.now()).exists()
+
+
+def _registrar_fallo_servidor():
+    """
+    Cuenta un fallo del servidor de correo y abre el cortacircuitos al alcanzar el umbral.
+
+    El contador no se reinicia al cerrarse el circuito: el primer intento tras
+    la pausa vuelve a abrirlo si falla y lo cierra del todo si tiene éxito.
+    La fila se bloquea para que dos ejecuciones no pierdan fallos al contarlos.
+
+    Returns:
+        True si el cortacircuitos quedó abierto.
+    """
+    with transaction.atomic():
+        circuito, _ = CircuitoCorreo.objects.select_for_update().get_or_create(pk=ID_CIRCUITO_CORREO)
+        circuito.fallos_consecutivos += 1
+        abierto = circuito.fallos_consecutivos >= UMBRAL_FALLOS_CIRCUITO
+        if abierto:
+            circuito.abierto_hasta = timezone.now() + PAUSA_CIRCUITO
+        circuito.save()
+    return abierto
+
+
+def _registrar_fallo(notificacion, error, definitivo=False):
+    """Anota un intento fallido y programa el reintento o marca el correo como 'Fallida'."""
+    notificacion.intentos += 1
+    notificacion.error = str(error)
+    if definitivo or notificacion.intentos >= MAX_INTENTOS_NOTIFICACION:
+        notificacion.estado = 'Fallida'
+        notificacion.proximo_intento_en = None
+    else:
+        notificacion.estado = 'Pendiente'
+        notificacion.proximo_intento_en = timezone.now() + retraso_reintento(notificacion.intentos)
+
+
+def enviar_lote(notificaciones, conexion=None):
+    """
+    Envía un lote de correos reutilizando una sola conexión al servidor de correo.
+
+    Los mensajes se entregan uno a uno sobre la conexión abierta para que un
+    fallo solo afecte a su propio correo, sin interrumpir el lote ni reenviar
+    los que ya salieron. Si el cortacircuitos se abre a mitad del lote, los
+    correos restantes quedan intactos para la siguiente ejecución. Actualiza
+    en memoria estado, error, intentos, proximo_intento_en, latencia_ms y
+    enviada_en de cada notificación; no guarda.
+
+    Returns:
+        Tupla (enviadas, fallidas); fallidas incluye los correos que se reintentarán.
+    """
+    enviadas = fallidas = 0
+    conexion = conexion or get_connection(fail_silently=False)
+    try:
+        conexion.open()
+    except Exception as e:
+        # Sin conexión fallan todos los correos del lote con el mismo error
+        _registrar_fallo_servidor()
+        for notificacion in notificaciones:
+            _registrar_fallo(notificacion, e)
+        return 0, len(notificaciones)
+
+    try:
+        for notificacion in notificaciones:
+            mensaje = EmailMessage(
+                notificacion.asunto, notificacion.cuerpo, settings.DEFAULT_FROM_EMAIL,
+                [notificacion.destinatario], connection=conexion
+            )
+            inicio = monotonic()
+            try:
+                conexion.send_messages([mensaje])
+            except ERRORES_DESTINATARIO as e:
+                notificacion.latencia_ms = round((monotonic() - inicio) * 1000)
+                _registrar_fallo(notificacion, e, definitivo=True)
+                fallidas += 1
+            except Exception as e:
+                notificacion.latencia_ms = round((monotonic() - inicio) * 1000)
+                _registrar_fallo(notificacion, e)
+                fallidas += 1
+                if _registrar_fallo_servidor():
+                    break
+            else:
+                notificacion.latencia_ms = round((monotonic() - inicio) * 1000)
+                notificacion.intentos += 1
+                notificacion.estado = 'Enviada'
+                notificacion.error = ''
+                notificacion.proximo_intento_en = None
+                notificacion.enviada_en = timezone.now()
+                enviadas += 1
+    finally:
+        conexion.close()
+
+    if enviadas:
+        CircuitoCorreo.objects.filter(pk=ID_CIRCUITO_CORREO, fallos_consecutivos__gt=0).update(fallos_consecutivos=0)
+    return enviadas, fallidas
+
+
+def _reclamar_lote(ahora, cantidad):
+    """
+    Reclama en una transacción corta los correos pendientes más antiguos cuyo reintento ya venció.
+
+    Las filas se leen con SELECT ... FOR UPDATE SKIP LOCKED y se marcan
+    'Enviando' antes de confirmar, así que dos ejecuciones simultáneas del
+    comando nunca toman el mismo correo. También se reclaman los correos
+    'Enviando' cuyo plazo venció, que quedaron de una ejecución interrumpida.
+    Las instancias retornadas conservan en memoria su estado anterior.
+    """
+    with transaction.atomic():
+        lote = list(
+            NotificacionCorreo.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(estado='Pendiente', proximo_intento_en__isnull=True)
+                | Q(estado__in=('Pendiente', 'Enviando'), proximo_intento_en__lte=ahora)
+            )
+            .order_by('creada_en', 'id')[:cantidad]
+        )
+        if lote:
+            NotificacionCorreo.objects.filter(pk__in=[notificacion.pk for notificacion in lote]).update(
+                estado='Enviando', proximo_intento_en=ahora + PLAZO_RECLAMO_NOTIFICACION
+            )
+    return lote
+
+
+def entregar_notificaciones_pendientes(limite=LIMITE_ENTREGA_NOTIFICACIONES, tamano_lote=TAMANO_LOTE_NOTIFICACIONES):
+    """
+    Entrega por lotes los correos pendientes más antiguos cuyo reintento ya venció.
+
+    Cada lote se reclama antes de enviarlo (ver _reclamar_lote), usa una
+    conexión al servidor de correo y registra el resultado de todos sus
+    correos con un solo bulk_update; los que no llegaron a enviarse vuelven a
+    su estado anterior. Se detiene si el cortacircuitos está abierto. Varias
+    ejecuciones del comando pueden correr a la vez sin duplicar correos.
+
+    Returns:
+        Tupla (enviadas, fallidas).
+    """
+    enviadas = fallidas = 0
+    ahora = timezone.now()
+    while enviadas + fallidas < limite and not circuito_abierto():
+        lote = _reclamar_lote(ahora, min(tamano_lote, limite - enviadas - fallidas))
+        if not lote:
+            break
+        enviadas_lote, fallidas_lote = enviar_lote(lote)
+        NotificacionCorreo.objects.bulk_update(
+            lote, ['estado', 'error', 'intentos', 'proximo_intento_en', 'latencia_ms', 'enviada_en']
+        )
+        enviadas += enviadas_lote
+        fallidas += fallidas_lote
+    return enviadas, fallidas
+
+
+def metricas_notificaciones():
+    """
+    Contadores de la bandeja de salida calculados con una sola consulta.
+
+    Returns:
+        Diccionario con enviadas, fallidas, pendientes, en_reintento y la
+        latencia promedio y máxima (ms) de los correos enviados.
+    """
+    metricas = NotificacionCorreo.objects.aggregate(
+        enviadas=Count('id', filter=Q(estado='Enviada')),
+        fallidas=Count('id', filter=Q(estado='Fallida')),
+        pendientes=Count('id', filter=Q(estado__in=('Pendiente', 'Enviando'))),
+        en_reintento=Count('id', filter=Q(estado='Pendiente', intentos__gt=0)),
+        latencia_promedio_ms=Avg('latencia_ms', filter=Q(estado='Enviada')),
+        latencia_maxima_ms=Max('latencia_ms', filter=Q(estado='Enviada')),
+    )
+    metricas['latencia_promedio_ms'] = round(metricas['latencia_promedio_ms'] or 0)
+    metricas['latencia_maxima_ms'] = metricas['latencia_maxima_ms'] or 0
+    return metricas
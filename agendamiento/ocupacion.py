@@ -0,0 +1,75 @@
+"""
+Mapa de ocupación por minuto de la agenda de un profesional en un día.
+
+Representa el día como un entero de 1440 bits (un bit por minuto) con los
+minutos ocupados por citas. El recorrido de slots del motor de
+disponibilidad (disponibilidad.recorrer_slots_dia) lo construye una vez por
+día y decide si cada slot está libre con una operación AND sobre una
+máscara, sin recorrer la lista de citas por cada slot.
+
+Las verificaciones de cruce al agendar o modificar una cita no usan el
+bitmap: construirlo exige leer las citas del día en cada petición y no vería
+las reservas concurrentes. Esas verificaciones las resuelven la consulta
+única de validacion_citas.buscar_conflicto_agendamiento y la restricción de
+no solapamiento de la base de datos (migración 0004), que es la garantía
+definitiva.
+"""
+from datetime import datetime, time
+
+MINUTOS_DIA = 24 * 60
+
+
+def _mascara(desde, hasta):
+    """Máscara con los bits [desde, hasta) encendidos (vacía si el rango es nulo)."""
+    if hasta <= desde:
+        return 0
+    return ((1 << (hasta - desde)) - 1) << desde
+
+
+class MapaOcupacion:
+    """
+    Bitmap de ocupación de un profesional para una fecha.
+
+    Los rangos se reciben como datetime naive en hora local (o datetime.time) y
+    se recortan al día. Se redondean hacia afuera, de modo que segundos
+    sueltos nunca liberan tiempo.
+    """
+
+    __slots__ = ('fecha', 'ocupado')
+
+    def __init__(self, fecha):
+        self.fecha = fecha
+        self.ocupado = 0
+
+    @classmethod
+    def desde_rangos(cls, fecha, rangos_ocupados):
+        """
+        Construye el mapa a partir de los rangos ocupados por citas.
+
+        Args:
+            fecha: Día representado.
+            rangos_ocupados: Iterable de rangos (inicio, fin) naive locales.
+        """
+        mapa = cls(fecha)
+        for inicio, fin in rangos_ocupados:
+            mapa.agregar_ocupado(inicio, fin)
+        return mapa
+
+    def _minuto(self, valor, redondear_arriba):
+        """Convierte un time o datetime naive en minutos desde el inicio del día (recortado)."""
+        if isinstance(valor, time):
+            valor = datetime.combine(self.fecha, valor)
+        segundos = (valor - datetime.combine(self.fecha, time.min)).total_seconds()
+        minuto = int(-(-segundos // 60)) if redondear_arriba else int(segundos // 60)
+        return min(max(minuto, 0), MINUTOS_DIA)
+
+    def _mascara_externa(self, inicio, fin):
+        return _mascara(self._minuto(inicio, False), self._minuto(fin, True))
+
+    def agregar_ocupado(self, inicio, fin):
+        """Marca el rango de una cita como ocupado."""
+        self.ocupado |= self._mascara_externa(inicio, fin)
+
+    def rango_ocupado(self, inicio, fin):
+        """Indica si alguna cita se cruza con el rango."""
+        return bool(self.ocupado & self._mascara_externa(inicio, fin))
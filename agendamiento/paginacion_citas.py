@@ -0,0 +1,85 @@
+"""
+Paginación por cursor (keyset) del listado de citas gestionadas.
+
+El listado se ordena por (fecha_hora_inicio_cita, id) descendente y cada
+página se pide relativa a la última o primera cita de la página vista, con
+un filtro WHERE sobre esa clave en lugar de OFFSET: la base de datos recorre
+el índice desde el cursor, por lo que cada página cuesta lo mismo sin
+importar cuán profunda sea, y las citas que se agregan o cancelan entretanto
+no desplazan ni repiten filas entre páginas.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+# Citas por página del listado
+TAMANO_PAGINA_CITAS = 25
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def codificar_cursor(cita):
+    """Cursor '<microsegundos desde 1970>-<id>' con la clave de orden de una cita."""
+    microsegundos = (cita.fecha_hora_inicio_cita - _EPOCA) // timedelta(microseconds=1)
+    return f'{microsegundos}-{cita.id}'
+
+
+def decodificar_cursor(cursor):
+    """Retorna (fecha_hora_inicio, id) de un cursor, o None si no es válido."""
+    try:
+        microsegundos, cita_id = (int(parte) for parte in cursor.split('-'))
+        return _EPOCA + timedelta(microseconds=microsegundos), cita_id
+    except (ValueError, OverflowError):
+        return None
+
+
+def paginar_citas(citas, despues=None, antes=None, tamano=TAMANO_PAGINA_CITAS):
+    """
+    Retorna una página de citas, de la más reciente a la más antigua.
+
+    Se lee una fila más que el tamaño de página para saber si existe la
+    página siguiente (o la anterior, al retroceder) sin contar el total.
+
+    Args:
+        citas: QuerySet ya filtrado.
+        despues: Cursor de la última cita de la página vista (avanzar a citas más antiguas).
+        antes: Cursor de la primera cita de la página vista (retroceder a citas más recientes).
+        tamano: Citas por página.
+
+    Returns:
+        Tupla (lista de citas, cursor siguiente o None, cursor anterior o None).
+    """
+    clave_despues = decodificar_cursor(despues) if despues else None
+    clave_antes = decodificar_cursor(antes) if antes and not clave_despues else None
+
+    if clave_antes:
+        inicio, cita_id = clave_antes
+        filas = list(
+            citas.filter(fecha_hora_inicio_cita__gte=inicio)
+            .filter(Q(fecha_hora_inicio_cita__gt=inicio) | Q(id__gt=cita_id))
+            .order_by('fecha_hora_inicio_cita', 'id')[:tamano + 1]
+        )
+        if not filas:
+            # Ya no quedan citas más recientes que el cursor: se vuelve a la primera página
+            return paginar_citas(citas, tamano=tamano)
+        hay_anterior, hay_siguiente = len(filas) > tamano, True
+        pagina = filas[:tamano][::-1]
+    else:
+        if clave_despues:
+            inicio, cita_id = clave_despues
+            citas = (
+                citas.filter(fecha_hora_inicio_cita__lte=inicio)
+                .filter(Q(fecha_hora_inicio_cita__lt=inicio) | Q(id__lt=cita_id))
+            )
+        filas = list(citas.order_by('-fecha_hora_inicio_cita', '-id')[:tamano + 1])
+        hay_anterior, hay_siguiente = bool(clave_despues), len(filas) > tamano
+        pagina = filas[:tamano]
+
+    if not pagina:
+        return pagina, None, None
+    return (
+        pagina,
+        codificar_cursor(pagina[-1]) if hay_siguiente else None,
+        codificar_cursor(pagina[0]) if hay_anterior else None,
+    )
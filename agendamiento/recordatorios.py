@@ -0,0 +1,120 @@
+"""
+Recordatorios por correo de las citas de un día (por defecto, el siguiente).
+
+Las citas 'Programada' de la fecha se recorren con un iterador por bloques
+que trae en la misma consulta al paciente, al profesional y su especialidad,
+de modo que armar cada mensaje no genera consultas adicionales. Por cada
+bloque, en una transacción, primero se reclaman las citas: se bloquean con
+select_for_update(skip_locked=True) las que siguen sin recordatorio y se
+marcan con recordatorio_enviado_en con un solo UPDATE. Solo para las citas
+reclamadas se encolan los recordatorios, con un solo INSERT en la bandeja de
+salida, de modo que dos ejecuciones simultáneas (el worker y una manual, por
+ejemplo) nunca encolan dos veces el mismo recordatorio. La entrega queda a
+cargo del comando enviar_notificaciones_pendientes.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import formats, timezone
+
+from .disponibilidad import limites_dia
+from .models import Cita, NotificacionCorreo
+from .notificaciones import encolar_correos
+
+
+# Citas que se leen y encolan por bloque
+TAMANO_BLOQUE_RECORDATORIOS = 500
+
+
+def citas_por_recordar(fecha):
+    """Citas 'Programada' de la fecha que aún no tienen recordatorio, con los datos del mensaje precargados."""
+    inicio_dia, fin_dia = limites_dia(fecha)
+    return Cita.objects.filter(
+        estado_cita='Programada',
+        recordatorio_enviado_en__isnull=True,
+        fecha_hora_inicio_cita__gte=inicio_dia,
+        fecha_hora_inicio_cita__lte=fin_dia
+    ).select_related(
+        'paciente__user_account', 'profesional__user_account', 'profesional__especialidad'
+    ).order_by('id')
+
+
+def _dia_relativo(fecha):
+    """Expresa la fecha de la cita respecto de hoy ('de hoy', 'de mañana' o 'del <fecha>')."""
+    dias = (fecha - timezone.localdate()).days
+    return {0: 'de hoy', 1: 'de mañana'}.get(dias, f"del {formats.date_format(fecha, 'l d/m/Y')}")
+
+
+def mensaje_recordatorio(cita):
+    """Construye la NotificacionCorreo (sin guardar) del recordatorio de una cita."""
+    usuario_paciente = cita.paciente.user_account
+    inicio_local = timezone.localtime(cita.fecha_hora_inicio_cita)
+    especialidad_nombre = cita.profesional.especialidad.nombre_especialidad
+    return NotificacionCorreo(
+        cita=cita,
+        destinatario=usuario_paciente.email,
+        asunto=f"Recordatorio de Cita Médica - {especialidad_nombre}",
+        cuerpo=(
+            f"Estimado(a) {usuario_paciente.get_full_name()},\n\n"
+            f"Le recordamos su cita médica {_dia_relativo(inicio_local.date())}.\n\n"
+            f"Profesional: Dr(a). {cita.profesional.user_account.get_full_name()}\n"
+            f"Especialidad: {especialidad_nombre}\n"
+            f"Fecha: {formats.date_format(inicio_local, 'l d/m/Y')}\n"
+            f"Hora: {inicio_local.strftime('%I:%M %p').lower()}\n\n"
+            f"Por favor, llegue con anticipación. Si no puede asistir, comuníquese con nosotros.\n\n"
+            f"Saludos cordiales,\nIPS Medical Integral"
+        ),
+    )
+
+
+def _encolar_bloque(citas, marca):
+    """
+    Reclama las citas de un bloque y encola solo sus recordatorios, en una transacción.
+
+    Las citas que otro proceso ya marcó o tiene bloqueadas se omiten.
+
+    Returns:
+        Tupla (citas_reclamadas, recordatorios_encolados).
+    """
+    with transaction.atomic():
+        reclamadas = set(
+            Cita.objects.select_for_update(skip_locked=True).filter(
+                id__in=[cita.id for cita in citas],
+                recordatorio_enviado_en__isnull=True
+            ).order_by().values_list('id', flat=True)
+        )
+        if not reclamadas:
+            return 0, 0
+        # Las citas sin email también se marcan para no volver a leerlas
+        Cita.objects.filter(id__in=reclamadas).update(recordatorio_enviado_en=marca)
+        encolados = encolar_correos([
+            mensaje_recordatorio(cita) for cita in citas
+            if cita.id in reclamadas and cita.paciente.user_account.email
+        ])
+    return len(reclamadas), len(encolados)
+
+
+def encolar_recordatorios(fecha=None, tamano_bloque=TAMANO_BLOQUE_RECORDATORIOS):
+    """
+    Encola los recordatorios de las citas 'Programada' de una fecha (por defecto, mañana).
+
+    Returns:
+        Tupla (citas_procesadas, recordatorios_encolados); las citas procesadas
+        son las que esta ejecución reclamó.
+    """
+    fecha = fecha or timezone.localdate() + timedelta(days=1)
+    marca = timezone.now()
+    procesadas = encolados = 0
+    bloque = []
+    for cita in citas_por_recordar(fecha).iterator(chunk_size=tamano_bloque):
+        bloque.append(cita)
+        if len(bloque) == tamano_bloque:
+            reclamadas, encolados_bloque = _encolar_bloque(bloque, marca)
+            procesadas += reclamadas
+            encolados += encolados_bloque
+            bloque = []
+    if bloque:
+        reclamadas, encolados_bloque = _encolar_bloque(bloque, marca)
+        procesadas += reclamadas
+        encolados += encolados_bloque
+    return procesadas, encolados
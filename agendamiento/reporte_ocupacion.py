@@ -0,0 +1,183 @@
+"""
+Reporte de ocupación por especialidad.
+
+La ocupación de un día es la razón entre los minutos reservados por citas y
+los minutos que ofrecen las plantillas horarias de los profesionales de la
+especialidad. Los minutos reservados se leen del agregado diario
+OcupacionDiariaEspecialidad, que se mantiene de forma incremental con la
+señal cita_modificada; los minutos de plantilla se obtienen de las plantillas
+vigentes, que son pocas filas por profesional.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cita, Especialidad, OcupacionDiariaEspecialidad, PlantillaHorarioMedico, ProfesionalSalud
+
+
+# Estados en los que la cita consumió (o consumirá) tiempo de agenda
+ESTADOS_QUE_OCUPAN_AGENDA = ('Programada', 'Realizada', 'No_Asistio')
+
+
+def _minutos_entre(inicio, fin):
+    return max(int((fin - inicio).total_seconds() // 60), 0)
+
+
+def aplicar_cambio_cita_ocupacion(previo, actual):
+    """
+    Aplica sobre el agregado diario la diferencia entre el estado previo y el actual de una cita.
+
+    Los minutos se atribuyen a la especialidad con la que se agendó la cita,
+    aunque el profesional haya cambiado de especialidad después.
+
+    Args:
+        previo: ValoresAgendaCita antes del cambio (None si la cita es nueva).
+        actual: ValoresAgendaCita después del cambio (None si la cita se eliminó).
+    """
+    valores_contados = [
+        (valores, signo)
+        for valores, signo in ((previo, -1), (actual, 1))
+        if valores is not None and valores.estado in ESTADOS_QUE_OCUPAN_AGENDA
+    ]
+    if not valores_contados:
+        return
+
+    # Valores sin especialidad registrada: se usa la actual del profesional
+    sin_especialidad = {valores.profesional_id for valores, _ in valores_contados if valores.especialidad_id is None}
+    especialidad_por_profesional = dict(
+        ProfesionalSalud.objects.filter(id__in=sin_especialidad).values_list('id', 'especialidad_id')
+    ) if sin_especialidad else {}
+
+    deltas = defaultdict(lambda: [0, 0])
+    for valores, signo in valores_contados:
+        especialidad_id = valores.especialidad_id or especialidad_por_profesional.get(valores.profesional_id)
+        if especialidad_id is None:
+            continue
+        clave = (especialidad_id, timezone.localtime(valores.inicio).date())
+        deltas[clave][0] += signo * _minutos_entre(valores.inicio, valores.fin)
+        deltas[clave][1] += signo
+
+    # Cada delta es un solo UPDATE; la fila del día solo se crea la primera vez
+    for (especialidad_id, fecha), (delta_minutos, delta_citas) in deltas.items():
+        if delta_minutos == 0 and delta_citas == 0:
+            continue
+        incrementos = {
+            'minutos_reservados': F('minutos_reservados') + delta_minutos,
+            'citas_reservadas': F('citas_reservadas') + delta_citas,
+        }
+        if OcupacionDiariaEspecialidad.objects.filter(especialidad_id=especialidad_id, fecha=fecha).update(**incrementos):
+            continue
+        with transaction.atomic():
+            agregado, _ = OcupacionDiariaEspecialidad.objects.get_or_create(especialidad_id=especialidad_id, fecha=fecha)
+            OcupacionDiariaEspecialidad.objects.filter(pk=agregado.pk).update(**incrementos)
+
+
+def recalcular_ocupacion():
+    """
+    Reconstruye por completo el agregado diario a partir de la tabla de citas.
+
+    Returns:
+        Número de filas (especialidad, fecha) escritas.
+    """
+    totales = defaultdict(lambda: [0, 0])
+    citas = Cita.objects.filter(estado_cita__in=ESTADOS_QUE_OCUPAN_AGENDA).values_list(
+        Coalesce('especialidad_id', 'profesional__especialidad_id'), 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita'
+    )
+    for especialidad_id, inicio, fin in citas.iterator():
+        clave = (especialidad_id, timezone.localtime(inicio).date())
+        totales[clave][0] += _minutos_entre(inicio, fin)
+        totales[clave][1] += 1
+
+    with transaction.atomic():
+        OcupacionDiariaEspecialidad.objects.all().delete()
+        OcupacionDiariaEspecialidad.objects.bulk_create([
+            OcupacionDiariaEspecialidad(
+                especialidad_id=especialidad_id,
+                fecha=fecha,
+                minutos_reservados=minutos,
+                citas_reservadas=cantidad
+            )
+            for (especialidad_id, fecha), (minutos, cantidad) in totales.items()
+        ])
+    return len(totales)
+
+
+def nivel_ocupacion(porcentaje):
+    """Clasifica un porcentaje de ocupación para colorear el mapa de calor."""
+    if porcentaje is None:
+        return 'sin-horario'
+    if porcentaje >= 100:
+        return 'saturada'
+    if porcentaje >= 80:
+        return 'alta'
+    if porcentaje >= 50:
+        return 'media'
+    return 'baja'
+
+
+def minutos_plantilla_por_especialidad():
+    """Retorna {(especialidad_id, dia_semana): minutos} de las plantillas de profesionales activos."""
+    minutos = defaultdict(int)
+    bloques = PlantillaHorarioMedico.objects.filter(
+        profesional__user_account__is_active=True
+    ).order_by().values_list('profesional__especialidad_id', 'dia_semana', 'hora_inicio_bloque', 'hora_fin_bloque')
+    referencia = date(2000, 1, 1)
+    for especialidad_id, dia_semana, hora_inicio, hora_fin in bloques:
+        minutos[(especialidad_id, dia_semana)] += _minutos_entre(
+            datetime.combine(referencia, hora_inicio), datetime.combine(referencia, hora_fin)
+        )
+    return minutos
+
+
+def construir_reporte_ocupacion(fecha_inicio, dias):
+    """
+    Construye la matriz de ocupación especialidad × día para una ventana de fechas.
+
+    Usa tres consultas: especialidades activas, minutos de plantilla y agregados del rango.
+
+    Returns:
+        Tupla (fechas, filas) donde cada fila es un diccionario con la especialidad
+        y una celda por fecha con minutos reservados, minutos de plantilla, porcentaje
+        (None si ese día la especialidad no tiene plantilla) y nivel de ocupación.
+    """
+    fechas = [fecha_inicio + timedelta(days=desplazamiento) for desplazamiento in range(dias)]
+    especialidades = list(Especialidad.objects.filter(activa=True))
+    minutos_plantilla = minutos_plantilla_por_especialidad()
+    reservados = {
+        (especialidad_id, fecha): minutos
+        for especialidad_id, fecha, minutos in OcupacionDiariaEspecialidad.objects.filter(
+            fecha__gte=fechas[0],
+            fecha__lte=fechas[-1]
+        ).values_list('especialidad_id', 'fecha', 'minutos_reservados')
+    }
+
+    filas = []
+    for especialidad in especialidades:
+        celdas = []
+        total_reservados = 0
+        total_plantilla = 0
+        for fecha in fechas:
+            minutos_reservados = reservados.get((especialidad.id, fecha), 0)
+            minutos_disponibles = minutos_plantilla.get((especialidad.id, fecha.weekday()), 0)
+            total_reservados += minutos_reservados
+            total_plantilla += minutos_disponibles
+            porcentaje = round(100 * minutos_reservados / minutos_disponibles) if minutos_disponibles else None
+            celdas.append({
+                'fecha': fecha,
+                'minutos_reservados': minutos_reservados,
+                'minutos_plantilla': minutos_disponibles,
+                'porcentaje': porcentaje,
+                'nivel': nivel_ocupacion(porcentaje),
+            })
+        porcentaje_total = round(100 * total_reservados / total_plantilla) if total_plantilla else None
+        filas.append({
+            'especialidad': especialidad,
+            'celdas': celdas,
+            'porcentaje_total': porcentaje_total,
+            'nivel_total': nivel_ocupacion(porcentaje_total),
+        })
+    return fechas, filas
@@ -0,0 +1,280 @@
+"""
+Reprogramación masiva de la agenda de un profesional en un día.
+
+Cuando un profesional no puede atender un día, sus citas 'Programada' se
+reasignan a los primeros horarios libres de los profesionales activos de la
+misma especialidad. La disponibilidad de toda la especialidad se carga con
+unas pocas consultas para la ventana de búsqueda y la asignación se resuelve
+en memoria en un solo recorrido ordenado; luego los cambios se aplican en una
+transacción junto con el encolado de las notificaciones, condicionados a que
+cada cita siga 'Programada' y sin cambios desde la planificación.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import formats, timezone
+
+from .disponibilidad import (
+    _bloques_por_profesional, _intervalos_por_profesional, _rangos_retenidos, ahora_local,
+    fusionar_rangos, generar_slots_dia, limites_dia, rangos_ocupados_locales
+)
+from .models import Cita, NotificacionCorreo, ProfesionalSalud
+from .notificaciones import encolar_correos
+from .signals import cita_modificada
+from .validacion_citas import BUFFER_TRASLADO
+
+
+# Días, desde la fecha afectada, en los que se buscan horarios de reemplazo
+DIAS_BUSQUEDA_REPROGRAMACION = 30
+
+# Nuevo horario propuesto para una cita (datetimes aware)
+PropuestaReprogramacion = namedtuple('PropuestaReprogramacion', ['cita', 'profesional', 'inicio', 'fin'])
+
+
+class ConflictoReprogramacion(Exception):
+    """Una cita de la reprogramación fue modificada o cancelada después de planificarla."""
+
+    def __init__(self, cita_id):
+        super().__init__(f"La cita {cita_id} cambió después de planificar la reprogramación.")
+        self.cita_id = cita_id
+
+
+def planificar_reprogramacion_dia(profesional, fecha, dias_busqueda=DIAS_BUSQUEDA_REPROGRAMACION):
+    """
+    Calcula el nuevo horario de cada cita 'Programada' de un profesional en una fecha.
+
+    Cada cita, en orden de hora, toma el primer horario libre de la
+    especialidad (de cualquier profesional, salvo el afectado en esa fecha)
+    que respete el margen de traslado con las demás citas del paciente,
+    incluidas las ya reasignadas. No modifica la base de datos.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud que no atenderá.
+        fecha: Día afectado.
+        dias_busqueda: Número de días, desde la fecha afectada, en los que se buscan horarios.
+
+    Returns:
+        Tupla (propuestas, sin_asignar): lista de PropuestaReprogramacion y
+        lista de citas para las que no se encontró horario.
+    """
+    current_tz = timezone.get_current_timezone()
+    inicio_dia, fin_dia = limites_dia(fecha, current_tz)
+    citas = list(
+        Cita.objects.filter(
+            profesional=profesional,
+            estado_cita='Programada',
+            fecha_hora_inicio_cita__gte=inicio_dia,
+            fecha_hora_inicio_cita__lte=fin_dia
+        ).select_related('paciente__user_account', 'profesional__especialidad').order_by('fecha_hora_inicio_cita')
+    )
+    if not citas:
+        return [], []
+
+    profesionales = list(
+        ProfesionalSalud.objects.filter(
+            especialidad_id=profesional.especialidad_id,
+            user_account__is_active=True
+        ).select_related('user_account', 'especialidad').order_by('id')
+    )
+    fechas = [fecha + timedelta(days=desplazamiento) for desplazamiento in range(dias_busqueda)]
+    profesional_ids = [candidato.id for candidato in profesionales]
+    bloques_por_dia = _bloques_por_profesional(profesional_ids, {dia.weekday() for dia in fechas})
+    intervalos_por_dia = _intervalos_por_profesional(profesional_ids, fechas[0], fechas[-1], current_tz) if bloques_por_dia else {}
+    retenidos_por_dia = _rangos_retenidos(profesional_ids, fechas[0], fechas[-1], current_tz) if bloques_por_dia else {}
+
+    # Horarios libres de toda la especialidad, ordenados por inicio
+    desde = ahora_local(current_tz)
+    duracion_consulta = profesional.especialidad.duracion_consulta_minutos
+    slots_libres = []
+    for orden, candidato in enumerate(profesionales):
+        for dia in fechas:
+            bloques = bloques_por_dia.get((candidato.id, dia.weekday()))
+            if not bloques or (candidato.id == profesional.id and dia == fecha):
+                continue
+            rangos_ocupados = rangos_ocupados_locales(intervalos_por_dia.get((candidato.id, dia), []), current_tz)
+            if (candidato.id, dia) in retenidos_por_dia:
+                rangos_ocupados = fusionar_rangos(rangos_ocupados + retenidos_por_dia[(candidato.id, dia)])
+            for hora_inicio, hora_fin in generar_slots_dia(dia, bloques, rangos_ocupados, duracion_consulta, desde=desde):
+                slots_libres.append((datetime.combine(dia, hora_inicio), orden, datetime.combine(dia, hora_fin)))
+    slots_libres.sort()
+
+    # Otras citas de los pacientes afectados, para respetar el margen de traslado
+    citas_ids = [cita.id for cita in citas]
+    rangos_pacientes = {}
+    for paciente_id, inicio, fin in Cita.objects.filter(
+        paciente_id__in={cita.paciente_id for cita in citas},
+        estado_cita='Programada',
+        fecha_hora_inicio_cita__lt=limites_dia(fechas[-1], current_tz)[1] + BUFFER_TRASLADO,
+        fecha_hora_fin_cita__gt=inicio_dia - BUFFER_TRASLADO
+    ).exclude(id__in=citas_ids).values_list('paciente_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita'):
+        rangos_pacientes.setdefault(paciente_id, []).append((
+            timezone.localtime(inicio, current_tz).replace(tzinfo=None),
+            timezone.localtime(fin, current_tz).replace(tzinfo=None),
+        ))
+
+    propuestas = []
+    sin_asignar = []
+    tomados = set()
+    for cita in citas:
+        rangos_paciente = rangos_pacientes.setdefault(cita.paciente_id, [])
+        for indice, (inicio, orden, fin) in enumerate(slots_libres):
+            if indice in tomados:
+                continue
+            if any(
+                otro_inicio < fin + BUFFER_TRASLADO and otro_fin > inicio - BUFFER_TRASLADO
+                for otro_inicio, otro_fin in rangos_paciente
+            ):
+                continue
+            tomados.add(indice)
+            rangos_paciente.append((inicio, fin))
+            propuestas.append(PropuestaReprogramacion(
+                cita,
+                profesionales[orden],
+                timezone.make_aware(inicio, current_tz),
+                timezone.make_aware(fin, current_tz),
+            ))
+            break
+        else:
+            sin_asignar.append(cita)
+    return propuestas, sin_asignar
+
+
+def codificar_propuesta(propuesta):
+    """
+    Codifica una propuesta como '<cita_id>:<versión>:<profesional_id>:<inicio ISO>'.
+
+    La vista previa envía estos valores en campos ocultos para que al confirmar
+    se aplique exactamente la asignación que vio el asesor.
+    """
+    return f'{propuesta.cita.pk}:{propuesta.cita.version}:{propuesta.profesional.pk}:{propuesta.inicio.isoformat()}'
+
+
+def cargar_propuestas_confirmadas(profesional, fecha, codigos):
+    """
+    Reconstruye las propuestas que el asesor confirmó a partir de sus códigos.
+
+    Cada cita conserva en memoria la versión con la que se mostró, de modo que
+    aplicar_reprogramacion rechaza la reprogramación si alguna cambió desde la
+    vista previa. Las citas que ya no existen se reportan como conflicto.
+
+    Returns:
+        Lista de PropuestaReprogramacion, o None si algún código no es válido
+        (otra fecha u otro profesional de origen, especialidad distinta).
+
+    Raises:
+        ConflictoReprogramacion: Si alguna de las citas ya no existe.
+    """
+    confirmadas = []
+    try:
+        for codigo in codigos:
+            cita_id, version, profesional_id, inicio = codigo.split(':', 3)
+            inicio = datetime.fromisoformat(inicio)
+            if timezone.is_naive(inicio):
+                return None
+            confirmadas.append((int(cita_id), int(version), int(profesional_id), inicio))
+    except ValueError:
+        return None
+
+    inicio_dia, fin_dia = limites_dia(fecha)
+    citas = Cita.objects.filter(
+        profesional=profesional,
+        fecha_hora_inicio_cita__gte=inicio_dia,
+        fecha_hora_inicio_cita__lte=fin_dia
+    ).select_related('paciente__user_account', 'profesional__especialidad').in_bulk([fila[0] for fila in confirmadas])
+    profesionales = ProfesionalSalud.objects.filter(
+        especialidad_id=profesional.especialidad_id
+    ).select_related('user_account', 'especialidad').in_bulk([fila[2] for fila in confirmadas])
+    duracion_consulta = timedelta(minutes=profesional.especialidad.duracion_consulta_minutos)
+
+    propuestas = []
+    for cita_id, version, profesional_id, inicio in confirmadas:
+        if profesional_id not in profesionales:
+            return None
+        cita = citas.get(cita_id)
+        if cita is None:
+            raise ConflictoReprogramacion(cita_id)
+        cita.version = version
+        propuestas.append(PropuestaReprogramacion(cita, profesionales[profesional_id], inicio, inicio + duracion_consulta))
+    return propuestas
+
+
+def aplicar_reprogramacion(propuestas):
+    """
+    Aplica las propuestas en una transacción, con un UPDATE condicional por cita.
+
+    Cada cita se mueve solo si sigue 'Programada' y con la versión con la que
+    se planificó (ver concurrencia_citas). Si alguna cambió entretanto se
+    lanza ConflictoReprogramacion y la transacción se revierte, de modo que
+    no se mueve ninguna cita. Si otra petición ocupó alguno de los horarios, la
+    restricción de no solapamiento lanza IntegrityError con el mismo efecto.
+    QuerySet.update no emite post_save, por lo que se emite cita_modificada
+    por cada cita una vez aplicadas todas.
+
+    Returns:
+        Número de citas reprogramadas.
+    """
+    if not propuestas:
+        return 0
+    ahora = timezone.now()
+    with transaction.atomic():
+        for propuesta in propuestas:
+            actualizadas = Cita.objects.filter(
+                pk=propuesta.cita.pk, version=propuesta.cita.version, estado_cita='Programada'
+            ).update(
+                profesional=propuesta.profesional,
+                fecha_hora_inicio_cita=propuesta.inicio,
+                fecha_hora_fin_cita=propuesta.fin,
+                recordatorio_enviado_en=None,
+                modificada_en=ahora,
+                version=F('version') + 1
+            )
+            if not actualizadas:
+                raise ConflictoReprogramacion(propuesta.cita.pk)
+
+        for propuesta in propuestas:
+            cita = propuesta.cita
+            previo = cita.valores_agenda()
+            cita.profesional = propuesta.profesional
+            cita.fecha_hora_inicio_cita = propuesta.inicio
+            cita.fecha_hora_fin_cita = propuesta.fin
+            cita.recordatorio_enviado_en = None
+            cita.modificada_en = ahora
+            cita.version += 1
+            cita._valores_agenda_originales = cita.valores_agenda()
+            cita_modificada.send(sender=Cita, previo=previo, actual=cita._valores_agenda_originales)
+    return len(propuestas)
+
+
+def notificar_reprogramacion(propuestas):
+    """
+    Encola con un solo INSERT el aviso de nuevo horario para cada paciente.
+
+    Debe llamarse en la misma transacción que aplicar_reprogramacion; el
+    comando enviar_notificaciones_pendientes los entrega por lotes.
+
+    Returns:
+        Número de correos encolados (los pacientes sin email se omiten).
+    """
+    notificaciones = []
+    for propuesta in propuestas:
+        usuario_paciente = propuesta.cita.paciente.user_account
+        if not usuario_paciente.email:
+            continue
+        inicio_local = timezone.localtime(propuesta.inicio)
+        notificaciones.append(NotificacionCorreo(
+            cita=propuesta.cita,
+            destinatario=usuario_paciente.email,
+            asunto=f"Reprogramación de Cita Médica - {propuesta.profesional.especialidad.nombre_especialidad}",
+            cuerpo=(
+                f"Estimado(a) {usuario_paciente.get_full_name()},\n\n"
+                f"Por una novedad en la agenda de su profesional, su cita fue reprogramada.\n\n"
+                f"Nuevo profesional: Dr(a). {propuesta.profesional.user_account.get_full_name()}\n"
+                f"Nueva fecha: {formats.date_format(inicio_local, 'l d/m/Y')}\n"
+                f"Nueva hora: {inicio_local.strftime('%I:%M %p').lower()}\n\n"
+                f"Si el nuevo horario no le sirve, comuníquese con nosotros.\n\n"
+                f"Saludos cordiales,\nIPS Medical Integral"
+            ),
+        ))
+    return len(encolar_correos(notificaciones)) if notificaciones else 0
@@ -0,0 +1,97 @@
+"""
+Retenciones temporales de horarios durante el agendamiento.
+
+Cuando un asesor elige un horario en Consultar Disponibilidad y pasa a buscar
+al paciente, el horario queda retenido a su nombre durante
+settings.DISPONIBILIDAD_RETENCION_MINUTOS. Mientras la retención está vigente
+el motor de disponibilidad lo muestra ocupado a los demás asesores, que ya no
+lo eligen para luego fallar al confirmar. Cada usuario mantiene como máximo
+una retención; las vencidas dejan de contar de inmediato y se eliminan en lote.
+
+Las retenciones son un aviso, no una garantía: la restricción de no
+solapamiento de citas sigue siendo la que impide agendar dos veces el horario.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ProfesionalSalud, RetencionSlot
+
+
+def duracion_retencion():
+    """Retorna el tiempo de vida de una retención."""
+    return timedelta(minutes=getattr(settings, 'DISPONIBILIDAD_RETENCION_MINUTOS', 5))
+
+
+def horario_retenido_por_otro(profesional, inicio, fin, usuario, ahora=None):
+    """
+    Indica con una consulta si otro usuario tiene retenido un horario que se cruza con el pedido.
+
+    Al confirmar el agendamiento basta con esta verificación: no hace falta
+    renovar la retención, que se libera en cuanto se crea la cita.
+    """
+    return RetencionSlot.objects.filter(
+        profesional=profesional,
+        fecha_hora_inicio__lt=fin,
+        fecha_hora_fin__gt=inicio,
+        expira_en__gt=ahora or timezone.now()
+    ).exclude(usuario=usuario).exists()
+
+
+def retener_slot(profesional, inicio, fin, usuario):
+    """
+    Retiene un horario de un profesional a nombre de un usuario, o renueva su retención.
+
+    Reemplaza la retención previa del usuario y aprovecha para eliminar las
+    retenciones vencidas del profesional. La fila del profesional se bloquea
+    durante la transacción, de modo que dos usuarios que piden a la vez
+    horarios cruzados del mismo profesional no obtienen ambos la retención.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud.
+        inicio: Datetime aware de inicio del horario.
+        fin: Datetime aware de fin del horario.
+        usuario: Usuario (asesor) que retiene el horario.
+
+    Returns:
+        La RetencionSlot creada, o None si otro usuario tiene retenido un
+        horario que se cruza con el pedido.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        ProfesionalSalud.objects.select_for_update().only('id').get(pk=profesional.pk)
+        if horario_retenido_por_otro(profesional, inicio, fin, usuario, ahora):
+            return None
+
+        RetencionSlot.objects.filter(Q(usuario=usuario) | Q(profesional=profesional, expira_en__lte=ahora)).delete()
+        retencion = RetencionSlot.objects.create(
+            profesional=profesional,
+            usuario=usuario,
+            fecha_hora_inicio=inicio,
+            fecha_hora_fin=fin,
+            expira_en=ahora + duracion_retencion()
+        )
+    return retencion
+
+
+def liberar_retenciones_usuario(usuario):
+    """Elimina las retenciones de un usuario (por ejemplo, tras agendar la cita). Retorna cuántas eliminó."""
+    eliminadas, _ = RetencionSlot.objects.filter(usuario=usuario).delete()
+    return eliminadas
+
+
+def barrer_retenciones_vencidas(ahora=None):
+    """
+    Elimina en una sola sentencia todas las retenciones vencidas.
+
+    Las retenciones vencidas ya no ocultan horarios; el barrido solo
+    mantiene la tabla pequeña.
+
+    Returns:
+        Número de retenciones eliminadas.
+    """
+    eliminadas, _ = RetencionSlot.objects.filter(expira_en__lte=ahora or timezone.now()).delete()
+    return eliminadas
@@ -0,0 +1,173 @@
+"""
+Agendamiento de series de citas recurrentes (p. ej. 10 sesiones semanales de terapia).
+
+La serie se valida y se crea completa o no se crea: todas las ocurrencias se
+comparan en memoria contra las citas 'Programada' del profesional y del
+paciente que se obtienen con una única consulta por rango, y las citas se
+insertan con un solo bulk_create dentro de una transacción.
+
+Cada ocurrencia se valida como un agendamiento individual: debe coincidir con
+un turno de la grilla de la plantilla (los mismos slots que ofrece Consultar
+Disponibilidad), no puede cruzarse con un horario retenido por otro asesor y
+cumple las reglas de cruce del paciente y del profesional.
+
+Excepción a la regla de una cita 'Programada' por especialidad: las sesiones
+de una misma serie no se cuentan entre sí, porque la serie es justamente un
+tratamiento de varias citas con un solo profesional. La excepción se limita a
+eso: si el paciente ya tiene cualquier otra cita 'Programada' en la
+especialidad, la serie completa se rechaza, y mientras las sesiones sigan
+programadas el agendamiento individual aplica la regla sin excepción.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .disponibilidad import recorrer_slots_dia
+from .models import Cita, PlantillaHorarioMedico, RetencionSlot
+from .signals import cita_modificada
+from .validacion_citas import (
+    BUFFER_TRASLADO, REGLA_CRUCE_PACIENTE, REGLA_CRUCE_PROFESIONAL, REGLA_ESPECIALIDAD_PROGRAMADA
+)
+
+
+REGLA_FUERA_DE_HORARIO = 'fuera_de_horario'
+REGLA_HORARIO_RETENIDO = 'horario_retenido'
+
+# Ocurrencia de la serie (datetimes aware)
+OcurrenciaSerie = namedtuple('OcurrenciaSerie', ['numero', 'inicio', 'fin'])
+
+# Conflicto de una ocurrencia (numero None si afecta a toda la serie)
+ConflictoSerie = namedtuple('ConflictoSerie', ['numero', 'regla', 'cita'])
+
+
+def generar_ocurrencias(fecha_inicio, hora_inicio, sesiones, intervalo_dias, duracion_minutos):
+    """Calcula los horarios de las `sesiones` ocurrencias, separadas por `intervalo_dias`."""
+    current_tz = timezone.get_current_timezone()
+    ocurrencias = []
+    for numero in range(sesiones):
+        fecha = fecha_inicio + timedelta(days=numero * intervalo_dias)
+        inicio = timezone.make_aware(datetime.combine(fecha, hora_inicio), current_tz)
+        ocurrencias.append(OcurrenciaSerie(numero + 1, inicio, inicio + timedelta(minutes=duracion_minutos)))
+    return ocurrencias
+
+
+def _ocurrencias_fuera_de_horario(profesional, ocurrencias):
+    """Retorna las ocurrencias que no coinciden con un slot de la grilla de la plantilla del profesional."""
+    bloques = {}
+    for dia_semana, hora_inicio, hora_fin in PlantillaHorarioMedico.objects.filter(
+        profesional=profesional,
+        dia_semana__in={timezone.localtime(ocurrencia.inicio).weekday() for ocurrencia in ocurrencias}
+    ).values_list('dia_semana', 'hora_inicio_bloque', 'hora_fin_bloque'):
+        bloques.setdefault(dia_semana, []).append((hora_inicio, hora_fin))
+
+    fuera = []
+    for ocurrencia in ocurrencias:
+        inicio_local = timezone.localtime(ocurrencia.inicio).replace(tzinfo=None)
+        fin_local = timezone.localtime(ocurrencia.fin).replace(tzinfo=None)
+        duracion_minutos = int((fin_local - inicio_local).total_seconds() // 60)
+        grilla = recorrer_slots_dia(inicio_local.date(), bloques.get(inicio_local.weekday(), []), [], duracion_minutos)
+        if not any(inicio == inicio_local and fin == fin_local for inicio, fin, _ in grilla):
+            fuera.append(ocurrencia)
+    return fuera
+
+
+def _ocurrencias_retenidas(profesional, ocurrencias, usuario):
+    """Retorna las ocurrencias que se cruzan con un horario retenido por otro usuario, con una consulta."""
+    retenciones = RetencionSlot.objects.filter(
+        profesional=profesional,
+        fecha_hora_inicio__lt=ocurrencias[-1].fin,
+        fecha_hora_fin__gt=ocurrencias[0].inicio,
+        expira_en__gt=timezone.now()
+    ).exclude(usuario=usuario).order_by().values_list('fecha_hora_inicio', 'fecha_hora_fin')
+    retenciones = list(retenciones)
+    return [
+        ocurrencia for ocurrencia in ocurrencias
+        if any(inicio < ocurrencia.fin and fin > ocurrencia.inicio for inicio, fin in retenciones)
+    ]
+
+
+def buscar_conflictos_serie(paciente, profesional, ocurrencias, usuario=None):
+    """
+    Valida todas las ocurrencias de una serie.
+
+    Una consulta trae las citas 'Programada' del profesional o del paciente en
+    el rango de la serie (ampliado con BUFFER_TRASLADO) junto con las del
+    paciente en la misma especialidad; otra verifica la grilla de la plantilla
+    y una tercera las retenciones vigentes de otros usuarios.
+
+    Returns:
+        Lista de ConflictoSerie (vacía si la serie puede agendarse).
+    """
+    conflictos = [
+        ConflictoSerie(ocurrencia.numero, REGLA_FUERA_DE_HORARIO, None)
+        for ocurrencia in _ocurrencias_fuera_de_horario(profesional, ocurrencias)
+    ]
+    conflictos += [
+        ConflictoSerie(ocurrencia.numero, REGLA_HORARIO_RETENIDO, None)
+        for ocurrencia in _ocurrencias_retenidas(profesional, ocurrencias, usuario)
+    ]
+
+    desde = ocurrencias[0].inicio - BUFFER_TRASLADO
+    hasta = ocurrencias[-1].fin + BUFFER_TRASLADO
+    citas = Cita.objects.filter(
+        Q(profesional=profesional) | Q(paciente=paciente),
+        fecha_hora_inicio_cita__lt=hasta,
+        fecha_hora_fin_cita__gt=desde
+    ) | Cita.objects.filter(paciente=paciente, profesional__especialidad_id=profesional.especialidad_id)
+    citas = list(
+        citas.filter(estado_cita='Programada')
+        .select_related('profesional__especialidad', 'profesional__user_account')
+        .order_by('fecha_hora_inicio_cita')
+    )
+
+    for cita in citas:
+        # Cualquier cita 'Programada' previa en la especialidad bloquea la serie completa;
+        # la excepción a la regla solo cubre las sesiones de la serie entre sí (ver docstring del módulo)
+        if cita.paciente_id == paciente.id and cita.profesional.especialidad_id == profesional.especialidad_id:
+            conflictos.append(ConflictoSerie(None, REGLA_ESPECIALIDAD_PROGRAMADA, cita))
+            continue
+        for ocurrencia in ocurrencias:
+            if cita.paciente_id == paciente.id and (
+                cita.fecha_hora_inicio_cita < ocurrencia.fin + BUFFER_TRASLADO
+                and cita.fecha_hora_fin_cita > ocurrencia.inicio - BUFFER_TRASLADO
+            ):
+                conflictos.append(ConflictoSerie(ocurrencia.numero, REGLA_CRUCE_PACIENTE, cita))
+            elif cita.profesional_id == profesional.id and (
+                cita.fecha_hora_inicio_cita < ocurrencia.fin and cita.fecha_hora_fin_cita > ocurrencia.inicio
+            ):
+                conflictos.append(ConflictoSerie(ocurrencia.numero, REGLA_CRUCE_PROFESIONAL, cita))
+    return conflictos
+
+
+def crear_serie_citas(paciente, profesional, ocurrencias, asesor=None):
+    """
+    Crea todas las citas de una serie ya validada con un único bulk_create.
+
+    bulk_create no emite post_save, por lo que se emite cita_modificada por
+    cada cita para mantener slots, ocupación y caché sincronizados. Si otra
+    petición ocupa uno de los horarios entretanto, la restricción de no
+    solapamiento lanza IntegrityError y no se crea ninguna cita de la serie.
+
+    Returns:
+        Lista de las citas creadas.
+    """
+    with transaction.atomic():
+        citas = Cita.objects.bulk_create([
+            Cita(
+                paciente=paciente,
+                profesional=profesional,
+                especialidad_id=profesional.especialidad_id,
+                asesor_que_agenda=asesor,
+                fecha_hora_inicio_cita=ocurrencia.inicio,
+                fecha_hora_fin_cita=ocurrencia.fin,
+                estado_cita='Programada'
+            )
+            for ocurrencia in ocurrencias
+        ])
+        for cita in citas:
+            cita._valores_agenda_originales = cita.valores_agenda()
+            cita_modificada.send(sender=Cita, previo=None, actual=cita._valores_agenda_originales)
+    return citas
@@ -0,0 +1,125 @@
+"""
+Señales del Sistema de Agendamiento de Citas.
+
+Define la señal cita_modificada, que se emite cada vez que cambian los valores
+de una cita que afectan la agenda (profesional, horario o estado), y conecta
+los receptores que mantienen sincronizadas la disponibilidad materializada,
+la caché de disponibilidad por (profesional, fecha) y el agregado diario de
+ocupación por especialidad.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .disponibilidad import invalidar_disponibilidad_dia, invalidar_disponibilidad_profesional
+
+from .models import Cita, Especialidad, PlantillaHorarioMedico, ProfesionalSalud, ValoresAgendaCita
+from .reporte_ocupacion import aplicar_cambio_cita_ocupacion
+from .slots_materializados import aplicar_cambio_cita, materializar_profesional
+
+
+# Argumentos: previo y actual (ValoresAgendaCita o None si la cita no existía / se eliminó).
+# Las rutas que modifiquen citas con QuerySet.update() deben emitirla manualmente.
+cita_modificada = Signal()
+
+
+# ============================================================================
+# CAMBIOS DE CITAS
+# ============================================================================
+
+@receiver(pre_save, sender=Cita)
+def capturar_valores_previos_cita(sender, instance, raw=False, **kwargs):
+    """Recupera los valores originales si la instancia no se cargó desde la base de datos."""
+    if raw or not instance.pk or getattr(instance, '_valores_agenda_originales', None) is not None:
+        return
+    originales = Cita.objects.filter(pk=instance.pk).values_list(
+        'profesional_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita', 'estado_cita', 'especialidad_id'
+    ).first()
+    instance._valores_agenda_originales = ValoresAgendaCita(*originales) if originales else None
+
+
+@receiver(post_save, sender=Cita)
+def notificar_cita_guardada(sender, instance, created, raw=False, **kwargs):
+    """Emite cita_modificada si el guardado cambió la agenda."""
+    if raw:
+        return
+    previo = None if created else getattr(instance, '_valores_agenda_originales', None)
+    actual = instance.valores_agenda()
+    instance._valores_agenda_originales = actual
+    if previo != actual:
+        cita_modificada.send(sender=Cita, previo=previo, actual=actual)
+
+
+@receiver(post_delete, sender=Cita)
+def notificar_cita_eliminada(sender, instance, **kwargs):
+    """Emite cita_modificada al eliminar una cita."""
+    previo = getattr(instance, '_valores_agenda_originales', None) or instance.valores_agenda()
+    if previo is not None:
+        cita_modificada.send(sender=Cita, previo=previo, actual=None)
+
+
+@receiver(cita_modificada)
+def actualizar_slots_por_cita(sender, previo, actual, **kwargs):
+    """Aplica el cambio de la cita sobre los slots materializados."""
+    aplicar_cambio_cita(previo, actual)
+
+
+@receiver(cita_modificada)
+def actualizar_ocupacion_por_cita(sender, previo, actual, **kwargs):
+    """Aplica el cambio de la cita sobre el agregado diario de ocupación por especialidad."""
+    aplicar_cambio_cita_ocupacion(previo, actual)
+
+
+def _invalidar_al_confirmar(funcion, *args):
+    """
+    Ejecuta una invalidación de caché al confirmar la transacción (de inmediato si no hay una abierta).
+
+    Basta con invalidar al confirmar: también descarta las entradas que otra
+    petición haya cacheado leyendo el estado anterior mientras la transacción
+    seguía abierta, y evita un segundo acceso a la caché por cambio.
+    """
+    transaction.on_commit(lambda: funcion(*args))
+
+
+@receiver(cita_modificada)
+def invalidar_cache_por_cita(sender, previo, actual, **kwargs):
+    """Invalida la disponibilidad cacheada de los días que ocupaba y ocupa la cita."""
+    for valores in {previo, actual} - {None}:
+        fecha = timezone.localtime(valores.inicio).date()
+        _invalidar_al_confirmar(invalidar_disponibilidad_dia, valores.profesional_id, fecha)
+
+
+# ============================================================================
+# CAMBIOS DE PLANTILLAS, PROFESIONALES Y ESPECIALIDADES
+# ============================================================================
+
+@receiver(post_save, sender=PlantillaHorarioMedico)
+@receiver(post_delete, sender=PlantillaHorarioMedico)
+def rematerializar_por_plantilla(sender, instance, raw=False, **kwargs):
+    """Recalcula los slots del profesional cuya plantilla cambió."""
+    if raw:
+        return
+    _invalidar_al_confirmar(invalidar_disponibilidad_profesional, instance.profesional_id)
+    profesional = ProfesionalSalud.objects.select_related('especialidad').filter(pk=instance.profesional_id).first()
+    if profesional is not None:
+        materializar_profesional(profesional)
+
+
+@receiver(post_save, sender=ProfesionalSalud)
+def rematerializar_por_profesional(sender, instance, created, raw=False, **kwargs):
+    """Recalcula los slots si el profesional pudo cambiar de especialidad (y de duración de consulta)."""
+    if raw or created:
+        return
+    _invalidar_al_confirmar(invalidar_disponibilidad_profesional, instance.id)
+    materializar_profesional(instance)
+
+
+@receiver(post_save, sender=Especialidad)
+def rematerializar_por_especialidad(sender, instance, created, raw=False, **kwargs):
+    """Recalcula los slots de los profesionales de una especialidad modificada."""
+    if raw or created:
+        return
+    for profesional in instance.profesionales.select_related('especialidad'):
+        _invalidar_al_confirmar(invalidar_disponibilidad_profesional, profesional.id)
+        materializar_profesional(profesional)
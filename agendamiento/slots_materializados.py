@@ -0,0 +1,178 @@
+"""
+Mantenimiento de la tabla materializada SlotDisponible.
+
+La tabla guarda, para el horizonte móvil configurado en
+settings.DISPONIBILIDAD_HORIZONTE_DIAS, todos los slots que genera la
+plantilla de cada profesional marcados como libres u ocupados. Los cambios
+de citas se aplican de forma incremental sobre los slots afectados; los
+cambios de plantilla recalculan solo los días del profesional involucrado.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .disponibilidad import (
+    _bloques_por_profesional, _intervalos_por_profesional, horizonte_materializado,
+    rangos_ocupados_locales, recorrer_slots_dia
+)
+from .models import Cita, ProfesionalSalud, SlotDisponible, ValoresAgendaCita
+
+
+def _fechas_horizonte():
+    """Retorna la lista de fechas del horizonte materializado (vacía si está desactivado)."""
+    horizonte = horizonte_materializado()
+    if horizonte is None:
+        return []
+    primera, ultima = horizonte
+    return [primera + timedelta(days=desplazamiento) for desplazamiento in range((ultima - primera).days + 1)]
+
+
+def materializar_profesional(profesional, fechas=None):
+    """
+    Recalcula y reemplaza los slots precalculados de un profesional.
+
+    Args:
+        profesional: Instancia de ProfesionalSalud (con especialidad accesible).
+        fechas: Fechas a recalcular; por defecto todo el horizonte.
+
+    Returns:
+        Número de slots escritos.
+    """
+    fechas = sorted(fechas if fechas is not None else _fechas_horizonte())
+    if not fechas:
+        return 0
+
+    current_tz = timezone.get_current_timezone()
+    bloques_por_dia = _bloques_por_profesional([profesional.id], {fecha.weekday() for fecha in fechas})
+    intervalos_por_dia = {}
+    if bloques_por_dia:
+        intervalos_por_dia = _intervalos_por_profesional([profesional.id], fechas[0], fechas[-1], current_tz)
+
+    duracion_consulta = profesional.especialidad.duracion_consulta_minutos
+    nuevos_slots = []
+    for fecha in fechas:
+        bloques = bloques_por_dia.get((profesional.id, fecha.weekday()))
+        if not bloques:
+            continue
+        rangos_ocupados = rangos_ocupados_locales(intervalos_por_dia.get((profesional.id, fecha), []), current_tz)
+        for inicio, fin, libre in recorrer_slots_dia(fecha, bloques, rangos_ocupados, duracion_consulta):
+            nuevos_slots.append(SlotDisponible(
+                profesional_id=profesional.id,
+                fecha=fecha,
+                hora_inicio=inicio.time(),
+                hora_fin=fin.time(),
+                ocupado=not libre
+            ))
+
+    with transaction.atomic():
+        SlotDisponible.objects.filter(profesional_id=profesional.id, fecha__in=fechas).delete()
+        # ignore_conflicts descarta slots repetidos de bloques de plantilla solapados
+        SlotDisponible.objects.bulk_create(nuevos_slots, ignore_conflicts=True)
+    return len(nuevos_slots)
+
+
+def materializar_horizonte():
+    """
+    Reconstruye la tabla completa para el horizonte actual y elimina los días vencidos.
+
+    Returns:
+        Tupla (profesionales procesados, slots escritos).
+    """
+    fechas = _fechas_horizonte()
+    if not fechas:
+        SlotDisponible.objects.all().delete()
+        return 0, 0
+
+    SlotDisponible.objects.filter(fecha__lt=fechas[0]).delete()
+    total_profesionales = 0
+    total_slots = 0
+    for profesional in ProfesionalSalud.objects.select_related('especialidad'):
+        total_slots += materializar_profesional(profesional, fechas)
+        total_profesionales += 1
+    return total_profesionales, total_slots
+
+
+def _rango_local_en_horizonte(valores):
+    """
+    Convierte los valores de agenda de una cita en (fecha, hora_inicio, hora_fin) locales.
+
+    Retorna None si la cita no está 'Programada' o su día está fuera del horizonte.
+    """
+    if valores is None or valores.estado != 'Programada':
+        return None
+    horizonte = horizonte_materializado()
+    if horizonte is None:
+        return None
+
+    inicio_local = timezone.localtime(valores.inicio)
+    fin_local = timezone.localtime(valores.fin)
+    fecha = inicio_local.date()
+    if not horizonte[0] <= fecha <= horizonte[1]:
+        return None
+    # Una cita que cruza la medianoche ocupa el resto del día de inicio
+    hora_fin = fin_local.time() if fin_local.date() == fecha else time.max
+    return fecha, inicio_local.time(), hora_fin
+
+
+def _slots_cruzados(profesional_id, fecha, hora_inicio, hora_fin):
+    """Queryset de los slots precalculados que se cruzan con un rango horario."""
+    return SlotDisponible.objects.filter(
+        profesional_id=profesional_id,
+        fecha=fecha,
+        hora_inicio__lt=hora_fin,
+        hora_fin__gt=hora_inicio
+    )
+
+
+def liberar_cita(valores):
+    """
+    Libera los slots que ocupaba una cita y vuelve a marcar los que siguen ocupados por otras.
+
+    Args:
+        valores: ValoresAgendaCita con el estado previo de la cita.
+    """
+    rango = _rango_local_en_horizonte(valores)
+    if rango is None:
+        return
+    fecha, hora_inicio, hora_fin = rango
+    _slots_cruzados(valores.profesional_id, fecha, hora_inicio, hora_fin).update(ocupado=False)
+
+    # Otras citas pueden seguir ocupando parte del rango liberado
+    current_tz = timezone.get_current_timezone()
+    otras_citas = Cita.objects.filter(
+        profesional_id=valores.profesional_id,
+        estado_cita='Programada',
+        fecha_hora_inicio_cita__lt=timezone.make_aware(datetime.combine(fecha, hora_fin), current_tz),
+        fecha_hora_fin_cita__gt=timezone.make_aware(datetime.combine(fecha, hora_inicio), current_tz)
+    ).values_list(
+        'profesional_id', 'fecha_hora_inicio_cita', 'fecha_hora_fin_cita', 'estado_cita', 'especialidad_id'
+    )
+    for otra in otras_citas:
+        ocupar_cita(ValoresAgendaCita(*otra))
+
+
+def ocupar_cita(valores):
+    """
+    Marca como ocupados los slots que se cruzan con una cita 'Programada'.
+
+    Args:
+        valores: ValoresAgendaCita con el estado actual de la cita.
+    """
+    rango = _rango_local_en_horizonte(valores)
+    if rango is None:
+        return
+    fecha, hora_inicio, hora_fin = rango
+    _slots_cruzados(valores.profesional_id, fecha, hora_inicio, hora_fin).update(ocupado=True)
+
+
+def aplicar_cambio_cita(previo, actual):
+    """
+    Actualiza de forma incremental los slots afectados por el cambio de una cita.
+
+    Args:
+        previo: ValoresAgendaCita antes del cambio (None si la cita es nueva).
+        actual: ValoresAgendaCita después del cambio (None si la cita se eliminó).
+    """
+    liberar_cita(previo)
+    ocupar_cita(actual)
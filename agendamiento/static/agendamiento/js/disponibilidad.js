@@ -0,0 +1,96 @@
+// Actualización periódica de la disponibilidad en Consultar Disponibilidad.
+// Usa el endpoint JSON con ETag: mientras no haya cambios el servidor responde 304
+// y la página no se vuelve a dibujar.
+document.addEventListener('DOMContentLoaded', function() {
+    const seccion = document.querySelector('.results-section[data-disponibilidad-url]');
+    if (seccion) {
+        iniciarActualizacionDisponibilidad(seccion, 60000); // 60 segundos
+    }
+});
+
+function iniciarActualizacionDisponibilidad(seccion, intervalo) {
+    const url = seccion.getAttribute('data-disponibilidad-url');
+    let etag = null;
+
+    function consultar() {
+        const headers = {'Accept': 'application/json'};
+        if (etag) {
+            headers['If-None-Match'] = etag;
+        }
+        fetch(url, {headers: headers, cache: 'no-store', credentials: 'same-origin'})
+            .then(function(response) {
+                if (response.status === 304 || !response.ok) {
+                    return null;
+                }
+                const etagPrevio = etag;
+                etag = response.headers.get('ETag');
+                // La primera respuesta coincide con lo que ya dibujó el servidor
+                return etagPrevio ? response.json() : null;
+            })
+            .then(function(datos) {
+                if (datos) {
+                    dibujarDisponibilidad(seccion, datos);
+                }
+            })
+            .catch(function() {
+                // Errores de red: se reintenta en el siguiente ciclo
+            });
+    }
+
+    consultar();
+    setInterval(consultar, intervalo);
+}
+
+function crearListaSlots(slots) {
+    const lista = document.createElement('ul');
+    lista.className = 'slots-list';
+    slots.forEach(function(slot) {
+        const item = document.createElement('li');
+        const enlace = document.createElement('a');
+        enlace.href = slot.url_agendar;
+        enlace.className = 'slot-link';
+        enlace.textContent = slot.hora_inicio + ' - ' + slot.hora_fin;
+        item.appendChild(enlace);
+        lista.appendChild(item);
+    });
+    return lista;
+}
+
+function crearSinResultados(texto) {
+    const parrafo = document.createElement('p');
+    parrafo.className = 'no-results';
+    parrafo.textContent = texto;
+    return parrafo;
+}
+
+function dibujarDisponibilidad(seccion, datos) {
+    const titulo = seccion.querySelector('h2');
+    while (titulo.nextSibling) {
+        seccion.removeChild(titulo.nextSibling);
+    }
+
+    const hayHorarios = datos.disponibilidad.some(function(dia) { return dia.slots.length > 0; });
+    if (!hayHorarios) {
+        seccion.appendChild(crearSinResultados('No hay horarios disponibles para los criterios seleccionados.'));
+        return;
+    }
+
+    const instruccion = document.createElement('p');
+    instruccion.textContent = 'Seleccione un horario para agendar:';
+    seccion.appendChild(instruccion);
+
+    if (datos.rango_dias === 1) {
+        seccion.appendChild(crearListaSlots(datos.disponibilidad[0].slots));
+        return;
+    }
+
+    datos.disponibilidad.forEach(function(dia) {
+        const encabezado = document.createElement('h3');
+        const fecha = new Date(dia.fecha + 'T00:00:00');
+        encabezado.textContent = fecha.toLocaleDateString('es-CO', {
+            weekday: 'long', day: '2-digit', month: 'long', year: 'numeric'
+        });
+        seccion.appendChild(encabezado);
+        seccion.appendChild(dia.slots.length ? crearListaSlots(dia.slots) : crearSinResultados('Sin horarios disponibles este día.'));
+    });
+}
@@ -3,31 +3,65 @@ Suite de pruebas del Sistema de Agendamiento de Citas.
 
 Contiene pruebas unitarias e integración organizadas por categorías funcionales:
 
-TOTAL: 26 pruebas (17 funcionales + 9 producción)
+TOTAL: 52 pruebas (43 funcionales + 9 producción)
 ├── Acceso y Autorización (3)
 ├── Validación de Formularios (2)
 ├── Gestión de Pacientes (1)
 ├── Visualización de Citas (1)
 ├── Agendamiento y Modificación (4)
-├── Gestión de Asistencia (1)
+├── Gestión de Asistencia (2)
 ├── Actualización de Datos (2)
 ├── Cambio de Contraseña (2)
 ├── Modificación de Estados (1)
 ├── Configuración de Producción (2)
 ├── Conexión a Base de Datos (3)
-└── Protección CSRF (4)
+├── Protección CSRF (4)
+├── Motor de Disponibilidad (17)
+├── Lista de Espera (1)
+├── Concurrencia de Citas (1)
+├── Notificaciones (4)
+├── Calendario ICS (1)
+└── Paginación de Citas (1)
 """
 import os
 from datetime import date, timedelta, datetime, time
+from io import StringIO
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
+from .calendario_ics import clave_calendario, regenerar_clave_calendario
+from .concurrencia_citas import actualizar_cita
+from .disponibilidad import (
+    buscar_primeros_slots_especialidad, fusionar_rangos, generar_slots_dia, obtener_slots_rango,
+    proximos_slots_profesional
+)
 from .forms import PacienteForm
-from .models import Paciente, ProfesionalSalud, AsesorServicio, Especialidad, Cita
+from .notificaciones import (
+    circuito_abierto, encolar_correo, entregar_notificaciones_pendientes, metricas_notificaciones, retraso_reintento
+)
+from .ocupacion import MapaOcupacion
+from .recordatorios import _encolar_bloque, citas_por_recordar, encolar_recordatorios
+from .paginacion_citas import codificar_cursor, paginar_citas
+from .reporte_ocupacion import construir_reporte_ocupacion
+from .retenciones import barrer_retenciones_vencidas, retener_slot
+from .validacion_citas import (
+    REGLA_CRUCE_PACIENTE, REGLA_CRUCE_PROFESIONAL, REGLA_ESPECIALIDAD_PROGRAMADA, buscar_conflicto_agendamiento
+)
+from .models import (
+    Paciente, ProfesionalSalud, AsesorServicio, Especialidad, Cita, PlantillaHorarioMedico, SlotDisponible,
+    OcupacionDiariaEspecialidad, RetencionSlot, EntradaListaEspera, NotificacionCorreo, CircuitoCorreo,
+    es_error_solapamiento_cita
+)
 
 # ====================================================================================
 # FUNCIONES HELPER PARA TESTING
@@ -56,6 +90,23 @@ def ensure_test_authentication(test_instance, username, password):
     
     return login_success
 
+
+class BackendCorreoPrueba(locmem.EmailBackend):
+    """Backend en memoria que cuenta las conexiones abiertas, rechaza un destinatario y simula caídas del servidor."""
+
+    aperturas = 0
+
+    def open(self):
+        BackendCorreoPrueba.aperturas += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any('rechazado@example.com' in mensaje.to for mensaje in messages):
+            raise SMTPRecipientsRefused({'rechazado@example.com': (550, b'Buzon inexistente')})
+        if any(destinatario.startswith('caido') for mensaje in messages for destinatario in mensaje.to):
+            raise SMTPServerDisconnected('Servidor de correo no disponible')
+        return super().send_messages(messages)
+
 # ====================================================================================
 # CATEGORÍA 1: ACCESO Y AUTORIZACIÓN (3 TESTS)
 # ====================================================================================
@@ -645,7 +696,7 @@ class ConflictoSlotIntegrationTests(TestCase):
 
 
 # ===================================================================================
-# CATEGORÍA 6: PRUEBAS DE GESTIÓN DE ASISTENCIA (1 TEST)
+# CATEGORÍA 6: PRUEBAS DE GESTIÓN DE ASISTENCIA (2 TESTS)
 # ===================================================================================
 
 class RegistrarAsistenciaIntegrationTests(TestCase):
@@ -714,6 +765,34 @@ class RegistrarAsistenciaIntegrationTests(TestCase):
         cita_actualizada = Cita.objects.get(id=self.cita_para_asistencia.id)
         self.assertEqual(cita_actualizada.estado_cita, 'Realizada')
 
+    def test_profesional_registra_asistencia_del_dia_en_lote(self):
+        """El formulario de la agenda aplica todas las marcas con un UPDATE y rechaza las citas con versión desactualizada."""
+        fecha_hora_inicio = timezone.make_aware(datetime.combine(self.fecha_cita, time(14, 0)))
+        otra_cita = Cita.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_hora_inicio_cita=fecha_hora_inicio,
+            fecha_hora_fin_cita=fecha_hora_inicio + timedelta(minutes=self.especialidad.duracion_consulta_minutos),
+            estado_cita='Programada'
+        )
+        self.client.login(username='doc_pediatra_asist', password='password123')
+        response_agenda = self.client.get(f"{self.agenda_profesional_url_base}?fecha_agenda={self.fecha_cita.strftime('%Y-%m-%d')}")
+        self.assertTrue(response_agenda.context['hay_asistencia_pendiente'])
+
+        response = self.client.post(reverse('agendamiento:registrar_asistencia_agenda'), {
+            'fecha_agenda': self.fecha_cita.strftime('%Y-%m-%d'),
+            f'asistencia_{self.cita_para_asistencia.id}': 'Realizada',
+            f'version_{self.cita_para_asistencia.id}': self.cita_para_asistencia.version,
+            f'asistencia_{otra_cita.id}': 'No_Asistio',
+            f'version_{otra_cita.id}': otra_cita.version + 1,
+        }, follow=True)
+
+        self.assertEqual(Cita.objects.get(id=self.cita_para_asistencia.id).estado_cita, 'Realizada')
+        self.assertEqual(Cita.objects.get(id=otra_cita.id).estado_cita, 'Programada')
+        mensajes = [str(mensaje) for mensaje in response.context['messages']]
+        self.assertIn("Se registró la asistencia de 1 cita(s).", mensajes)
+        self.assertTrue(any(f"cita {otra_cita.id}: fue modificada por otro usuario" in mensaje for mensaje in mensajes))
+
 
 # ===================================================================================
 # CATEGORÍA 7: PRUEBAS DE ACTUALIZACIÓN DE DATOS (2 TESTS)
@@ -1069,6 +1148,640 @@ class TestCSRFProtection(TestCase):
         csrf_cookie_secure = getattr(settings, 'CSRF_COOKIE_SECURE', False)
         csrf_cookie_httponly = getattr(settings, 'CSRF_COOKIE_HTTPONLY', False)
 
+# ===================================================================================
+# CATEGORÍA 10: MOTOR DE DISPONIBILIDAD (17 TESTS)
+# ===================================================================================
+
+class AgendaMotorTestCase(TestCase):
+    """Datos comunes: asesor, paciente y profesional con plantilla de 9:00 a 11:00 y una cita programada a las 10:00."""
+
+    def setUp(self):
+        caches[settings.DISPONIBILIDAD_CACHE_ALIAS].clear()
+        self.asesor_user = User.objects.create_user(username='asesor_motor', password='password123')
+        self.asesor = AsesorServicio.objects.create(user_account=self.asesor_user)
+
+        self.paciente_user = User.objects.create_user(username='paciente_motor', password='password123')
+        self.paciente = Paciente.objects.create(
+            user_account=self.paciente_user,
+            numero_documento='91919191',
+            fecha_nacimiento='1990-01-01'
+        )
+
+        self.especialidad = Especialidad.objects.create(
+            nombre_especialidad="MotorTest",
+            duracion_consulta_minutos=30
+        )
+        self.profesional_user = User.objects.create_user(username='doc_motor', password='password123')
+        self.profesional = ProfesionalSalud.objects.create(
+            user_account=self.profesional_user,
+            especialidad=self.especialidad
+        )
+
+        self.fecha = timezone.localdate() + timedelta(days=4)
+        PlantillaHorarioMedico.objects.create(
+            profesional=self.profesional,
+            dia_semana=self.fecha.weekday(),
+            hora_inicio_bloque=time(9, 0),
+            hora_fin_bloque=time(11, 0)
+        )
+        inicio_ocupado = timezone.make_aware(datetime.combine(self.fecha, time(10, 0)))
+        self.cita_ocupada = Cita.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_hora_inicio_cita=inicio_ocupado,
+            fecha_hora_fin_cita=inicio_ocupado + timedelta(minutes=30),
+            estado_cita='Programada'
+        )
+
+
+class MotorDisponibilidadTests(AgendaMotorTestCase):
+    """Tests 27-43: Cálculo de slots libres con el motor de disponibilidad compartido."""
+
+    def test_generar_slots_dia_descarta_ocupados_y_pasados(self):
+        """Un recorrido lineal descarta slots cruzados con citas y los anteriores a 'desde'."""
+        fecha = date(2030, 1, 7)
+        bloques = [(time(8, 0), time(10, 0))]
+        rangos = fusionar_rangos([
+            (datetime.combine(fecha, time(9, 10)), datetime.combine(fecha, time(9, 20))),
+            (datetime.combine(fecha, time(8, 30)), datetime.combine(fecha, time(9, 0))),
+        ])
+
+        slots = generar_slots_dia(fecha, bloques, rangos, 30)
+        self.assertEqual(slots, [(time(8, 0), time(8, 30)), (time(9, 30), time(10, 0))])
+
+        slots_desde = generar_slots_dia(fecha, bloques, rangos, 30, desde=datetime.combine(fecha, time(8, 15)))
+        self.assertEqual(slots_desde, [(time(9, 30), time(10, 0))])
+
+    def test_mapa_ocupacion_responde_cruces_por_minuto(self):
+        """El bitmap detecta cruces, respeta bordes contiguos y recorta citas que cruzan la medianoche."""
+        fecha = date(2030, 1, 8)
+        mapa = MapaOcupacion.desde_rangos(fecha, [
+            (datetime(2030, 1, 7, 23, 30), datetime.combine(fecha, time(0, 15))),
+            (datetime.combine(fecha, time(10, 0)), datetime.combine(fecha, time(10, 30))),
+        ])
+
+        self.assertTrue(mapa.rango_ocupado(datetime.combine(fecha, time(0, 0)), datetime.combine(fecha, time(0, 30))))
+        self.assertTrue(mapa.rango_ocupado(datetime.combine(fecha, time(10, 15)), datetime.combine(fecha, time(10, 45))))
+        self.assertFalse(mapa.rango_ocupado(datetime.combine(fecha, time(9, 30)), datetime.combine(fecha, time(10, 0))))
+        self.assertFalse(mapa.rango_ocupado(datetime.combine(fecha, time(10, 30)), datetime.combine(fecha, time(11, 0))))
+
+    def test_consultar_y_modificar_usan_el_mismo_motor(self):
+        """Consultar oculta el slot ocupado; modificar lo muestra para la propia cita."""
+        self.client.login(username='asesor_motor', password='password123')
+
+        response = self.client.get(reverse('agendamiento:consultar_disponibilidad'), {
+            'profesional': self.profesional.id,
+            'fecha': self.fecha.strftime('%Y-%m-%d'),
+        })
+        self.assertEqual(response.status_code, 200)
+        inicios = [inicio for inicio, _ in response.context['slots_disponibles']]
+        self.assertEqual(inicios, [time(9, 0), time(9, 30), time(10, 30)])
+
+        response_mod = self.client.get(
+            reverse('agendamiento:modificar_cita', kwargs={'cita_id': self.cita_ocupada.id}),
+            {'profesional': self.profesional.id, 'fecha_cita': self.fecha.strftime('%Y-%m-%d')}
+        )
+        self.assertEqual(response_mod.status_code, 200)
+        inicios_mod = [inicio for inicio, _ in response_mod.context['slots_disponibles']]
+        self.assertIn(time(10, 0), inicios_mod)
+
+    @override_settings(DISPONIBILIDAD_HORIZONTE_DIAS=0)
+    def test_rango_agrupa_slots_por_dia_en_tres_consultas(self):
+        """Una ventana de 30 días se resuelve con una consulta de plantillas, otra de citas y otra de retenciones."""
+        profesional = ProfesionalSalud.objects.select_related('especialidad').get(id=self.profesional.id)
+
+        with self.assertNumQueries(3):
+            slots_por_fecha = obtener_slots_rango(profesional, self.fecha, 30)
+
+        fechas_con_horario = list(slots_por_fecha)
+        self.assertEqual(fechas_con_horario[0], self.fecha)
+        self.assertTrue(all(fecha.weekday() == self.fecha.weekday() for fecha in fechas_con_horario))
+        self.assertEqual(len(fechas_con_horario), 5)
+        self.assertNotIn((time(10, 0), time(10, 30)), slots_por_fecha[self.fecha])
+        self.assertIn((time(10, 0), time(10, 30)), slots_por_fecha[self.fecha + timedelta(days=7)])
+
+    def test_api_disponibilidad_responde_304_hasta_que_cambia_la_agenda(self):
+        """El endpoint JSON entrega un ETag derivado de los datos y lo renueva cuando se agenda una cita."""
+        self.client.login(username='asesor_motor', password='password123')
+        url = reverse('agendamiento:api_disponibilidad')
+        parametros = {'profesional': self.profesional.id, 'fecha': self.fecha.strftime('%Y-%m-%d')}
+
+        response = self.client.get(url, parametros)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        horas = [slot['hora_inicio'] for slot in response.json()['disponibilidad'][0]['slots']]
+        self.assertEqual(horas, ['09:00', '09:30', '10:30'])
+
+        response_304 = self.client.get(url, parametros, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response_304.status_code, 304)
+        # El ETag sale de la base de datos: otro worker, con su caché vacía, calcula el mismo
+        caches[settings.DISPONIBILIDAD_CACHE_ALIAS].clear()
+        self.assertEqual(self.client.get(url, parametros, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        Cita.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_hora_inicio_cita=inicio,
+            fecha_hora_fin_cita=inicio + timedelta(minutes=30),
+            estado_cita='Programada'
+        )
+        response_nueva = self.client.get(url, parametros, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response_nueva.status_code, 200)
+        self.assertNotEqual(response_nueva['ETag'], etag)
+
+    def test_proximos_slots_recorre_solo_los_dias_necesarios(self):
+        """El generador se detiene al reunir N slots y solo consulta los días que visita."""
+        profesional = ProfesionalSalud.objects.select_related('especialidad').get(id=self.profesional.id)
+        desde = datetime.combine(self.fecha, time.min)
+
+        with self.assertNumQueries(3):
+            slots = proximos_slots_profesional(profesional, 2, desde=desde)
+        self.assertEqual([(slot.fecha, slot.hora_inicio) for slot in slots], [(self.fecha, time(9, 0)), (self.fecha, time(9, 30))])
+
+        slots_semana = proximos_slots_profesional(profesional, 4, desde=desde)
+        self.assertEqual(slots_semana[3].fecha, self.fecha + timedelta(days=7))
+        self.assertEqual(slots_semana[3].hora_inicio, time(9, 0))
+
+    def test_ocupacion_por_especialidad_se_actualiza_de_forma_incremental(self):
+        """El agregado diario suma la cita programada, la descuenta de su especialidad al cancelarla y alimenta el reporte."""
+        agregado = OcupacionDiariaEspecialidad.objects.get(especialidad=self.especialidad, fecha=self.fecha)
+        self.assertEqual((agregado.minutos_reservados, agregado.citas_reservadas), (30, 1))
+
+        with self.assertNumQueries(3):
+            fechas, filas = construir_reporte_ocupacion(self.fecha, 1)
+        fila = next(fila for fila in filas if fila['especialidad'] == self.especialidad)
+        self.assertEqual(fila['celdas'][0]['porcentaje'], 25)
+
+        # Aunque el profesional cambie de especialidad, la cita se descuenta de la que tenía al agendarse
+        nueva_especialidad = Especialidad.objects.create(nombre_especialidad='MotorOtra', duracion_consulta_minutos=20)
+        ProfesionalSalud.objects.filter(pk=self.profesional.pk).update(especialidad=nueva_especialidad)
+        self.cita_ocupada.refresh_from_db()
+        self.cita_ocupada.estado_cita = 'Cancelada'
+        self.cita_ocupada.save()
+        agregado.refresh_from_db()
+        self.assertEqual((agregado.minutos_reservados, agregado.citas_reservadas), (0, 0))
+        self.assertFalse(OcupacionDiariaEspecialidad.objects.filter(especialidad=nueva_especialidad).exists())
+
+    def test_benchmark_reporta_percentiles_y_revierte_datos(self):
+        """El benchmark mide todos los escenarios y no deja datos sintéticos en la base de datos."""
+        salida = StringIO()
+        citas_previas = Cita.objects.count()
+
+        call_command('benchmark_agendamiento', profesionales=2, pacientes=20, citas=40, iteraciones=2, stdout=salida)
+
+        self.assertIn('consultar_disponibilidad (1 día)', salida.getvalue())
+        self.assertIn('seleccionar_paciente_para_cita (POST)', salida.getvalue())
+        self.assertEqual(Cita.objects.count(), citas_previas)
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+    def test_primer_slot_por_especialidad_combina_profesionales(self):
+        """La búsqueda por especialidad intercala los slots de todos los profesionales en orden."""
+        otro_user = User.objects.create_user(username='doc_motor_2', password='password123')
+        otro_profesional = ProfesionalSalud.objects.create(user_account=otro_user, especialidad=self.especialidad)
+        PlantillaHorarioMedico.objects.create(
+            profesional=otro_profesional,
+            dia_semana=self.fecha.weekday(),
+            hora_inicio_bloque=time(9, 30),
+            hora_fin_bloque=time(10, 30)
+        )
+
+        with self.assertNumQueries(4):
+            slots = buscar_primeros_slots_especialidad(self.especialidad, self.fecha, 7, 3)
+
+        self.assertEqual([slot.hora_inicio for slot in slots], [time(9, 0), time(9, 30), time(9, 30)])
+        self.assertEqual(slots[0].profesional, self.profesional)
+        self.assertEqual({slot.profesional for slot in slots[1:]}, {self.profesional, otro_profesional})
+        self.assertTrue(all(slot.fecha == self.fecha for slot in slots))
+
+    def test_slots_materializados_se_actualizan_con_las_citas(self):
+        """Un día del horizonte se lee de SlotDisponible y refleja cancelaciones al instante."""
+        profesional = ProfesionalSalud.objects.select_related('especialidad').get(id=self.profesional.id)
+        slot_ocupado = SlotDisponible.objects.get(profesional=profesional, fecha=self.fecha, hora_inicio=time(10, 0))
+        self.assertTrue(slot_ocupado.ocupado)
+
+        with self.assertNumQueries(2):
+            slots_por_fecha = obtener_slots_rango(profesional, self.fecha, 1)
+        self.assertEqual(slots_por_fecha[self.fecha], [
+            (time(9, 0), time(9, 30)), (time(9, 30), time(10, 0)), (time(10, 30), time(11, 0))
+        ])
+
+        # La caché de disponibilidad se invalida al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita_ocupada.estado_cita = 'Cancelada'
+            self.cita_ocupada.save()
+        slot_ocupado.refresh_from_db()
+        self.assertFalse(slot_ocupado.ocupado)
+        self.assertIn((time(10, 0), time(10, 30)), obtener_slots_rango(profesional, self.fecha, 1)[self.fecha])
+
+    def test_cache_por_profesional_y_fecha_se_invalida_con_citas_y_plantillas(self):
+        """La segunda lectura solo consulta las retenciones; confirmar una cita o plantilla la invalida."""
+        profesional = ProfesionalSalud.objects.select_related('especialidad').get(id=self.profesional.id)
+        slots_iniciales = obtener_slots_rango(profesional, self.fecha, 1)[self.fecha]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(obtener_slots_rango(profesional, self.fecha, 1)[self.fecha], slots_iniciales)
+
+        # Las invalidaciones se aplican al confirmar la transacción
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.create(
+                paciente=self.paciente,
+                profesional=self.profesional,
+                fecha_hora_inicio_cita=inicio,
+                fecha_hora_fin_cita=inicio + timedelta(minutes=30),
+                estado_cita='Programada'
+            )
+        self.assertNotIn((time(9, 0), time(9, 30)), obtener_slots_rango(profesional, self.fecha, 1)[self.fecha])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantillaHorarioMedico.objects.create(
+                profesional=self.profesional,
+                dia_semana=self.fecha.weekday(),
+                hora_inicio_bloque=time(14, 0),
+                hora_fin_bloque=time(14, 30)
+            )
+        self.assertIn((time(14, 0), time(14, 30)), obtener_slots_rango(profesional, self.fecha, 1)[self.fecha])
+
+    def test_base_de_datos_rechaza_citas_programadas_solapadas(self):
+        """Una cita 'Programada' que se cruza con otra falla en la base de datos; una cancelada no."""
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(10, 15)))
+        datos = {
+            'paciente': self.paciente,
+            'profesional': self.profesional,
+            'fecha_hora_inicio_cita': inicio,
+            'fecha_hora_fin_cita': inicio + timedelta(minutes=30),
+        }
+
+        with self.assertRaises(IntegrityError) as contexto:
+            with transaction.atomic():
+                Cita.objects.create(estado_cita='Programada', **datos)
+        self.assertTrue(es_error_solapamiento_cita(contexto.exception))
+
+        cancelada = Cita.objects.create(estado_cita='Cancelada', **datos)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                cancelada.estado_cita = 'Programada'
+                cancelada.save()
+
+    def test_retencion_de_slot_lo_oculta_hasta_que_vence(self):
+        """Un horario retenido no se ofrece a otros asesores; al vencer vuelve a estar libre y se barre en lote."""
+        profesional = ProfesionalSalud.objects.select_related('especialidad').get(id=self.profesional.id)
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        otro_asesor = User.objects.create_user(username='asesor_motor_2', password='password123')
+
+        retencion = retener_slot(profesional, inicio, inicio + timedelta(minutes=30), self.asesor_user)
+        self.assertIsNotNone(retencion)
+        self.assertIsNone(retener_slot(profesional, inicio, inicio + timedelta(minutes=30), otro_asesor))
+        self.assertNotIn((time(9, 0), time(9, 30)), obtener_slots_rango(profesional, self.fecha, 1)[self.fecha])
+
+        RetencionSlot.objects.filter(pk=retencion.pk).update(expira_en=timezone.now() - timedelta(seconds=1))
+        self.assertIn((time(9, 0), time(9, 30)), obtener_slots_rango(profesional, self.fecha, 1)[self.fecha])
+        self.assertEqual(barrer_retenciones_vencidas(), 1)
+        self.assertFalse(RetencionSlot.objects.exists())
+
+    def test_post_repetido_con_clave_de_idempotencia_no_duplica_la_cita(self):
+        """El segundo envío con la misma clave repite la redirección sin crear otra cita ni volver a encolar el correo."""
+        self.paciente_user.email = 'paciente_motor@example.com'
+        self.paciente_user.save()
+        self.client.login(username='asesor_motor', password='password123')
+        url = reverse('agendamiento:seleccionar_paciente_para_cita', kwargs={
+            'profesional_id': self.profesional.id,
+            'fecha_seleccionada_str': self.fecha.strftime('%Y-%m-%d'),
+            'hora_inicio_slot_str': '09:00'
+        })
+        datos = {'paciente_id_confirmado': self.paciente.id, 'clave_idempotencia': 'clave-prueba-1'}
+        Cita.objects.filter(pk=self.cita_ocupada.pk).update(estado_cita='Realizada')
+
+        primera = self.client.post(url, datos)
+        citas_creadas = Cita.objects.filter(paciente=self.paciente, estado_cita='Programada').count()
+        segunda = self.client.post(url, datos)
+
+        self.assertEqual(primera.status_code, 302)
+        self.assertEqual(segunda['Location'], primera['Location'])
+        self.assertEqual(citas_creadas, 1)
+        self.assertEqual(Cita.objects.filter(paciente=self.paciente, estado_cita='Programada').count(), 1)
+        self.assertEqual(NotificacionCorreo.objects.count(), 1)
+
+    def test_validacion_de_agendamiento_evalua_las_tres_reglas_en_una_consulta(self):
+        """Una consulta indica qué regla incumple la cita propuesta, con los datos del conflicto precargados."""
+        otro_user = User.objects.create_user(username='paciente_motor_2', password='password123')
+        otro_paciente = Paciente.objects.create(user_account=otro_user, numero_documento='92929292', fecha_nacimiento='1991-01-01')
+
+        def conflicto(paciente, hora):
+            inicio = timezone.make_aware(datetime.combine(self.fecha, hora))
+            with self.assertNumQueries(1):
+                resultado = buscar_conflicto_agendamiento(paciente, self.profesional, inicio, inicio + timedelta(minutes=30))
+                if resultado:
+                    resultado.cita.profesional.user_account.get_full_name()
+            return resultado
+
+        self.assertEqual(conflicto(self.paciente, time(10, 35)).regla, REGLA_CRUCE_PACIENTE)
+        self.assertEqual(conflicto(self.paciente, time(9, 0)).regla, REGLA_ESPECIALIDAD_PROGRAMADA)
+        self.assertEqual(conflicto(otro_paciente, time(10, 15)).regla, REGLA_CRUCE_PROFESIONAL)
+        self.assertIsNone(conflicto(otro_paciente, time(9, 0)))
+
+    def test_serie_de_citas_se_agenda_completa_o_no_se_agenda(self):
+        """La serie se crea con un bulk_create que actualiza los slots; si una sesión choca, sale de la grilla o está retenida no se crea ninguna."""
+        self.client.login(username='asesor_motor', password='password123')
+        pacientes = []
+        for indice in range(2):
+            usuario = User.objects.create_user(username=f'paciente_serie_{indice}', password='password123')
+            pacientes.append(Paciente.objects.create(user_account=usuario, numero_documento=f'9393939{indice}', fecha_nacimiento='1990-01-01'))
+        datos = {
+            'profesional': self.profesional.id,
+            'fecha_inicio': self.fecha.strftime('%Y-%m-%d'),
+            'hora_inicio': '09:00',
+            'frecuencia_dias': '7',
+            'sesiones': 3,
+        }
+
+        response = self.client.post(reverse('agendamiento:agendar_serie_citas'), dict(datos, numero_documento=pacientes[0].numero_documento))
+        self.assertRedirects(response, reverse('agendamiento:dashboard_asesor'))
+        self.assertEqual(Cita.objects.filter(paciente=pacientes[0], estado_cita='Programada').count(), 3)
+        self.assertTrue(SlotDisponible.objects.get(profesional=self.profesional, fecha=self.fecha, hora_inicio=time(9, 0)).ocupado)
+
+        response_conflicto = self.client.post(reverse('agendamiento:agendar_serie_citas'), dict(datos, numero_documento=pacientes[1].numero_documento))
+        self.assertEqual(response_conflicto.status_code, 200)
+        self.assertEqual([conflicto['sesion'] for conflicto in response_conflicto.context['conflictos']], [1, 2, 3])
+        self.assertFalse(Cita.objects.filter(paciente=pacientes[1]).exists())
+
+        # Cada sesión se valida como un agendamiento individual: grilla de la plantilla y retenciones de otros asesores
+        fuera_de_grilla = self.client.post(reverse('agendamiento:agendar_serie_citas'), dict(datos, hora_inicio='09:10', numero_documento=pacientes[1].numero_documento))
+        self.assertEqual([conflicto['sesion'] for conflicto in fuera_de_grilla.context['conflictos'] if conflicto['cita'] is None], [1, 2, 3])
+        otro_asesor = User.objects.create_user(username='asesor_serie_otro', password='password123')
+        inicio_retenido = timezone.make_aware(datetime.combine(self.fecha + timedelta(days=7), time(9, 30)))
+        retener_slot(self.profesional, inicio_retenido, inicio_retenido + timedelta(minutes=30), otro_asesor)
+        retenida = self.client.post(reverse('agendamiento:agendar_serie_citas'), dict(datos, hora_inicio='09:30', numero_documento=pacientes[1].numero_documento))
+        self.assertEqual([conflicto['sesion'] for conflicto in retenida.context['conflictos']], [2])
+        self.assertFalse(Cita.objects.filter(paciente=pacientes[1]).exists())
+
+    def test_reprogramar_dia_mueve_las_citas_al_primer_horario_libre_de_la_especialidad(self):
+        """Se aplica la propuesta que vio el asesor, en una transacción que encola los avisos, salvo si alguna cita cambió desde la vista previa."""
+        self.paciente_user.email = 'paciente_motor@example.com'
+        self.paciente_user.save()
+        otro_user = User.objects.create_user(username='doc_motor_reemplazo', password='password123')
+        otro_profesional = ProfesionalSalud.objects.create(user_account=otro_user, especialidad=self.especialidad)
+        PlantillaHorarioMedico.objects.create(
+            profesional=otro_profesional,
+            dia_semana=self.fecha.weekday(),
+            hora_inicio_bloque=time(9, 0),
+            hora_fin_bloque=time(10, 0)
+        )
+        self.client.login(username='asesor_motor', password='password123')
+        datos = {'profesional': self.profesional.id, 'fecha': self.fecha.strftime('%Y-%m-%d')}
+
+        vista_previa = self.client.get(reverse('agendamiento:reprogramar_dia_profesional'), datos)
+        self.assertEqual([propuesta.profesional for propuesta in vista_previa.context['propuestas']], [otro_profesional])
+
+        # Si la cita cambió después de la vista previa no se aplica la propuesta mostrada
+        url = reverse('agendamiento:reprogramar_dia_profesional')
+        Cita.objects.get(pk=self.cita_ocupada.pk).save()
+        response = self.client.post(url, {**datos, 'propuesta': vista_previa.context['codigos_propuestas']})
+        self.assertRedirects(response, f"{url}?profesional={self.profesional.id}&fecha={datos['fecha']}")
+        self.cita_ocupada.refresh_from_db()
+        self.assertEqual(self.cita_ocupada.profesional, self.profesional)
+
+        vista_previa = self.client.get(url, datos)
+        response = self.client.post(url, {**datos, 'propuesta': vista_previa.context['codigos_propuestas']})
+        self.assertRedirects(response, reverse('agendamiento:visualizar_citas_gestionadas'))
+        self.cita_ocupada.refresh_from_db()
+        self.assertEqual(self.cita_ocupada.profesional, otro_profesional)
+        self.assertEqual(timezone.localtime(self.cita_ocupada.fecha_hora_inicio_cita).time(), time(9, 0))
+        self.assertFalse(SlotDisponible.objects.get(profesional=self.profesional, fecha=self.fecha, hora_inicio=time(10, 0)).ocupado)
+        self.assertEqual(NotificacionCorreo.objects.filter(cita=self.cita_ocupada, estado='Pendiente').count(), 1)
+
+
+# ===================================================================================
+# CATEGORÍA 11: LISTA DE ESPERA (1 TEST)
+# ===================================================================================
+
+class ListaEsperaTests(AgendaMotorTestCase):
+    """Test 44: Asignación del cupo liberado por una cancelación a la lista de espera."""
+
+    def test_cancelacion_asigna_el_cupo_al_primer_paciente_elegible_de_la_lista_de_espera(self):
+        """El cupo liberado pasa al paciente en espera más antiguo que no tenga ya una cita de la especialidad."""
+        pacientes = []
+        for indice in range(2):
+            usuario = User.objects.create_user(username=f'paciente_espera_{indice}', password='password123')
+            paciente = Paciente.objects.create(user_account=usuario, numero_documento=f'9494949{indice}', fecha_nacimiento='1990-01-01')
+            EntradaListaEspera.objects.create(paciente=paciente, especialidad=self.especialidad, fecha_desde=self.fecha, fecha_hasta=self.fecha)
+            pacientes.append(paciente)
+        # El primero en la lista ya tiene una cita 'Programada' de la especialidad
+        Cita.objects.create(
+            paciente=pacientes[0],
+            profesional=self.profesional,
+            fecha_hora_inicio_cita=timezone.make_aware(datetime.combine(self.fecha, time(9, 0))),
+            fecha_hora_fin_cita=timezone.make_aware(datetime.combine(self.fecha, time(9, 30))),
+            estado_cita='Programada'
+        )
+        self.client.login(username='asesor_motor', password='password123')
+
+        response = self.client.post(reverse('agendamiento:ejecutar_cancelacion_cita', args=[self.cita_ocupada.id]))
+        self.assertRedirects(response, reverse('agendamiento:visualizar_citas_gestionadas'))
+        entrada = EntradaListaEspera.objects.get(paciente=pacientes[1])
+        self.assertEqual(entrada.estado, 'Asignada')
+        self.assertEqual(entrada.cita_asignada.fecha_hora_inicio_cita, self.cita_ocupada.fecha_hora_inicio_cita)
+        self.assertEqual(EntradaListaEspera.objects.get(paciente=pacientes[0]).estado, 'Esperando')
+        self.assertTrue(SlotDisponible.objects.get(profesional=self.profesional, fecha=self.fecha, hora_inicio=time(10, 0)).ocupado)
+
+
+# ===================================================================================
+# CATEGORÍA 12: CONCURRENCIA DE CITAS (1 TEST)
+# ===================================================================================
+
+class ConcurrenciaCitasTests(AgendaMotorTestCase):
+    """Test 45: Control de concurrencia optimista en las escrituras sobre citas."""
+
+    def test_cancelacion_con_version_desactualizada_no_sobrescribe_la_cita(self):
+        """El UPDATE condicionado a la versión rechaza la cancelación si la cita cambió tras mostrarse la confirmación."""
+        self.client.login(username='asesor_motor', password='password123')
+        version_mostrada = self.cita_ocupada.version
+        self.cita_ocupada.fecha_hora_fin_cita += timedelta(minutes=5)
+        self.cita_ocupada.save()
+        url = reverse('agendamiento:ejecutar_cancelacion_cita', args=[self.cita_ocupada.id])
+
+        self.client.post(url, {'version_cita': version_mostrada})
+        self.cita_ocupada.refresh_from_db()
+        self.assertEqual(self.cita_ocupada.estado_cita, 'Programada')
+
+        self.client.post(url, {'version_cita': self.cita_ocupada.version})
+        self.cita_ocupada.refresh_from_db()
+        self.assertEqual(self.cita_ocupada.estado_cita, 'Cancelada')
+        self.assertEqual(self.cita_ocupada.version, version_mostrada + 2)
+        self.assertFalse(SlotDisponible.objects.get(profesional=self.profesional, fecha=self.fecha, hora_inicio=time(10, 0)).ocupado)
+
+
+# ===================================================================================
+# CATEGORÍA 13: NOTIFICACIONES (4 TESTS)
+# ===================================================================================
+
+class NotificacionesCorreoTests(AgendaMotorTestCase):
+    """Tests 46-49: Bandeja de salida de correos (encolado, entrega por lotes, reintentos y recordatorios)."""
+
+    def test_cancelacion_encola_el_correo_y_el_comando_lo_entrega(self):
+        """La vista no envía el correo: lo encola con la cancelación y el worker lo entrega después (y materializa los slots)."""
+        self.paciente_user.email = 'paciente_motor@example.com'
+        self.paciente_user.save()
+        self.client.login(username='asesor_motor', password='password123')
+
+        self.client.post(reverse('agendamiento:ejecutar_cancelacion_cita', args=[self.cita_ocupada.id]))
+        self.assertEqual(len(mail.outbox), 0)
+        notificacion = NotificacionCorreo.objects.get(cita=self.cita_ocupada)
+        self.assertEqual(notificacion.estado, 'Pendiente')
+
+        # El worker de producción entrega la bandeja de salida y avanza el horizonte de slots materializados
+        SlotDisponible.objects.all().delete()
+        call_command('ejecutar_tareas_programadas', '--una-vez', stdout=StringIO())
+        notificacion.refresh_from_db()
+        self.assertEqual(notificacion.estado, 'Enviada')
+        self.assertEqual(mail.outbox[0].to, ['paciente_motor@example.com'])
+        self.assertFalse(SlotDisponible.objects.get(profesional=self.profesional, fecha=self.fecha, hora_inicio=time(10, 0)).ocupado)
+
+    @override_settings(EMAIL_BACKEND='agendamiento.tests.BackendCorreoPrueba')
+    def test_entrega_por_lotes_usa_una_conexion_por_lote_y_aisla_los_fallos(self):
+        """Cada lote abre una sola conexión; un destinatario rechazado no impide entregar el resto ni se toman correos ya reclamados."""
+        BackendCorreoPrueba.aperturas = 0
+        destinatarios = ['uno@example.com', 'rechazado@example.com', 'dos@example.com', 'tres@example.com', 'cuatro@example.com']
+        for destinatario in destinatarios:
+            encolar_correo(destinatario, 'Aviso', 'Cuerpo del aviso')
+        # Correo que otra ejecución del comando está enviando
+        reclamada = encolar_correo('reclamado@example.com', 'Aviso', 'Cuerpo del aviso')
+        NotificacionCorreo.objects.filter(pk=reclamada.pk).update(
+            estado='Enviando', proximo_intento_en=timezone.now() + timedelta(minutes=5)
+        )
+
+        enviadas, fallidas = entregar_notificaciones_pendientes(tamano_lote=2)
+
+        self.assertEqual((enviadas, fallidas), (4, 1))
+        self.assertEqual(BackendCorreoPrueba.aperturas, 3)
+        self.assertEqual(len(mail.outbox), 4)
+        fallida = NotificacionCorreo.objects.get(estado='Fallida')
+        self.assertEqual(fallida.destinatario, 'rechazado@example.com')
+        self.assertIn('Buzon inexistente', fallida.error)
+        reclamada.refresh_from_db()
+        self.assertEqual((reclamada.estado, reclamada.intentos), ('Enviando', 0))
+
+    @override_settings(EMAIL_BACKEND='agendamiento.tests.BackendCorreoPrueba')
+    def test_fallos_del_servidor_reintentan_con_retroceso_y_abren_el_cortacircuitos(self):
+        """Un fallo del servidor aplaza el correo; tras varios seguidos se suspenden las entregas sin perder mensajes."""
+        for indice in range(3):
+            encolar_correo(f'caido{indice}@example.com', 'Aviso', 'Cuerpo del aviso')
+        encolar_correo('disponible@example.com', 'Aviso', 'Cuerpo del aviso')
+
+        self.assertEqual(entregar_notificaciones_pendientes(), (0, 3))
+        self.assertTrue(circuito_abierto())
+        self.assertEqual(entregar_notificaciones_pendientes(), (0, 0))
+        caida = NotificacionCorreo.objects.filter(destinatario='caido0@example.com').get()
+        self.assertEqual((caida.estado, caida.intentos), ('Pendiente', 1))
+        self.assertGreater(caida.proximo_intento_en, timezone.now())
+        self.assertEqual([retraso_reintento(intentos).seconds // 60 for intentos in (1, 2, 3)], [1, 2, 4])
+
+        # Al cerrarse el circuito solo sale el correo intacto; los fallidos esperan su reintento
+        CircuitoCorreo.objects.update(abierto_hasta=timezone.now())
+        self.assertEqual(entregar_notificaciones_pendientes(), (1, 0))
+        metricas = metricas_notificaciones()
+        self.assertEqual((metricas['enviadas'], metricas['en_reintento'], metricas['fallidas']), (1, 3, 0))
+
+    def test_recordatorios_se_encolan_por_bloques_sin_consultas_por_cita_y_una_sola_vez(self):
+        """Las citas de la fecha se leen por bloques con sus datos precargados y se reclaman antes de encolar: repetir el proceso no duplica avisos."""
+        self.paciente_user.email = 'paciente_motor@example.com'
+        self.paciente_user.save()
+        for indice in range(3):
+            usuario = User.objects.create_user(username=f'paciente_recordatorio_{indice}', password='password123', email=f'recordatorio_{indice}@example.com')
+            paciente = Paciente.objects.create(user_account=usuario, numero_documento=f'9595959{indice}', fecha_nacimiento='1990-01-01')
+            inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0))) + timedelta(minutes=30 * indice)
+            if indice == 2:
+                inicio += timedelta(minutes=60)
+            Cita.objects.create(paciente=paciente, profesional=self.profesional, fecha_hora_inicio_cita=inicio, fecha_hora_fin_cita=inicio + timedelta(minutes=30), estado_cita='Programada')
+
+        # Una lectura por cursor y, por cada bloque de 2, el SELECT que reclama, el UPDATE y el INSERT dentro de su transacción (savepoint)
+        leidas_por_otro_proceso = list(citas_por_recordar(self.fecha))
+        with self.assertNumQueries(11):
+            self.assertEqual(encolar_recordatorios(self.fecha, tamano_bloque=2), (4, 4))
+        self.assertEqual(encolar_recordatorios(self.fecha, tamano_bloque=2), (0, 0))
+        # Un proceso que leyó las mismas citas antes del reclamo no encola nada
+        self.assertEqual(_encolar_bloque(leidas_por_otro_proceso, timezone.now()), (0, 0))
+        self.assertEqual(NotificacionCorreo.objects.filter(asunto__startswith='Recordatorio').count(), 4)
+        self.assertNotIn('de mañana', NotificacionCorreo.objects.filter(asunto__startswith='Recordatorio').first().cuerpo)
+        self.assertIsNotNone(Cita.objects.get(pk=self.cita_ocupada.pk).recordatorio_enviado_en)
+
+
+# ===================================================================================
+# CATEGORÍA 14: CALENDARIO ICS (1 TEST)
+# ===================================================================================
+
+class CalendarioIcsTests(AgendaMotorTestCase):
+    """Test 50: Feeds ICS con clave revocable y token de sincronización."""
+
+    def test_calendario_ics_responde_304_y_entrega_solo_los_cambios_desde_el_token(self):
+        """El feed se revalida con su ETag, con ?desde=<token> devuelve solo las citas modificadas (o todo si alguna salió) y su clave es revocable."""
+        url = reverse('agendamiento:calendario_profesional', args=[clave_calendario(self.profesional.user_account)])
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        otra_cita = Cita.objects.create(paciente=self.paciente, profesional=self.profesional, fecha_hora_inicio_cita=inicio, fecha_hora_fin_cita=inicio + timedelta(minutes=30), estado_cita='Programada')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn(f'UID:cita-{self.cita_ocupada.id}@agendamiento', response.content.decode())
+        token = response['X-Token-Sincronizacion']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, {'desde': token}).status_code, 304)
+
+        Cita.objects.filter(pk=otra_cita.pk).update(modificada_en=timezone.now() - timedelta(hours=1))
+        self.assertTrue(actualizar_cita(self.cita_ocupada, self.cita_ocupada.version, estado_cita='Cancelada'))
+        delta = self.client.get(url, {'desde': token}).content.decode()
+        self.assertIn('STATUS:CANCELLED', delta)
+        self.assertNotIn(f'UID:cita-{otra_cita.id}@', delta)
+
+        # Una cita que pasa a otro profesional sale del feed: el delta no la mostraría y se entrega el calendario completo
+        token = self.client.get(url)['X-Token-Sincronizacion']
+        otro_user = User.objects.create_user(username='doc_motor_calendario', password='password123')
+        otro_profesional = ProfesionalSalud.objects.create(user_account=otro_user, especialidad=self.especialidad)
+        self.assertTrue(actualizar_cita(self.cita_ocupada, self.cita_ocupada.version, profesional=otro_profesional))
+        self.assertIn(f'UID:cita-{otra_cita.id}@', self.client.get(url, {'desde': token}).content.decode())
+        self.assertEqual(self.client.get(reverse('agendamiento:calendario_paciente', args=['clave-invalida'])).status_code, 404)
+
+        # Regenerar la clave revoca la URL anterior y desactivar la cuenta corta el feed
+        regenerar_clave_calendario(self.profesional.user_account)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse('agendamiento:calendario_profesional', args=[clave_calendario(self.profesional.user_account)])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        User.objects.filter(pk=self.profesional.user_account_id).update(is_active=False)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# ===================================================================================
+# CATEGORÍA 15: PAGINACIÓN DE CITAS (1 TEST)
+# ===================================================================================
+
+class PaginacionCitasTests(AgendaMotorTestCase):
+    """Test 51: Paginación por cursor del listado de citas gestionadas."""
+
+    def test_citas_gestionadas_se_paginan_por_cursor_sin_repetir_ni_omitir_citas(self):
+        """Cada página se lee con una consulta desde el cursor de la anterior; los empates de hora se ordenan por id."""
+        inicio = timezone.make_aware(datetime.combine(self.fecha, time(9, 0)))
+        for minutos in (0, 30, 60, 90):
+            # La cita cancelada de las 10:00 empata en hora con la cita ocupada
+            Cita.objects.create(paciente=self.paciente, profesional=self.profesional, fecha_hora_inicio_cita=inicio + timedelta(minutes=minutos), fecha_hora_fin_cita=inicio + timedelta(minutes=minutos + 30), estado_cita='Cancelada' if minutos == 60 else 'Programada')
+        esperadas = list(Cita.objects.order_by('-fecha_hora_inicio_cita', '-id'))
+
+        vistas, despues = [], None
+        while True:
+            with self.assertNumQueries(1):
+                pagina, despues, anterior = paginar_citas(Cita.objects.all(), despues=despues, tamano=2)
+            vistas += pagina
+            if not despues:
+                break
+        self.assertEqual(vistas, esperadas)
+        self.assertEqual(paginar_citas(Cita.objects.all(), antes=anterior, tamano=2)[0], esperadas[2:4])
+
+        self.client.login(username='asesor_motor', password='password123')
+        response = self.client.get(reverse('agendamiento:visualizar_citas_gestionadas'), {'estado_cita': 'Programada', 'despues': codificar_cursor(esperadas[0])})
+        self.assertEqual(response.context['citas'], [cita for cita in esperadas[1:] if cita.estado_cita == 'Programada'])
+        self.assertIsNotNone(response.context['cursor_anterior'])
+        self.assertEqual(response.context['filtros_query'], 'estado_cita=Programada')
+
 # ===================================================================================
 # FINAL DEL ARCHIVO DE TESTS REORGANIZADO
 # ===================================================================================
\ No newline at end of file
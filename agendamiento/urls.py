@@ -7,6 +7,7 @@ from . import views_asesor
 from . import views_profesional
 from . import views_paciente
 from . import views_auth
+from . import views_calendario
 
 app_name = 'agendamiento'
 
@@ -35,11 +36,19 @@ urlpatterns = [
     path('paciente/<int:paciente_id>/actualizar/', views_asesor.actualizar_paciente, name='actualizar_paciente'),
 
     path('consultar-disponibilidad/', views_asesor.consultar_disponibilidad, name='consultar_disponibilidad'),
+    path('consultar-disponibilidad/especialidad/', views_asesor.buscar_primer_slot_disponible, name='buscar_primer_slot_disponible'),
+    path('api/disponibilidad/', views_asesor.api_disponibilidad, name='api_disponibilidad'),
+    path('reportes/ocupacion-especialidades/', views_asesor.reporte_ocupacion_especialidades, name='reporte_ocupacion_especialidades'),
 
     path('agendar-cita/seleccionar-paciente/<int:profesional_id>/<str:fecha_seleccionada_str>/<str:hora_inicio_slot_str>/', 
          views_asesor.seleccionar_paciente_para_cita, 
          name='seleccionar_paciente_para_cita'),
 
+    path('agendar-cita/serie/', views_asesor.agendar_serie_citas, name='agendar_serie_citas'),
+    path('citas/reprogramar-dia/', views_asesor.reprogramar_dia_profesional, name='reprogramar_dia_profesional'),
+    path('lista-espera/', views_asesor.lista_espera, name='lista_espera'),
+    path('lista-espera/<int:entrada_id>/retirar/', views_asesor.retirar_entrada_lista_espera, name='retirar_entrada_lista_espera'),
+
     path('citas-gestionadas/', views_asesor.visualizar_citas_gestionadas, name='visualizar_citas_gestionadas'),
 
     path('cita/<int:cita_id>/modificar/', views_asesor.modificar_cita, name='modificar_cita'),
@@ -51,8 +60,14 @@ urlpatterns = [
     path('profesional/agenda/', views_profesional.ver_agenda_profesional, name='ver_agenda_profesional'),
     path('profesional/cita/<int:cita_id>/detalles-paciente/', views_profesional.ver_detalles_paciente_cita, name='ver_detalles_paciente_cita'),
     path('profesional/cita/<int:cita_id>/registrar-asistencia/', views_profesional.registrar_asistencia_cita, name='registrar_asistencia_cita'),
+    path('profesional/agenda/registrar-asistencia/', views_profesional.registrar_asistencia_agenda, name='registrar_asistencia_agenda'),
     path('profesional/cita/<int:cita_id>/asistencia/confirmar/', views_profesional.confirmar_asistencia_cita, name='confirmar_asistencia_cita'),
 
+    # Feeds ICS (sin sesión, con clave revocable por usuario) para suscribirse desde aplicaciones de calendario
+    path('calendario/profesional/<str:clave>/citas.ics', views_calendario.calendario_profesional, name='calendario_profesional'),
+    path('calendario/paciente/<str:clave>/citas.ics', views_calendario.calendario_paciente, name='calendario_paciente'),
+    path('calendario/regenerar-enlace/', views_calendario.regenerar_enlace_calendario, name='regenerar_enlace_calendario'),
+
     # URLs del Paciente
     path('paciente/mis-citas/historial/', views_paciente.ver_historial_citas, name='ver_historial_citas_paciente'),
     path('paciente/mis-citas/proximas/', views_paciente.ver_proximas_citas, name='ver_proximas_citas_paciente'),
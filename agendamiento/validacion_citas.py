@@ -0,0 +1,88 @@
+"""
+Validación de las reglas de negocio al agendar una cita.
+
+Las tres reglas que se verifican antes de crear una cita se evalúan con una
+única consulta sobre las citas 'Programada':
+
+- Cruce del paciente: otra cita suya (de cualquier especialidad) a menos de
+  BUFFER_TRASLADO del horario propuesto.
+- Especialidad programada: el paciente ya tiene una cita 'Programada' en la
+  especialidad del profesional.
+- Cruce del profesional: el profesional ya tiene una cita en el horario.
+
+Cada fila se anota con la regla de mayor prioridad que incumple y trae
+precargados el profesional, su especialidad y su usuario, de modo que los
+mensajes de error no generan consultas adicionales. La restricción de no
+solapamiento de la base de datos sigue cubriendo la carrera entre esta
+consulta y la inserción.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Case, CharField, IntegerField, Q, Value, When
+
+from .models import Cita
+
+
+# Margen mínimo entre dos citas del mismo paciente (traslados)
+BUFFER_TRASLADO = timedelta(minutes=10)
+
+REGLA_CRUCE_PACIENTE = 'cruce_paciente'
+REGLA_ESPECIALIDAD_PROGRAMADA = 'especialidad_programada'
+REGLA_CRUCE_PROFESIONAL = 'cruce_profesional'
+
+# Regla incumplida y cita con la que se produce el conflicto
+ConflictoAgendamiento = namedtuple('ConflictoAgendamiento', ['regla', 'cita'])
+
+
+def buscar_conflicto_agendamiento(paciente, profesional, inicio, fin):
+    """
+    Busca con una sola consulta el primer conflicto que impide agendar una cita.
+
+    Las reglas se priorizan en el orden en que se informan al asesor: cruce
+    del paciente, especialidad ya programada y cruce del profesional.
+
+    Args:
+        paciente: Instancia de Paciente.
+        profesional: Instancia de ProfesionalSalud.
+        inicio: Datetime aware de inicio de la cita propuesta.
+        fin: Datetime aware de fin de la cita propuesta.
+
+    Returns:
+        ConflictoAgendamiento, o None si la cita cumple las tres reglas.
+    """
+    cruce_paciente = Q(
+        paciente=paciente,
+        fecha_hora_inicio_cita__lt=fin + BUFFER_TRASLADO,
+        fecha_hora_fin_cita__gt=inicio - BUFFER_TRASLADO
+    )
+    especialidad_programada = Q(paciente=paciente, profesional__especialidad_id=profesional.especialidad_id)
+    cruce_profesional = Q(
+        profesional=profesional,
+        fecha_hora_inicio_cita__lt=fin,
+        fecha_hora_fin_cita__gt=inicio
+    )
+
+    cita = Cita.objects.filter(
+        cruce_paciente | especialidad_programada | cruce_profesional,
+        estado_cita='Programada'
+    ).annotate(
+        regla=Case(
+            When(cruce_paciente, then=Value(REGLA_CRUCE_PACIENTE)),
+            When(especialidad_programada, then=Value(REGLA_ESPECIALIDAD_PROGRAMADA)),
+            default=Value(REGLA_CRUCE_PROFESIONAL),
+            output_field=CharField()
+        ),
+        prioridad_regla=Case(
+            When(cruce_paciente, then=Value(1)),
+            When(especialidad_programada, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField()
+        )
+    ).select_related(
+        'profesional__especialidad', 'profesional__user_account'
+    ).order_by('prioridad_regla', 'fecha_hora_inicio_cita').first()
+
+    if cita is None:
+        return None
+    return ConflictoAgendamiento(cita.regla, cita)
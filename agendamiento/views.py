@@ -2,7 +2,9 @@
 
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
+from django.urls import reverse
 
+from .calendario_ics import clave_calendario
 from .decorators import profesional_required, paciente_required
 
 @login_required
@@ -17,8 +19,10 @@ def pagina_inicio(request):
 @profesional_required
 def dashboard_profesional(request):
     """Dashboard principal para el rol de Profesional de Salud."""
+    clave = clave_calendario(request.user)
     context = {
         'nombre_usuario': request.user.first_name or request.user.username,
+        'url_calendario': request.build_absolute_uri(reverse('agendamiento:calendario_profesional', args=[clave])),
     }
     return render(request, 'agendamiento/dashboard_profesional.html', context)
 
@@ -26,7 +30,9 @@ def dashboard_profesional(request):
 @paciente_required
 def dashboard_paciente(request):
     """Dashboard principal para el rol de Paciente."""
+    clave = clave_calendario(request.user)
     context = {
         'nombre_usuario': request.user.first_name or request.user.username,
+        'url_calendario': request.build_absolute_uri(reverse('agendamiento:calendario_paciente', args=[clave])),
     }
     return render(request, 'agendamiento/dashboard_paciente.html', context)
@@ -1,26 +1,51 @@
 """Vistas para el rol de Asesor de Servicio."""
 from datetime import datetime, time, timedelta
 
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Value
 from django.db.models.functions import Concat
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.utils import timezone, formats
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.translation import gettext_lazy as _
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
+from .concurrencia_citas import actualizar_cita, version_esperada
 from .decorators import asesor_required
+from .disponibilidad import (
+    ahora_local, buscar_primeros_slots_especialidad, etag_disponibilidad, limites_dia,
+    obtener_slots_disponibles, obtener_slots_rango, proximos_slots_profesional
+)
 from .forms import (
     UserForm, PacienteForm, UserUpdateForm,
     ConsultaDisponibilidadForm, BuscarPacientePorDocumentoForm, CitaFilterForm,
-    ModificarCitaForm
+    ListaEsperaForm, ModificarCitaForm, PrimerSlotDisponibleForm, ReporteOcupacionForm, ReprogramarDiaProfesionalForm,
+    SerieCitasForm
+)
+from .idempotencia import idempotente, nueva_clave_idempotencia
+from .lista_espera import asignar_cupo_liberado
+from .notificaciones import encolar_correo
+from .models import Paciente, ProfesionalSalud, Cita, Especialidad, EntradaListaEspera, es_error_solapamiento_cita
+from .paginacion_citas import paginar_citas
+from .reporte_ocupacion import construir_reporte_ocupacion
+from .reprogramacion import (
+    DIAS_BUSQUEDA_REPROGRAMACION, ConflictoReprogramacion, aplicar_reprogramacion, cargar_propuestas_confirmadas,
+    codificar_propuesta, notificar_reprogramacion, planificar_reprogramacion_dia
+)
+from .retenciones import horario_retenido_por_otro, liberar_retenciones_usuario, retener_slot
+from .series_citas import REGLA_FUERA_DE_HORARIO, REGLA_HORARIO_RETENIDO, buscar_conflictos_serie, crear_serie_citas, generar_ocurrencias
+from .validacion_citas import (
+    REGLA_CRUCE_PACIENTE, REGLA_CRUCE_PROFESIONAL, REGLA_ESPECIALIDAD_PROGRAMADA, buscar_conflicto_agendamiento
 )
-from .models import Paciente, ProfesionalSalud, PlantillaHorarioMedico, Cita, Especialidad
+
+
+# Opciones alternativas que se sugieren cuando el día consultado no tiene horarios libres
+CANTIDAD_SLOTS_SUGERIDOS = 3
 
 
 @login_required
@@ -140,85 +165,44 @@ def actualizar_paciente(request, paciente_id):
 @login_required
 @asesor_required
 def consultar_disponibilidad(request):
-    """Consulta horarios disponibles de un profesional en una fecha específica."""
+    """Consulta horarios disponibles de un profesional en una fecha o en un rango de días."""
     form = ConsultaDisponibilidadForm(request.GET or None)
     slots_disponibles = []
+    disponibilidad_por_dia = []
     profesional_seleccionado = None
     fecha_seleccionada = None
+    rango_dias = 1
+    proximos_slots = []
     
     if form.is_valid():
         profesional_seleccionado = form.cleaned_data['profesional']
         fecha_seleccionada = form.cleaned_data['fecha']
+        rango_dias = form.cleaned_data['rango_dias']
         
-        if profesional_seleccionado and fecha_seleccionada:
-            # Obtener plantillas de horario para el día de la semana seleccionado
-            dia_semana_seleccionado = fecha_seleccionada.weekday()
-            plantillas = PlantillaHorarioMedico.objects.filter(
-                profesional=profesional_seleccionado,
-                dia_semana=dia_semana_seleccionado
-            ).order_by('hora_inicio_bloque')
+        if profesional_seleccionado and fecha_seleccionada and rango_dias > 1:
+            # Modo rango: todas las plantillas y citas de la ventana en dos consultas
+            slots_por_fecha = obtener_slots_rango(profesional_seleccionado, fecha_seleccionada, rango_dias)
+            disponibilidad_por_dia = list(slots_por_fecha.items())
+            fecha_fin_rango = fecha_seleccionada + timedelta(days=rango_dias - 1)
             
-            # Obtener citas ya programadas para ese día
-            current_tz = timezone.get_current_timezone()
-            inicio_del_dia_seleccionado = timezone.make_aware(datetime.combine(fecha_seleccionada, time.min), current_tz)
-            fin_del_dia_seleccionado = timezone.make_aware(datetime.combine(fecha_seleccionada, time.max), current_tz)
-            
-            citas_ocupadas_qs = Cita.objects.filter(
-                profesional=profesional_seleccionado,
-                fecha_hora_inicio_cita__gte=inicio_del_dia_seleccionado,
-                fecha_hora_inicio_cita__lte=fin_del_dia_seleccionado,
-                estado_cita='Programada'
-            )
-            
-            # Crear lista de rangos de tiempo ocupados
-            rangos_ocupados = []
-            for cita_ocupada in citas_ocupadas_qs:
-                hora_inicio_local_ocupada = timezone.localtime(cita_ocupada.fecha_hora_inicio_cita, current_tz).time()
-                hora_fin_local_ocupada = timezone.localtime(cita_ocupada.fecha_hora_fin_cita, current_tz).time()
-                rangos_ocupados.append((hora_inicio_local_ocupada, hora_fin_local_ocupada))
-            
-            duracion_consulta = profesional_seleccionado.especialidad.duracion_consulta_minutos
-            
-            # Generar slots disponibles dentro de cada plantilla de horario
-            for plantilla in plantillas:
-                hora_inicio_iteracion_naive = datetime.combine(fecha_seleccionada, plantilla.hora_inicio_bloque)
-                hora_fin_iteracion_bloque_naive = datetime.combine(fecha_seleccionada, plantilla.hora_fin_bloque)
-                hora_inicio_iteracion = timezone.make_aware(hora_inicio_iteracion_naive, current_tz)
-                hora_fin_iteracion_bloque = timezone.make_aware(hora_fin_iteracion_bloque_naive, current_tz)
-                
-                # Referencia actual para validaciones de tiempo
-                ahora_aware = timezone.now()
-
-                while hora_inicio_iteracion < hora_fin_iteracion_bloque:
-                    hora_fin_slot_propuesto = hora_inicio_iteracion + timedelta(minutes=duracion_consulta)
-                    if hora_fin_slot_propuesto > hora_fin_iteracion_bloque:
-                        break
-                    
-                    # REGLA DE NEGOCIO 1: No mostrar slots del pasado
-                    # Si el slot inicia antes de "ahora", se descarta.
-                    if hora_inicio_iteracion < ahora_aware:
-                        hora_inicio_iteracion = hora_fin_slot_propuesto
-                        continue
-                    
-                    # Verificar si el slot está ocupado por alguna cita existente
-                    slot_esta_ocupado = False
-                    slot_inicio_time_local = hora_inicio_iteracion.astimezone(current_tz).time()
-                    slot_fin_time_local = hora_fin_slot_propuesto.astimezone(current_tz).time()
-                    
-                    for inicio_ocupado_local, fin_ocupado_local in rangos_ocupados:
-                        if (slot_inicio_time_local < fin_ocupado_local and slot_fin_time_local > inicio_ocupado_local):
-                            slot_esta_ocupado = True
-                            break
-                    
-                    if not slot_esta_ocupado:
-                        slots_disponibles.append((slot_inicio_time_local, slot_fin_time_local))
-                    
-                    hora_inicio_iteracion = hora_fin_slot_propuesto
+            if not slots_por_fecha:
+                messages.warning(request, f"{profesional_seleccionado} no tiene un horario configurado entre el {formats.date_format(fecha_seleccionada, 'd/m/Y')} y el {formats.date_format(fecha_fin_rango, 'd/m/Y')}.")
+            elif not any(slots for slots in slots_por_fecha.values()):
+                messages.info(request, f"No hay horarios disponibles para {profesional_seleccionado} entre el {formats.date_format(fecha_seleccionada, 'd/m/Y')} y el {formats.date_format(fecha_fin_rango, 'd/m/Y')}.")
+        elif profesional_seleccionado and fecha_seleccionada:
+            slots_disponibles, tiene_horario = obtener_slots_disponibles(profesional_seleccionado, fecha_seleccionada)
             
+            # Sin horarios ese día: sugerir las próximas opciones del profesional
+            if not slots_disponibles:
+                desde_sugerencias = max(ahora_local(), datetime.combine(fecha_seleccionada, time.min))
+                proximos_slots = proximos_slots_profesional(
+                    profesional_seleccionado, CANTIDAD_SLOTS_SUGERIDOS, desde=desde_sugerencias
+                )
+
             # Mensajes informativos según resultados
-            if not slots_disponibles and plantillas.exists():
+            if not slots_disponibles and tiene_horario:
                 messages.info(request, f"No hay horarios disponibles para {profesional_seleccionado} el {formats.date_format(fecha_seleccionada, 'd/m/Y')}.")
-            elif not plantillas.exists() and profesional_seleccionado and fecha_seleccionada:
+            elif not tiene_horario:
                 de_str = _('de')
                 dia_sem_str = formats.date_format(fecha_seleccionada, "l")
                 dia_num_str = formats.date_format(fecha_seleccionada, "d")
@@ -231,6 +215,9 @@ def consultar_disponibilidad(request):
         'form': form,
         'titulo_pagina': 'Consultar Disponibilidad de Citas',
         'slots_disponibles': slots_disponibles,
+        'disponibilidad_por_dia': disponibilidad_por_dia,
+        'rango_dias': rango_dias,
+        'proximos_slots': proximos_slots,
         'profesional_seleccionado': profesional_seleccionado,
         'fecha_seleccionada': fecha_seleccionada
     }
@@ -239,9 +226,135 @@ def consultar_disponibilidad(request):
 
 @login_required
 @asesor_required
+@require_GET
+def api_disponibilidad(request):
+    """
+    Retorna en JSON los slots disponibles de un profesional para una fecha o un rango de días.
+
+    Acepta los mismos parámetros que consultar_disponibilidad (profesional, fecha, rango_dias).
+    La respuesta incluye un ETag; si el cliente envía If-None-Match con el ETag vigente
+    se responde 304 sin recalcular la disponibilidad.
+    """
+    form = ConsultaDisponibilidadForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+
+    profesional = form.cleaned_data['profesional']
+    fecha_inicio = form.cleaned_data['fecha']
+    rango_dias = form.cleaned_data['rango_dias']
+    fechas = [fecha_inicio + timedelta(days=desplazamiento) for desplazamiento in range(rango_dias)]
+
+    etag = etag_disponibilidad(profesional, fechas)
+    respuesta_no_modificada = get_conditional_response(request, etag=etag)
+    if respuesta_no_modificada is not None:
+        patch_cache_control(respuesta_no_modificada, private=True, no_cache=True)
+        return respuesta_no_modificada
+
+    slots_por_fecha = obtener_slots_rango(profesional, fecha_inicio, rango_dias)
+    disponibilidad = []
+    for fecha, slots in slots_por_fecha.items():
+        fecha_str = fecha.strftime('%Y-%m-%d')
+        disponibilidad.append({
+            'fecha': fecha_str,
+            'slots': [
+                {
+                    'hora_inicio': hora_inicio.strftime('%H:%M'),
+                    'hora_fin': hora_fin.strftime('%H:%M'),
+                    'url_agendar': reverse('agendamiento:seleccionar_paciente_para_cita', kwargs={
+                        'profesional_id': profesional.id,
+                        'fecha_seleccionada_str': fecha_str,
+                        'hora_inicio_slot_str': hora_inicio.strftime('%H:%M'),
+                    }),
+                }
+                for hora_inicio, hora_fin in slots
+            ],
+        })
+
+    response = JsonResponse({
+        'profesional': {
+            'id': profesional.id,
+            'nombre': profesional.user_account.get_full_name(),
+            'especialidad': profesional.especialidad.nombre_especialidad,
+        },
+        'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
+        'rango_dias': rango_dias,
+        'disponibilidad': disponibilidad,
+    })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@asesor_required
+def buscar_primer_slot_disponible(request):
+    """Busca los primeros horarios disponibles de una especialidad entre todos sus profesionales."""
+    form = PrimerSlotDisponibleForm(request.GET or None)
+    slots_encontrados = []
+    especialidad_seleccionada = None
+    
+    if form.is_valid():
+        especialidad_seleccionada = form.cleaned_data['especialidad']
+        fecha_desde = form.cleaned_data['fecha_desde']
+        horizonte_dias = form.cleaned_data['horizonte_dias']
+        
+        slots_encontrados = buscar_primeros_slots_especialidad(
+            especialidad_seleccionada,
+            fecha_desde,
+            horizonte_dias,
+            form.cleaned_data['cantidad']
+        )
+        
+        if not slots_encontrados:
+            fecha_fin = fecha_desde + timedelta(days=horizonte_dias - 1)
+            messages.info(request, f"No hay horarios disponibles para {especialidad_seleccionada} entre el {formats.date_format(fecha_desde, 'd/m/Y')} y el {formats.date_format(fecha_fin, 'd/m/Y')}.")
+    
+    context = {
+        'form': form,
+        'titulo_pagina': 'Primer Horario Disponible por Especialidad',
+        'slots_encontrados': slots_encontrados,
+        'especialidad_seleccionada': especialidad_seleccionada,
+    }
+    return render(request, 'agendamiento/primer_slot_disponible.html', context)
+
+
+@login_required
+@asesor_required
+def reporte_ocupacion_especialidades(request):
+    """Muestra el mapa de calor de ocupación (minutos reservados / minutos de plantilla) por especialidad y día."""
+    form = ReporteOcupacionForm(request.GET or None)
+    fecha_desde = timezone.localdate()
+    dias = 7
+    if form.is_valid():
+        fecha_desde = form.cleaned_data['fecha_desde']
+        dias = form.cleaned_data['dias']
+
+    fechas, filas = construir_reporte_ocupacion(fecha_desde, dias)
+    context = {
+        'form': form,
+        'fechas': fechas,
+        'filas': filas,
+        'titulo_pagina': 'Ocupación por Especialidad'
+    }
+    return render(request, 'agendamiento/reporte_ocupacion_especialidades.html', context)
+
+
+@login_required
+@asesor_required
+@idempotente('agendar_cita')
 def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_str, hora_inicio_slot_str):
-    """Selecciona un paciente y agenda una cita en el horario especificado."""
-    profesional = get_object_or_404(ProfesionalSalud, id=profesional_id)
+    """
+    Selecciona un paciente y agenda una cita en el horario especificado.
+
+    La validación del POST cuesta tres consultas: el paciente, las reglas de
+    agendamiento (validacion_citas) y la verificación de retenciones ajenas.
+    El POST completo ronda las 21 consultas (incluidos los savepoints), porque
+    en la misma transacción se inserta la cita, se marcan el slot
+    materializado y el agregado de ocupación (un UPDATE cada uno), se encola
+    el correo y se registran la solicitud idempotente y la sesión; la caché
+    de disponibilidad se invalida una sola vez, al confirmar.
+    """
+    profesional = get_object_or_404(ProfesionalSalud.objects.select_related('user_account', 'especialidad'), id=profesional_id)
     
     # Validar formato de fecha y hora desde URL
     try:
@@ -264,6 +377,16 @@ def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_s
     if fecha_hora_inicio_cita_aware < timezone.now():
         messages.error(request, "No es posible agendar citas en fechas u horas pasadas.")
         return redirect('agendamiento:consultar_disponibilidad')
+
+    # Retener el horario mientras se busca al paciente, para que otros asesores no lo elijan;
+    # al confirmar (POST) solo se verifica que nadie más lo retenga, sin renovar la retención
+    if request.method == 'POST':
+        retenido_por_otro = horario_retenido_por_otro(profesional, fecha_hora_inicio_cita_aware, fecha_hora_fin_cita_aware, request.user)
+    else:
+        retenido_por_otro = retener_slot(profesional, fecha_hora_inicio_cita_aware, fecha_hora_fin_cita_aware, request.user) is None
+    if retenido_por_otro:
+        messages.error(request, f"El horario de {hora_inicio_slot_str} para {profesional} está siendo agendado por otro asesor. Elija otro horario o intente de nuevo en unos minutos.")
+        return redirect('agendamiento:consultar_disponibilidad')
     
     # Búsqueda de paciente por documento
     paciente_encontrado = None
@@ -284,25 +407,18 @@ def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_s
             messages.error(request, "No se seleccionó un paciente para agendar la cita.")
         else:
             try:
-                paciente_seleccionado = Paciente.objects.get(id=paciente_id_confirmado)
+                paciente_seleccionado = Paciente.objects.select_related('user_account').get(id=paciente_id_confirmado)
                 especialidad_cita_propuesta = profesional.especialidad
 
-                # REGLA DE NEGOCIO 3: Validación de Cruce de Horarios del Paciente (Cross-Specialty)
-                # Verificar que el paciente no tenga otra cita que se solape con la nueva, + 10 min de buffer traslados
-                
-                buffer_traslado = timedelta(minutes=10)
-                inicio_con_buffer = fecha_hora_inicio_cita_aware - buffer_traslado
-                fin_con_buffer = fecha_hora_fin_cita_aware + buffer_traslado
-
-                cita_conflicto_paciente = Cita.objects.filter(
-                    paciente=paciente_seleccionado,
-                    estado_cita='Programada',
-                    fecha_hora_inicio_cita__lt=fin_con_buffer,
-                    fecha_hora_fin_cita__gt=inicio_con_buffer
-                ).first()
-
-                if cita_conflicto_paciente:
+                # REGLAS DE NEGOCIO 2 y 3 y Validación 2 en una sola consulta (ver validacion_citas):
+                # cruce del paciente con 10 min de buffer, una cita 'Programada' por especialidad y cruce del profesional
+                conflicto = buscar_conflicto_agendamiento(
+                    paciente_seleccionado, profesional, fecha_hora_inicio_cita_aware, fecha_hora_fin_cita_aware
+                )
+
+                if conflicto and conflicto.regla == REGLA_CRUCE_PACIENTE:
                      # Formateo de mensaje de error detallado
+                    cita_conflicto_paciente = conflicto.cita
                     fecha_hora_conflicto_local = timezone.localtime(cita_conflicto_paciente.fecha_hora_inicio_cita)
                     de_str = _('de')
                     dia_sem_str = formats.date_format(fecha_hora_conflicto_local, "l")
@@ -315,14 +431,8 @@ def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_s
                     messages.error(request, f"Conflicto de agenda para el paciente: {paciente_seleccionado.user_account.get_full_name()} ya tiene una cita ({cita_conflicto_paciente.profesional.especialidad.nombre_especialidad}) programada el {fecha_conflicto_formato}. Debe existir un margen de 10 minutos entre citas.")
                     return redirect('agendamiento:consultar_disponibilidad')
 
-                # Validación 2: Paciente no debe tener otra cita programada para la misma especialidad
-                cita_existente_programada = Cita.objects.filter(
-                    paciente=paciente_seleccionado,
-                    profesional__especialidad=especialidad_cita_propuesta,
-                    estado_cita='Programada'
-                ).first()
-
-                if cita_existente_programada:
+                if conflicto and conflicto.regla == REGLA_ESPECIALIDAD_PROGRAMADA:
+                    cita_existente_programada = conflicto.cita
                     fecha_hora_existente_local = timezone.localtime(cita_existente_programada.fecha_hora_inicio_cita)
                     de_str = _('de')
                     dia_sem_str = formats.date_format(fecha_hora_existente_local, "l")
@@ -336,55 +446,61 @@ def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_s
                     return redirect('agendamiento:consultar_disponibilidad')
 
                 # Validación 3: Verificar que el horario sigue disponible (evitar condiciones de carrera y solapamientos)
-                # REGLA DE NEGOCIO 2: Validación por solapamiento (Overlap) en lugar de coincidencia exacta
-                if Cita.objects.filter(
-                    profesional=profesional,
-                    estado_cita='Programada',
-                    fecha_hora_inicio_cita__lt=fecha_hora_fin_cita_aware,
-                    fecha_hora_fin_cita__gt=fecha_hora_inicio_cita_aware
-                ).exists():
+                # REGLA DE NEGOCIO 2: Además de la consulta anterior, la base de datos rechaza el cruce con otra cita
+                # 'Programada' del profesional (exclusión en PostgreSQL, trigger en SQLite) si otra petición la creó entretanto
+                horario_tomado = conflicto is not None
+                if not horario_tomado:
+                    asesor_que_agenda_obj = request.user.asesor_perfil if hasattr(request.user, 'asesor_perfil') else None
+                    try:
+                        with transaction.atomic():
+                            cita_creada = Cita.objects.create(
+                                paciente=paciente_seleccionado,
+                                profesional=profesional,
+                                asesor_que_agenda=asesor_que_agenda_obj,
+                                fecha_hora_inicio_cita=fecha_hora_inicio_cita_aware,
+                                fecha_hora_fin_cita=fecha_hora_fin_cita_aware,
+                                estado_cita='Programada'
+                            )
+                            # El correo de confirmación se encola en la misma transacción que la cita
+                            if paciente_seleccionado.user_account.email:
+                                de_str = _('de')
+                                dia_sem_str_email = formats.date_format(fecha_obj, "l")
+                                dia_num_str_email = formats.date_format(fecha_obj, "d")
+                                mes_str_email = formats.date_format(fecha_obj, "F")
+                                anho_str_email = formats.date_format(fecha_obj, "Y")
+                                fecha_formateada_email = f"{dia_sem_str_email}, {dia_num_str_email} {de_str} {mes_str_email} {de_str} {anho_str_email}"
+                                hora_formateada_email = hora_obj.strftime('%I:%M %p').lower()
+
+                                mensaje_email = (
+                                    f"Estimado(a) {paciente_seleccionado.user_account.get_full_name()},\n\n"
+                                    f"Le confirmamos su cita médica para el servicio de {profesional.especialidad.nombre_especialidad} "
+                                    f"con el/la Dr(a). {profesional.user_account.get_full_name()}.\n\n"
+                                    f"Fecha: {fecha_formateada_email}\n"
+                                    f"Hora: {hora_formateada_email}\n\n"
+                                    f"Por favor, llegue con anticipación.\n\n"
+                                    f"Saludos cordiales,\nIPS Medical Integral"
+                                )
+                                encolar_correo(
+                                    paciente_seleccionado.user_account.email,
+                                    f"Confirmación de Cita Médica - {profesional.especialidad.nombre_especialidad}",
+                                    mensaje_email,
+                                    cita=cita_creada
+                                )
+                    except IntegrityError as error:
+                        if not es_error_solapamiento_cita(error):
+                            raise
+                        horario_tomado = True
+
+                if horario_tomado:
                     messages.error(request, f"El horario de {hora_inicio_slot_str} para {profesional} ya no está disponible (cruce con otra cita).")
                 else:
-                    # Crear la cita
-                    asesor_que_agenda_obj = request.user.asesor_perfil if hasattr(request.user, 'asesor_perfil') else None
-                    
-                    Cita.objects.create(
-                        paciente=paciente_seleccionado,
-                        profesional=profesional,
-                        asesor_que_agenda=asesor_que_agenda_obj,
-                        fecha_hora_inicio_cita=fecha_hora_inicio_cita_aware,
-                        fecha_hora_fin_cita=fecha_hora_fin_cita_aware,
-                        estado_cita='Programada'
-                    )
-                    
-                    # Enviar correo de confirmación si el paciente tiene email
-                    
+                    liberar_retenciones_usuario(request.user)
+
+                    mensaje_exito = f"Cita agendada para {paciente_seleccionado.user_account.get_full_name()} con {profesional.user_account.get_full_name()} el {formats.date_format(fecha_obj, 'd/m/Y')} a las {hora_obj.strftime('%H:%M')}."
                     if paciente_seleccionado.user_account.email:
-                        asunto = f"Confirmación de Cita Médica - {profesional.especialidad.nombre_especialidad}"
-                        de_str = _('de')
-                        dia_sem_str_email = formats.date_format(fecha_obj, "l")
-                        dia_num_str_email = formats.date_format(fecha_obj, "d")
-                        mes_str_email = formats.date_format(fecha_obj, "F")
-                        anho_str_email = formats.date_format(fecha_obj, "Y")
-                        fecha_formateada_email = f"{dia_sem_str_email}, {dia_num_str_email} {de_str} {mes_str_email} {de_str} {anho_str_email}"
-                        hora_formateada_email = hora_obj.strftime('%I:%M %p').lower()
-                        
-                        mensaje_email = (
-                            f"Estimado(a) {paciente_seleccionado.user_account.get_full_name()},\n\n"
-                            f"Le confirmamos su cita médica para el servicio de {profesional.especialidad.nombre_especialidad} "
-                            f"con el/la Dr(a). {profesional.user_account.get_full_name()}.\n\n"
-                            f"Fecha: {fecha_formateada_email}\n"
-                            f"Hora: {hora_formateada_email}\n\n"
-                            f"Por favor, llegue con anticipación.\n\n"
-                            f"Saludos cordiales,\nIPS Medical Integral"
-                        )
-                        try:
-                            send_mail(asunto, mensaje_email, settings.DEFAULT_FROM_EMAIL, [paciente_seleccionado.user_account.email], fail_silently=False)
-                            messages.success(request, f"Cita agendada para {paciente_seleccionado.user_account.get_full_name()} con {profesional.user_account.get_full_name()} el {formats.date_format(fecha_obj, 'd/m/Y')} a las {hora_obj.strftime('%H:%M')}. Se envió correo de confirmación.")
-                        except Exception as e:
-                            messages.warning(request, f"Cita agendada para {paciente_seleccionado.user_account.get_full_name()} con {profesional.user_account.get_full_name()} el {formats.date_format(fecha_obj, 'd/m/Y')} a las {hora_obj.strftime('%H:%M')}. Hubo un problema al enviar el correo de confirmación: {e}")
+                        messages.success(request, f"{mensaje_exito} El correo de confirmación se enviará en breve.")
                     else:
-                        messages.success(request, f"Cita agendada para {paciente_seleccionado.user_account.get_full_name()} con {profesional.user_account.get_full_name()} el {formats.date_format(fecha_obj, 'd/m/Y')} a las {hora_obj.strftime('%H:%M')}. (Paciente sin email para notificación).")
+                        messages.success(request, f"{mensaje_exito} (Paciente sin email para notificación).")
                     return redirect('agendamiento:dashboard_asesor')
             except Paciente.DoesNotExist:
                 messages.error(request, "El paciente seleccionado para agendar la cita no es válido.")
@@ -402,10 +518,221 @@ def seleccionar_paciente_para_cita(request, profesional_id, fecha_seleccionada_s
         'profesional_id': profesional_id,
         'fecha_seleccionada_str': fecha_seleccionada_str,
         'hora_inicio_slot_str': hora_inicio_slot_str,
+        'clave_idempotencia': nueva_clave_idempotencia(),
     }
     return render(request, 'agendamiento/seleccionar_paciente_para_cita.html', context)
 
 
+# Descripción de cada regla incumplida por una sesión de una serie
+DESCRIPCION_CONFLICTOS_SERIE = {
+    REGLA_FUERA_DE_HORARIO: "El horario no coincide con un turno de la plantilla horaria del profesional.",
+    REGLA_HORARIO_RETENIDO: "Otro asesor está agendando este horario.",
+    REGLA_CRUCE_PACIENTE: "El paciente tiene otra cita a menos de 10 minutos de este horario.",
+    REGLA_ESPECIALIDAD_PROGRAMADA: "El paciente ya tiene una cita 'Programada' en esta especialidad.",
+    REGLA_CRUCE_PROFESIONAL: "El profesional ya tiene una cita en este horario.",
+}
+
+
+@login_required
+@asesor_required
+@idempotente('agendar_serie_citas')
+def agendar_serie_citas(request):
+    """Agenda una serie de citas recurrentes para un paciente: se crean todas las sesiones o ninguna."""
+    form = SerieCitasForm(request.POST or None)
+    conflictos = []
+
+    if request.method == 'POST' and form.is_valid():
+        paciente = form.cleaned_data['paciente']
+        profesional = form.cleaned_data['profesional']
+        ocurrencias = generar_ocurrencias(
+            form.cleaned_data['fecha_inicio'],
+            form.cleaned_data['hora_inicio'],
+            form.cleaned_data['sesiones'],
+            form.cleaned_data['frecuencia_dias'],
+            profesional.especialidad.duracion_consulta_minutos
+        )
+
+        if ocurrencias[0].inicio < timezone.now():
+            messages.error(request, "No es posible agendar citas en fechas u horas pasadas.")
+        else:
+            inicios_por_numero = {ocurrencia.numero: timezone.localtime(ocurrencia.inicio) for ocurrencia in ocurrencias}
+            for conflicto in buscar_conflictos_serie(paciente, profesional, ocurrencias, usuario=request.user):
+                conflictos.append({
+                    'sesion': conflicto.numero,
+                    'fecha_hora': inicios_por_numero.get(conflicto.numero),
+                    'descripcion': DESCRIPCION_CONFLICTOS_SERIE[conflicto.regla],
+                    'cita': conflicto.cita,
+                })
+
+            if conflictos:
+                messages.error(request, f"No se agendó la serie: se encontraron {len(conflictos)} conflicto(s). Ajuste la fecha, la hora o la frecuencia.")
+            else:
+                asesor_que_agenda_obj = request.user.asesor_perfil if hasattr(request.user, 'asesor_perfil') else None
+                try:
+                    with transaction.atomic():
+                        citas = crear_serie_citas(paciente, profesional, ocurrencias, asesor=asesor_que_agenda_obj)
+                        if paciente.user_account.email:
+                            lineas_sesiones = "\n".join(
+                                f"  {numero}. {formats.date_format(inicio, 'l d/m/Y')} a las {inicio.strftime('%I:%M %p').lower()}"
+                                for numero, inicio in inicios_por_numero.items()
+                            )
+                            mensaje_email = (
+                                f"Estimado(a) {paciente.user_account.get_full_name()},\n\n"
+                                f"Le confirmamos sus {len(citas)} citas para el servicio de {profesional.especialidad.nombre_especialidad} "
+                                f"con el/la Dr(a). {profesional.user_account.get_full_name()}:\n\n"
+                                f"{lineas_sesiones}\n\n"
+                                f"Por favor, llegue con anticipación.\n\n"
+                                f"Saludos cordiales,\nIPS Medical Integral"
+                            )
+                            encolar_correo(
+                                paciente.user_account.email,
+                                f"Confirmación de Serie de Citas - {profesional.especialidad.nombre_especialidad}",
+                                mensaje_email,
+                                cita=citas[0]
+                            )
+                except IntegrityError as error:
+                    if not es_error_solapamiento_cita(error):
+                        raise
+                    messages.error(request, "Uno de los horarios de la serie acaba de ser ocupado por otra cita. No se agendó ninguna sesión; intente de nuevo.")
+                else:
+                    resumen = f"Serie de {len(citas)} citas agendada para {paciente.user_account.get_full_name()} con {profesional.user_account.get_full_name()} desde el {formats.date_format(inicios_por_numero[1], 'd/m/Y')} a las {inicios_por_numero[1].strftime('%H:%M')}."
+                    if paciente.user_account.email:
+                        messages.success(request, f"{resumen} El correo de confirmación se enviará en breve.")
+                    else:
+                        messages.success(request, f"{resumen} (Paciente sin email para notificación).")
+                    return redirect('agendamiento:dashboard_asesor')
+
+    context = {
+        'form': form,
+        'conflictos': conflictos,
+        'clave_idempotencia': nueva_clave_idempotencia(),
+        'titulo_pagina': 'Agendar Serie de Citas'
+    }
+    return render(request, 'agendamiento/agendar_serie_citas.html', context)
+
+
+@login_required
+@asesor_required
+@idempotente('reprogramar_dia_profesional')
+def reprogramar_dia_profesional(request):
+    """
+    Reprograma las citas 'Programada' de un profesional en un día a los primeros horarios libres de su especialidad.
+
+    Con GET muestra la reasignación propuesta; con POST aplica exactamente la
+    propuesta que vio el asesor (enviada en campos ocultos con la versión de
+    cada cita) en una transacción que también encola los correos a los
+    pacientes. Si alguna cita cambió desde la vista previa no se aplica nada
+    y se muestra la nueva propuesta.
+    """
+    form = ReprogramarDiaProfesionalForm(request.POST if request.method == 'POST' else (request.GET or None))
+    propuestas = []
+    sin_asignar = []
+
+    if form.is_valid():
+        profesional = form.cleaned_data['profesional']
+        fecha = form.cleaned_data['fecha']
+        url_vista_previa = f"{reverse('agendamiento:reprogramar_dia_profesional')}?profesional={profesional.id}&fecha={fecha.strftime('%Y-%m-%d')}"
+
+        if request.method == 'POST':
+            try:
+                with transaction.atomic():
+                    propuestas = cargar_propuestas_confirmadas(profesional, fecha, request.POST.getlist('propuesta'))
+                    if not propuestas:
+                        messages.error(request, "No se recibió una propuesta válida para aplicar. Revise la propuesta e intente de nuevo.")
+                        return redirect(url_vista_previa)
+                    total_reprogramadas = aplicar_reprogramacion(propuestas)
+                    encolados = notificar_reprogramacion(propuestas)
+            except ConflictoReprogramacion:
+                messages.error(request, "Una de las citas fue modificada o cancelada después de generar la propuesta. No se modificó ninguna cita; revise la nueva propuesta.")
+                return redirect(url_vista_previa)
+            except IntegrityError as error:
+                if not es_error_solapamiento_cita(error):
+                    raise
+                messages.error(request, "Uno de los horarios propuestos acaba de ser ocupado por otra cita. No se modificó ninguna cita; revise la nueva propuesta.")
+                return redirect(url_vista_previa)
+
+            messages.success(request, f"Se reprogramaron {total_reprogramadas} cita(s) de {profesional} del {formats.date_format(fecha, 'd/m/Y')}. Se enviarán {encolados} correo(s) de notificación en breve.")
+            inicio_dia, fin_dia = limites_dia(fecha)
+            restantes = Cita.objects.filter(
+                profesional=profesional,
+                estado_cita='Programada',
+                fecha_hora_inicio_cita__gte=inicio_dia,
+                fecha_hora_inicio_cita__lte=fin_dia
+            ).count()
+            if restantes:
+                messages.warning(request, f"{restantes} cita(s) no se reprogramaron y siguen programadas con {profesional}.")
+            return redirect('agendamiento:visualizar_citas_gestionadas')
+
+        propuestas, sin_asignar = planificar_reprogramacion_dia(profesional, fecha)
+        if not propuestas and not sin_asignar:
+            messages.info(request, f"{profesional} no tiene citas 'Programada' el {formats.date_format(fecha, 'd/m/Y')}.")
+
+    context = {
+        'form': form,
+        'propuestas': propuestas,
+        'codigos_propuestas': [codificar_propuesta(propuesta) for propuesta in propuestas],
+        'sin_asignar': sin_asignar,
+        'dias_busqueda': DIAS_BUSQUEDA_REPROGRAMACION,
+        'clave_idempotencia': nueva_clave_idempotencia(),
+        'titulo_pagina': 'Reprogramar Agenda de un Profesional'
+    }
+    return render(request, 'agendamiento/reprogramar_dia_profesional.html', context)
+
+
+@login_required
+@asesor_required
+@idempotente('lista_espera')
+def lista_espera(request):
+    """
+    Inscribe pacientes en la lista de espera y muestra las entradas en espera.
+
+    Cuando se cancela una cita, el cupo se asigna automáticamente al primer
+    paciente elegible de la especialidad (ver ejecutar_cancelacion_cita).
+    """
+    form = ListaEsperaForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        paciente = form.cleaned_data['paciente']
+        especialidad = form.cleaned_data['especialidad']
+        if EntradaListaEspera.objects.filter(paciente=paciente, especialidad=especialidad, estado='Esperando').exists():
+            messages.warning(request, f"{paciente.user_account.get_full_name()} ya está en la lista de espera de {especialidad.nombre_especialidad}.")
+        else:
+            EntradaListaEspera.objects.create(
+                paciente=paciente,
+                especialidad=especialidad,
+                profesional_preferido=form.cleaned_data.get('profesional_preferido'),
+                fecha_desde=form.cleaned_data['fecha_desde'],
+                fecha_hasta=form.cleaned_data['fecha_hasta'],
+                asesor_que_registra=request.user.asesor_perfil if hasattr(request.user, 'asesor_perfil') else None
+            )
+            messages.success(request, f"{paciente.user_account.get_full_name()} fue inscrito(a) en la lista de espera de {especialidad.nombre_especialidad}.")
+        return redirect('agendamiento:lista_espera')
+
+    entradas = EntradaListaEspera.objects.filter(estado='Esperando').select_related(
+        'paciente__user_account', 'especialidad', 'profesional_preferido__user_account'
+    ).order_by('especialidad__nombre_especialidad', 'creada_en')
+
+    context = {
+        'form': form,
+        'entradas': entradas,
+        'clave_idempotencia': nueva_clave_idempotencia(),
+        'titulo_pagina': 'Lista de Espera por Especialidad'
+    }
+    return render(request, 'agendamiento/lista_espera.html', context)
+
+
+@login_required
+@asesor_required
+@require_POST
+def retirar_entrada_lista_espera(request, entrada_id):
+    """Retira a un paciente de la lista de espera."""
+    actualizadas = EntradaListaEspera.objects.filter(id=entrada_id, estado='Esperando').update(estado='Retirada')
+    if actualizadas:
+        messages.success(request, "El paciente fue retirado de la lista de espera.")
+    else:
+        messages.warning(request, "La entrada ya no estaba en espera. No se realizó ninguna acción.")
+    return redirect('agendamiento:lista_espera')
+
+
 @login_required
 @asesor_required
 def visualizar_citas_gestionadas(request):
@@ -413,7 +740,7 @@ def visualizar_citas_gestionadas(request):
 @login_required
 @asesor_required
 def visualizar_citas_gestionadas(request):
-    """Visualiza y filtra citas gestionadas por el asesor."""
+    """Visualiza y filtra citas gestionadas por el asesor, paginadas por cursor de la más reciente a la más antigua."""
     lista_citas = Cita.objects.select_related(
         'paciente__user_account',
         'profesional__user_account',
@@ -439,10 +766,20 @@ def visualizar_citas_gestionadas(request):
         if estado_filtrado:
             lista_citas = lista_citas.filter(estado_cita=estado_filtrado)
     
-    lista_citas = lista_citas.order_by('-fecha_hora_inicio_cita')
-    
+    citas, cursor_siguiente, cursor_anterior = paginar_citas(
+        lista_citas, despues=request.GET.get('despues'), antes=request.GET.get('antes')
+    )
+
+    # Los enlaces de paginación conservan los filtros aplicados
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+    filtros.pop('antes', None)
+
     context = {
-        'citas': lista_citas,
+        'citas': citas,
+        'cursor_siguiente': cursor_siguiente,
+        'cursor_anterior': cursor_anterior,
+        'filtros_query': filtros.urlencode(),
         'titulo_pagina': 'Citas Médicas Gestionadas',
         'filter_form': filter_form
     }
@@ -451,6 +788,7 @@ def visualizar_citas_gestionadas(request):
 
 @login_required
 @asesor_required
+@idempotente('modificar_cita')
 def modificar_cita(request, cita_id):
     """Modifica una cita programada (profesional o fecha/hora)."""
     cita_actual = get_object_or_404(Cita, id=cita_id)
@@ -494,26 +832,6 @@ def modificar_cita(request, cita_id):
             return redirect('agendamiento:visualizar_citas_gestionadas')
 
         nueva_fecha_hora_fin = nueva_fecha_hora_inicio + timedelta(minutes=profesional_nuevo.especialidad.duracion_consulta_minutos)
-        citas_conflictivas = Cita.objects.filter(
-            profesional=profesional_nuevo,
-            fecha_hora_inicio_cita__lt=nueva_fecha_hora_fin,
-            fecha_hora_fin_cita__gt=nueva_fecha_hora_inicio,
-            estado_cita='Programada'
-        ).exclude(id=cita_actual.id)
-
-        if citas_conflictivas.exists():
-            messages.error(request, f"El horario seleccionado ({hora_inicio_slot_seleccionada_str}) para {profesional_nuevo} el {formats.date_format(fecha_nueva_obj, 'd/m/Y')} ya no está disponible. Por favor, elija otro.")
-            get_params_originales = request.session.get('modificar_cita_get_params', {})
-            if get_params_originales:
-                query_string = '&'.join([f'{k}={v}' for k,v in get_params_originales.items()])
-                redirect_url = f"{reverse('agendamiento:modificar_cita', args=[cita_actual.id])}?{query_string}"
-                return redirect(redirect_url)
-            return redirect('agendamiento:modificar_cita', cita_id=cita_actual.id)
-        
-        cita_actual.profesional = profesional_nuevo
-        cita_actual.fecha_hora_inicio_cita = nueva_fecha_hora_inicio
-        cita_actual.fecha_hora_fin_cita = nueva_fecha_hora_fin
-        cita_actual.save()
 
         paciente_nombre_completo = cita_actual.paciente.user_account.get_full_name()
         profesional_nuevo_nombre_completo = profesional_nuevo.user_account.get_full_name()
@@ -527,6 +845,55 @@ def modificar_cita(request, cita_id):
         fecha_formateada_msg = f"{dia_semana_str_msg}, {dia_num_str_msg} {de_str} {mes_str_msg} {de_str} {anho_str_msg}"
         
         hora_formateada_msg = timezone.localtime(nueva_fecha_hora_inicio).strftime('%H:%M')
+        hora_formateada_email = timezone.localtime(nueva_fecha_hora_inicio).strftime('%I:%M %p').lower()
+        mensaje_email = (
+            f"Estimado(a) {paciente_nombre_completo},\n\n"
+            f"Le informamos que su cita médica ha sido modificada.\n\n"
+            f"Nuevos Detalles:\n"
+            f"  - Profesional: {profesional_nuevo_nombre_completo}\n"
+            f"  - Especialidad: {especialidad_nombre}\n"
+            f"  - Fecha: {fecha_formateada_msg}\n" 
+            f"  - Hora: {hora_formateada_email}\n\n"
+            f"Saludos cordiales,\nIPS Medical Integral"
+        )
+
+        # La restricción de no solapamiento de la base de datos rechaza el cruce con otra cita 'Programada'
+        try:
+            with transaction.atomic():
+                cita_vigente = actualizar_cita(
+                    cita_actual,
+                    version_esperada(request, cita_actual),
+                    profesional=profesional_nuevo,
+                    fecha_hora_inicio_cita=nueva_fecha_hora_inicio,
+                    fecha_hora_fin_cita=nueva_fecha_hora_fin,
+                    recordatorio_enviado_en=None
+                )
+                # El correo se encola en la misma transacción que el cambio
+                if cita_vigente and cita_actual.paciente.user_account.email:
+                    encolar_correo(
+                        cita_actual.paciente.user_account.email,
+                        f"Actualización de su Cita Médica - {especialidad_nombre}",
+                        mensaje_email,
+                        cita=cita_actual
+                    )
+            horario_tomado = False
+        except IntegrityError as error:
+            if not es_error_solapamiento_cita(error):
+                raise
+            horario_tomado = True
+
+        if not horario_tomado and not cita_vigente:
+            messages.error(request, f"La cita (ID: {cita_actual.id}) fue modificada por otro usuario mientras usted la editaba. No se aplicaron sus cambios; revise la cita e intente de nuevo.")
+            return redirect('agendamiento:visualizar_citas_gestionadas')
+
+        if horario_tomado:
+            messages.error(request, f"El horario seleccionado ({hora_inicio_slot_seleccionada_str}) para {profesional_nuevo} el {formats.date_format(fecha_nueva_obj, 'd/m/Y')} ya no está disponible. Por favor, elija otro.")
+            get_params_originales = request.session.get('modificar_cita_get_params', {})
+            if get_params_originales:
+                query_string = '&'.join([f'{k}={v}' for k,v in get_params_originales.items()])
+                redirect_url = f"{reverse('agendamiento:modificar_cita', args=[cita_actual.id])}?{query_string}"
+                return redirect(redirect_url)
+            return redirect('agendamiento:modificar_cita', cita_id=cita_actual.id)
 
         mensaje_exito = (
             f"La cita para {paciente_nombre_completo} ha sido modificada exitosamente. "
@@ -535,23 +902,7 @@ def modificar_cita(request, cita_id):
         )
 
         if cita_actual.paciente.user_account.email:
-            asunto = f"Actualización de su Cita Médica - {especialidad_nombre}"
-            hora_formateada_email = timezone.localtime(nueva_fecha_hora_inicio).strftime('%I:%M %p').lower()
-            mensaje_email = (
-                f"Estimado(a) {paciente_nombre_completo},\n\n"
-                f"Le informamos que su cita médica ha sido modificada.\n\n"
-                f"Nuevos Detalles:\n"
-                f"  - Profesional: {profesional_nuevo_nombre_completo}\n"
-                f"  - Especialidad: {especialidad_nombre}\n"
-                f"  - Fecha: {fecha_formateada_msg}\n" 
-                f"  - Hora: {hora_formateada_email}\n\n"
-                f"Saludos cordiales,\nIPS Medical Integral"
-            )
-            try:
-                send_mail(asunto, mensaje_email, settings.DEFAULT_FROM_EMAIL, [cita_actual.paciente.user_account.email], fail_silently=False)
-                messages.success(request, f"{mensaje_exito} Se envió correo de notificación.")
-            except Exception as e:
-                messages.warning(request, f"{mensaje_exito} Hubo un problema al enviar el correo de notificación: {e}")
+            messages.success(request, f"{mensaje_exito} El correo de notificación se enviará en breve.")
         else:
             messages.success(request, f"{mensaje_exito} (Paciente sin email para notificación).")
         
@@ -567,46 +918,10 @@ def modificar_cita(request, cita_id):
             fecha_nueva = form.cleaned_data['fecha_cita'] 
             profesional_seleccionado_para_slots = profesional_nuevo
             fecha_seleccionada_para_slots = fecha_nueva
-            dia_semana_seleccionado = fecha_nueva.weekday()
-            plantillas = PlantillaHorarioMedico.objects.filter(
-                profesional=profesional_nuevo,
-                dia_semana=dia_semana_seleccionado
-            ).order_by('hora_inicio_bloque')
-            current_tz = timezone.get_current_timezone()
-            inicio_del_dia_seleccionado = timezone.make_aware(datetime.combine(fecha_nueva, time.min), current_tz)
-            fin_del_dia_seleccionado = timezone.make_aware(datetime.combine(fecha_nueva, time.max), current_tz)
-            citas_ocupadas_qs = Cita.objects.filter(
-                profesional=profesional_nuevo,
-                fecha_hora_inicio_cita__gte=inicio_del_dia_seleccionado,
-                fecha_hora_inicio_cita__lte=fin_del_dia_seleccionado,
-                estado_cita='Programada'
-            ).exclude(id=cita_actual.id)
-            rangos_ocupados = []
-            for cita_ocupada in citas_ocupadas_qs:
-                hora_inicio_local_ocupada = timezone.localtime(cita_ocupada.fecha_hora_inicio_cita, current_tz).time()
-                hora_fin_local_ocupada = timezone.localtime(cita_ocupada.fecha_hora_fin_cita, current_tz).time()
-                rangos_ocupados.append((hora_inicio_local_ocupada, hora_fin_local_ocupada))
-            duracion_consulta = profesional_nuevo.especialidad.duracion_consulta_minutos
-            for plantilla in plantillas:
-                hora_inicio_iteracion_naive = datetime.combine(fecha_nueva, plantilla.hora_inicio_bloque)
-                hora_fin_iteracion_bloque_naive = datetime.combine(fecha_nueva, plantilla.hora_fin_bloque)
-                hora_inicio_iteracion = timezone.make_aware(hora_inicio_iteracion_naive, current_tz)
-                hora_fin_iteracion_bloque = timezone.make_aware(hora_fin_iteracion_bloque_naive, current_tz)
-                while hora_inicio_iteracion < hora_fin_iteracion_bloque:
-                    hora_fin_slot_propuesto = hora_inicio_iteracion + timedelta(minutes=duracion_consulta)
-                    if hora_fin_slot_propuesto > hora_fin_iteracion_bloque:
-                        break 
-                    slot_esta_ocupado = False
-                    slot_inicio_time_local = hora_inicio_iteracion.astimezone(current_tz).time()
-                    slot_fin_time_local = hora_fin_slot_propuesto.astimezone(current_tz).time()
-                    for inicio_ocupado_local, fin_ocupado_local in rangos_ocupados:
-                        if (slot_inicio_time_local < fin_ocupado_local and slot_fin_time_local > inicio_ocupado_local):
-                            slot_esta_ocupado = True
-                            break 
-                    if not slot_esta_ocupado:
-                        slots_disponibles.append((slot_inicio_time_local, slot_fin_time_local))
-                    hora_inicio_iteracion = hora_fin_slot_propuesto
-            if not slots_disponibles and plantillas.exists():
+            slots_disponibles, tiene_horario = obtener_slots_disponibles(
+                profesional_nuevo, fecha_nueva, excluir_cita_id=cita_actual.id
+            )
+            if not slots_disponibles and tiene_horario:
                  de_str = _('de')
                  dia_sem_str_adv = formats.date_format(fecha_nueva, "l")
                  dia_num_str_adv = formats.date_format(fecha_nueva, "d")
@@ -614,7 +929,7 @@ def modificar_cita(request, cita_id):
                  anho_str_adv = formats.date_format(fecha_nueva, "Y")
                  fecha_formateada_advertencia_mod = f"{dia_sem_str_adv}, {dia_num_str_adv} {de_str} {mes_str_adv} {de_str} {anho_str_adv}"
                  messages.info(request, f"No hay horarios disponibles para {profesional_nuevo} el {fecha_formateada_advertencia_mod}.")
-            elif not plantillas.exists():
+            elif not tiene_horario:
                  de_str = _('de')
                  dia_sem_str_adv2 = formats.date_format(fecha_nueva, "l")
                  dia_num_str_adv2 = formats.date_format(fecha_nueva, "d")
@@ -685,6 +1000,7 @@ def confirmar_modificacion_cita(request, cita_id):
         'profesional_propuesto': profesional_propuesto,
         'fecha_propuesta': fecha_propuesta, 
         'hora_propuesta': hora_propuesta,   
+        'clave_idempotencia': nueva_clave_idempotencia(),
         'titulo_pagina': f"Confirmar Modificación Cita ID: {cita_actual.id}"
     }
     return render(request, 'agendamiento/confirmar_modificacion_cita_template.html', context)
@@ -765,27 +1081,56 @@ def ejecutar_cancelacion_cita(request, cita_id):
     hora_cita_formateada_msg = timezone.localtime(fecha_cita_dt_obj).strftime('%H:%M')
     hora_cita_formateada_email = timezone.localtime(fecha_cita_dt_obj).strftime('%I:%M %p').lower()
 
-    cita_a_cancelar.estado_cita = 'Cancelada'
-    cita_a_cancelar.save()
+    with transaction.atomic():
+        cancelada = actualizar_cita(cita_a_cancelar, version_esperada(request, cita_a_cancelar), estado_cita='Cancelada')
+        # El correo se encola en la misma transacción que la cancelación
+        if cancelada and cita_a_cancelar.paciente.user_account.email:
+            mensaje_email = (
+                f"Estimado(a) {paciente_nombre},\n\n"
+                f"Le informamos que su cita médica con {profesional_nombre} "
+                f"({especialidad_nombre}) programada para el {fecha_cita_formateada_para_msg} "
+                f"a las {hora_cita_formateada_email} ha sido CANCELADA.\n\n"
+                f"Si tiene alguna consulta, por favor contáctenos.\n\n"
+                f"Saludos cordiales,\nIPS Medical Integral"
+            )
+            encolar_correo(
+                cita_a_cancelar.paciente.user_account.email,
+                f"Cancelación de su Cita Médica - {especialidad_nombre}",
+                mensaje_email,
+                cita=cita_a_cancelar
+            )
+
+    if not cancelada:
+        messages.error(request, f"La cita para {paciente_nombre} fue modificada por otro usuario mientras usted confirmaba la cancelación. No se canceló; revise la cita e intente de nuevo.")
+        return redirect(url_redirect)
 
     mensaje_exito = f"La cita para {paciente_nombre} con {profesional_nombre} el {fecha_cita_formateada_para_msg} a las {hora_cita_formateada_msg} ha sido cancelada exitosamente."
-
     if cita_a_cancelar.paciente.user_account.email:
-        asunto = f"Cancelación de su Cita Médica - {especialidad_nombre}"
-        mensaje_email = (
-            f"Estimado(a) {paciente_nombre},\n\n"
-            f"Le informamos que su cita médica con {profesional_nombre} "
-            f"({especialidad_nombre}) programada para el {fecha_cita_formateada_para_msg} "
-            f"a las {hora_cita_formateada_email} ha sido CANCELADA.\n\n"
-            f"Si tiene alguna consulta, por favor contáctenos.\n\n"
-            f"Saludos cordiales,\nIPS Medical Integral"
-        )
-        try:
-            send_mail(asunto, mensaje_email, settings.DEFAULT_FROM_EMAIL, [cita_a_cancelar.paciente.user_account.email], fail_silently=False)
-            messages.success(request, f"{mensaje_exito} Se envió correo de notificación al paciente.")
-        except Exception as e:
-            messages.warning(request, f"{mensaje_exito} Hubo un problema al enviar el correo de notificación al paciente: {e}")
+        messages.success(request, f"{mensaje_exito} El correo de notificación al paciente se enviará en breve.")
     else:
         messages.success(request, f"{mensaje_exito} (El paciente no tiene email registrado para notificación).")
-        
+
+    # El cupo liberado se asigna al primer paciente elegible de la lista de espera
+    with transaction.atomic():
+        entrada_asignada = asignar_cupo_liberado(cita_a_cancelar)
+        if entrada_asignada and entrada_asignada.paciente.user_account.email:
+            usuario_asignado = entrada_asignada.paciente.user_account
+            mensaje_email = (
+                f"Estimado(a) {usuario_asignado.get_full_name()},\n\n"
+                f"Se liberó un cupo en {especialidad_nombre} y le fue asignado desde la lista de espera.\n\n"
+                f"Profesional: Dr(a). {profesional_nombre}\n"
+                f"Fecha: {fecha_cita_formateada_para_msg}\n"
+                f"Hora: {hora_cita_formateada_email}\n\n"
+                f"Si no puede asistir, comuníquese con nosotros para liberar el cupo.\n\n"
+                f"Saludos cordiales,\nIPS Medical Integral"
+            )
+            encolar_correo(
+                usuario_asignado.email,
+                f"Cita Asignada desde Lista de Espera - {especialidad_nombre}",
+                mensaje_email,
+                cita=entrada_asignada.cita_asignada
+            )
+    if entrada_asignada:
+        messages.info(request, f"El horario liberado se asignó a {entrada_asignada.paciente.user_account.get_full_name()} desde la lista de espera.")
+
     return redirect(url_redirect)
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""Feeds iCalendar (ICS) de citas para profesionales de salud y pacientes."""
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
+
+from .calendario_ics import (
+    MARGEN_SINCRONIZACION, citas_calendario, generar_ics, leer_token, propietario_calendario,
+    regenerar_clave_calendario, salieron_citas, token_calendario
+)
+from .models import Paciente, ProfesionalSalud
+
+
+def _responder_calendario(request, citas, nombre_calendario, resumen_cita):
+    """
+    Responde el feed con 304, con las citas modificadas desde ?desde=<token> o con el calendario completo.
+
+    El token de cambios viaja en el ETag y en la cabecera X-Token-Sincronizacion.
+    Si desde el token salió alguna cita del feed se responde el calendario
+    completo, porque el delta no incluiría la cita que el cliente debe quitar.
+    """
+    token = token_calendario(citas)
+    etag = f'"{token}"'
+    desde = request.GET.get('desde', '')
+    token_desde = leer_token(desde) if desde else None
+
+    respuesta_no_modificada = get_conditional_response(request, etag=etag)
+    if respuesta_no_modificada is None and desde == token:
+        respuesta_no_modificada = HttpResponse(status=304)
+    if respuesta_no_modificada is not None:
+        respuesta_no_modificada['ETag'] = etag
+        respuesta_no_modificada['X-Token-Sincronizacion'] = token
+        patch_cache_control(respuesta_no_modificada, private=True, no_cache=True)
+        return respuesta_no_modificada
+
+    if token_desde is not None and not salieron_citas(token_desde, leer_token(token)):
+        eventos = citas.filter(modificada_en__gte=token_desde[0] - MARGEN_SINCRONIZACION)
+    else:
+        eventos = citas.filter(estado_cita='Programada')
+    eventos = eventos.select_related(
+        'paciente__user_account', 'profesional__user_account', 'profesional__especialidad'
+    ).order_by('fecha_hora_inicio_cita')
+
+    response = HttpResponse(generar_ics(nombre_calendario, eventos, resumen_cita), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['X-Token-Sincronizacion'] = token
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def calendario_profesional(request, clave):
+    """Feed ICS con las citas 'Programada' de un profesional de salud."""
+    profesional_id = propietario_calendario(ProfesionalSalud, clave)
+    if profesional_id is None:
+        raise Http404("Calendario no encontrado.")
+    return _responder_calendario(
+        request,
+        citas_calendario(profesional_id=profesional_id),
+        "Mi Agenda - IPS Medical Integral",
+        lambda cita: f"Cita: {cita.paciente.user_account.get_full_name() or cita.paciente}"
+    )
+
+
+@require_GET
+def calendario_paciente(request, clave):
+    """Feed ICS con las citas 'Programada' de un paciente."""
+    paciente_id = propietario_calendario(Paciente, clave)
+    if paciente_id is None:
+        raise Http404("Calendario no encontrado.")
+    return _responder_calendario(
+        request,
+        citas_calendario(paciente_id=paciente_id),
+        "Mis Citas - IPS Medical Integral",
+        lambda cita: (
+            f"Cita de {cita.profesional.especialidad.nombre_especialidad} - "
+            f"Dr(a). {cita.profesional.user_account.get_full_name()}"
+        )
+    )
+
+
+@login_required
+@require_POST
+def regenerar_enlace_calendario(request):
+    """Genera una nueva URL del feed del usuario; la anterior deja de funcionar."""
+    regenerar_clave_calendario(request.user)
+    messages.success(request, "Se generó un nuevo enlace de calendario. Actualice la suscripción en su aplicación de calendario.")
+    if hasattr(request.user, 'profesional_perfil'):
+        return redirect('agendamiento:dashboard_profesional')
+    if hasattr(request.user, 'paciente_perfil'):
+        return redirect('agendamiento:dashboard_paciente')
+    return redirect('pagina_inicio')
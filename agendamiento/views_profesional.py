@@ -10,6 +10,11 @@ from django.utils import timezone, formats
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_POST
 
+from .asistencia_citas import (
+    ESTADOS_ASISTENCIA, RESULTADO_MODIFICADA, RESULTADO_NO_ENCONTRADA, RESULTADO_NO_FINALIZADA,
+    RESULTADO_NO_PROGRAMADA, RESULTADO_REGISTRADA, registrar_asistencia_lote
+)
+from .concurrencia_citas import actualizar_cita, version_esperada
 from .decorators import profesional_required
 from .models import Cita, ProfesionalSalud, Paciente
 
@@ -51,6 +56,9 @@ def ver_agenda_profesional(request):
         for cita in citas_query:
             cita.puede_registrar_asistencia = ahora > cita.fecha_hora_fin_cita
             citas_para_plantilla.append(cita)
+    hay_asistencia_pendiente = any(
+        cita.estado_cita == 'Programada' and cita.puede_registrar_asistencia for cita in citas_para_plantilla
+    )
 
     # Formatear fecha para visualización
     de_str = _('de')
@@ -64,11 +72,67 @@ def ver_agenda_profesional(request):
         'titulo_pagina': f"Mi Agenda - {fecha_agenda_formateada}",
         'profesional_actual': profesional_actual,
         'citas_del_dia': citas_para_plantilla,
+        'hay_asistencia_pendiente': hay_asistencia_pendiente,
         'fecha_agenda': fecha_agenda,
         'fecha_agenda_formateada': fecha_agenda_formateada
     }
     return render(request, 'agendamiento/agenda_profesional.html', context)
 
+# Descripción para el profesional de cada resultado del registro en lote
+DESCRIPCION_RESULTADOS_ASISTENCIA = {
+    RESULTADO_NO_ENCONTRADA: "no pertenece a su agenda",
+    RESULTADO_NO_PROGRAMADA: "ya tenía la asistencia registrada o fue cancelada",
+    RESULTADO_NO_FINALIZADA: "aún no ha finalizado",
+    RESULTADO_MODIFICADA: "fue modificada por otro usuario; revise su estado actual",
+}
+
+
+@login_required
+@profesional_required
+@require_POST
+def registrar_asistencia_agenda(request):
+    """
+    Registra en lote la asistencia marcada en el formulario de la agenda diaria.
+
+    Cada cita marcada se envía como asistencia_<id> (Realizada o No_Asistio)
+    junto con version_<id>; todas se aplican con un único UPDATE condicional
+    y se informa el resultado de cada una.
+    """
+    profesional_actual = get_object_or_404(ProfesionalSalud, user_account=request.user)
+    url_redirect_agenda = reverse('agendamiento:ver_agenda_profesional')
+    fecha_agenda_str = request.POST.get('fecha_agenda', '')
+    try:
+        datetime.strptime(fecha_agenda_str, '%Y-%m-%d')
+        url_redirect_agenda += f"?fecha_agenda={fecha_agenda_str}"
+    except ValueError:
+        pass
+
+    marcas = {}
+    for campo, estado in request.POST.items():
+        if not campo.startswith('asistencia_') or not estado:
+            continue
+        try:
+            cita_id = int(campo[len('asistencia_'):])
+            version = int(request.POST.get(f'version_{cita_id}', ''))
+        except ValueError:
+            continue
+        if estado in ESTADOS_ASISTENCIA:
+            marcas[cita_id] = (estado, version)
+
+    if not marcas:
+        messages.info(request, "No se marcó la asistencia de ninguna cita.")
+        return redirect(url_redirect_agenda)
+
+    resultados = registrar_asistencia_lote(profesional_actual, marcas)
+    registradas = [resultado for resultado in resultados if resultado.resultado == RESULTADO_REGISTRADA]
+    if registradas:
+        messages.success(request, f"Se registró la asistencia de {len(registradas)} cita(s).")
+    for resultado in resultados:
+        if resultado.resultado != RESULTADO_REGISTRADA:
+            messages.warning(request, f"No se registró la asistencia de la cita {resultado.cita_id}: {DESCRIPCION_RESULTADOS_ASISTENCIA[resultado.resultado]}.")
+    return redirect(url_redirect_agenda)
+
+
 @login_required
 @profesional_required
 def ver_detalles_paciente_cita(request, cita_id):
@@ -142,9 +206,10 @@ def registrar_asistencia_cita(request, cita_id):
         messages.error(request, "Acción de asistencia no válida.")
         return redirect(url_redirect_agenda)
 
-    # Actualizar estado de la cita
-    cita.estado_cita = nuevo_estado
-    cita.save()
+    # Actualizar estado de la cita solo si nadie la modificó desde la confirmación
+    if not actualizar_cita(cita, version_esperada(request, cita), estado_cita=nuevo_estado):
+        messages.error(request, f"La cita de {cita.paciente.user_account.get_full_name()} fue modificada por otro usuario mientras usted confirmaba la asistencia. Revise su estado actual e intente de nuevo.")
+        return redirect(url_redirect_agenda)
 
     estado_legible = _("Asistió (Realizada)") if nuevo_estado == 'Realizada' else _("No Asistió")
     messages.success(request, f"Se ha registrado la asistencia para {cita.paciente.user_account.get_full_name()} como: '{estado_legible}'.")
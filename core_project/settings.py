@@ -167,6 +167,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = reverse_lazy('agendamiento:login')
 LOGIN_REDIRECT_URL = '/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 10))  # Segundos antes de abandonar un servidor de correo lento
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
 
@@ -204,7 +205,50 @@ SESSION_SAVE_EVERY_REQUEST = True
 
 
 # ============================================================================
-# 10. CONFIGURACIÓN PARA TESTS
+# 10. MOTOR DE DISPONIBILIDAD
+# ============================================================================
+
+# Días (desde hoy) cuyos slots se mantienen precalculados en SlotDisponible; 0 desactiva la tabla
+DISPONIBILIDAD_HORIZONTE_DIAS = int(os.getenv('DISPONIBILIDAD_HORIZONTE_DIAS', 30))
+
+# Minutos que un horario queda retenido mientras el asesor busca al paciente
+DISPONIBILIDAD_RETENCION_MINUTOS = int(os.getenv('DISPONIBILIDAD_RETENCION_MINUTOS', 5))
+
+# Caché de slots por (profesional, fecha). Las señales de citas y plantillas invalidan las
+# entradas en el backend configurado; LocMemCache es local a cada proceso, así que con varios
+# workers de gunicorn (Procfile) solo limpiaría el worker que hizo el cambio y los demás
+# mostrarían horarios ya ocupados hasta que venza TIMEOUT. Por eso en producción se usa por
+# defecto DatabaseCache, compartida por todos los workers (startup.sh crea su tabla con
+# createcachetable). DISPONIBILIDAD_CACHE_BACKEND y DISPONIBILIDAD_CACHE_LOCATION permiten
+# apuntar a Redis o Memcached; si se fuerza LocMemCache con varios workers, mantener un
+# DISPONIBILIDAD_CACHE_TIMEOUT de pocos segundos. MAX_ENTRIES y CULL_FREQUENCY acotan el
+# tamaño: al superarse se elimina 1/CULL_FREQUENCY de las entradas.
+if IS_PRODUCTION:
+    DISPONIBILIDAD_CACHE_BACKEND_DEFECTO = 'django.core.cache.backends.db.DatabaseCache'
+    DISPONIBILIDAD_CACHE_LOCATION_DEFECTO = 'cache_disponibilidad'
+else:
+    DISPONIBILIDAD_CACHE_BACKEND_DEFECTO = 'django.core.cache.backends.locmem.LocMemCache'
+    DISPONIBILIDAD_CACHE_LOCATION_DEFECTO = 'disponibilidad'
+
+DISPONIBILIDAD_CACHE_ALIAS = 'disponibilidad'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    DISPONIBILIDAD_CACHE_ALIAS: {
+        'BACKEND': os.getenv('DISPONIBILIDAD_CACHE_BACKEND', DISPONIBILIDAD_CACHE_BACKEND_DEFECTO),
+        'LOCATION': os.getenv('DISPONIBILIDAD_CACHE_LOCATION', DISPONIBILIDAD_CACHE_LOCATION_DEFECTO),
+        'TIMEOUT': int(os.getenv('DISPONIBILIDAD_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('DISPONIBILIDAD_CACHE_MAX_ENTRIES', 2000)),
+            'CULL_FREQUENCY': int(os.getenv('DISPONIBILIDAD_CACHE_CULL_FREQUENCY', 3)),
+        },
+    },
+}
+
+
+# ============================================================================
+# 11. CONFIGURACIÓN PARA TESTS
 # ============================================================================
 
 if 'test' in sys.argv or os.environ.get('TESTING'):
@@ -7,6 +7,9 @@ python manage.py collectstatic --no-input
 echo "Applying database migrations..."
 python manage.py migrate
 
+echo "Creating cache tables..."
+python manage.py createcachetable
+
 # La línea de creación original puede quedarse, no hará nada.
 echo "Creating initial superuser if it does not exist..."
 python manage.py create_initial_superuser